@@ -1,23 +1,52 @@
 
-import platform
-
 __version__ = "0.4.6"
 
-if platform.system() == "Windows":
-    from .oleconsole import oleconsts
-    from .oleconsole.oleconsole import IgorApp, OLEIgorWave, OLEIgorVariable, OLEIgorFolder, OLEIgorWaveCollection, OLEIgorVariableCollection, OLEIgorFolderCollection
+# The COM backend (pywin32, numpy and oleconsole.py) is imported on the
+# first access to one of these names, not by "import igorconsole".
+_BACKEND_NAMES = {
+    "IgorApp": "IgorApp",
+    "OLEIgorWave": "OLEIgorWave",
+    "OLEIgorVariable": "OLEIgorVariable",
+    "OLEIgorFolder": "OLEIgorFolder",
+    "OLEIgorWaveCollection": "OLEIgorWaveCollection",
+    "OLEIgorVariableCollection": "OLEIgorVariableCollection",
+    "OLEIgorFolderCollection": "OLEIgorFolderCollection",
+    "Wave": "OLEIgorWave",
+    "Variable": "OLEIgorVariable",
+    "Folder": "OLEIgorFolder",
+    "WaveCollection": "OLEIgorWaveCollection",
+    "VariableCollection": "OLEIgorVariableCollection",
+    "FolderCollection": "OLEIgorFolderCollection",
+}
+
+def _backend():
+    import platform
+    if platform.system() != "Windows":
+        raise NotImplementedError("This package currently works only on Windows.")
+    from .oleconsole import oleconsole
+    return oleconsole
+
+def connect(*args, **kwargs):
+    """Connect to an existing igor instance. See IgorApp.connect."""
+    return _backend().IgorApp.connect(*args, **kwargs)
+
+def run(*args, **kwargs):
+    """Run a new igor instance and connect. See IgorApp.run."""
+    return _backend().IgorApp.run(*args, **kwargs)
 
-    connect = IgorApp().connect
-    run = IgorApp().run
-    start = IgorApp().start
-    
-    Wave = OLEIgorWave
-    Variable = OLEIgorVariable
-    Folder = OLEIgorFolder
+def start(*args, **kwargs):
+    """Connect to igor, or run it if not running. See IgorApp.start."""
+    return _backend().IgorApp.start(*args, **kwargs)
 
-    WaveCollection = OLEIgorWaveCollection
-    VariableCollection = OLEIgorVariableCollection
-    FolderCollection = OLEIgorFolderCollection
-else:
-    raise NotImplementedError("This package currently works only on Windows.")
+def __getattr__(name):
+    if name in _BACKEND_NAMES:
+        value = getattr(_backend(), _BACKEND_NAMES[name])
+    elif name == "oleconsts":
+        from .oleconsole import oleconsts as value
+    else:
+        raise AttributeError("module 'igorconsole' has no attribute '{}'".format(name))
+    globals()[name] = value
+    return value
 
+def __dir__():
+    return sorted(set(globals()) | set(_BACKEND_NAMES) | {"oleconsts"})
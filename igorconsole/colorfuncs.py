@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 
 def to_igor_rgb(obj):
@@ -7,33 +9,73 @@ def to_igor_rgb(obj):
                      for i in range(0, len(result), 2))
 
 #def geometic_gradation_(ratio, init_rgb=(0,0,0), last_rgb=(1,1,1)):
-#    init_rgb = np.asarray(init_rgb, dtype=np.float)
-#    last_rgb = np.asarray(last_rgb, dtype=np.float)
+#    init_rgb = np.asarray(init_rgb, dtype=float)
+#    last_rgb = np.asarray(last_rgb, dtype=float)
 #    result = (last_rgb - init_rgb) * ratio + init_rgb
 #    return tuple((result * 65535).round().astype(np.uint16))
 
+class Colormap:
+    """Piecewise linear gradation through rgb colors.
+    The colors are placed at the ratios proportional to the distances
+    between them in the rgb space. The breakpoints are computed once.
+    Args:
+        rgbs (list of tuple): colors in 0-1 scale.
+    """
+    def __init__(self, rgbs):
+        self.rgbs = np.asarray(rgbs, dtype=float).reshape(-1, 3)
+        distances = np.linalg.norm(np.diff(self.rgbs, axis=0), axis=1)
+        total = distances.sum()
+        if total == 0:
+            self.breakpoints = np.linspace(0, 1, len(self.rgbs))
+        else:
+            self.breakpoints = np.concatenate(([0.0], np.cumsum(distances) / total))
+        #n -> lookup table
+        self._luts = {}
+
+    def __repr__(self):
+        return "<igorconsole.Colormap of {} colors>".format(len(self.rgbs))
+
+    def rgb(self, ratios):
+        """Colors in 0-1 scale.
+        Args:
+            ratios (array_like): values in [0, 1].
+        Returns:
+            numpy.ndarray: shape (..., 3)
+        """
+        ratios = np.asarray(ratios, dtype=float)
+        if np.any((ratios < 0) | (ratios > 1)):
+            raise ValueError()
+        return np.stack([np.interp(ratios, self.breakpoints, self.rgbs[:, i])
+                         for i in range(3)], axis=-1)
+
+    def igor_rgb(self, ratios):
+        """Colors in 16 bit igor scale. See rgb."""
+        return (self.rgb(ratios) * 65535).round().astype(np.uint16)
+
+    def lut(self, n):
+        """Lookup table of n colors from ratio 0 to 1 in 16 bit igor scale.
+        The table is cached and read only.
+        Returns:
+            numpy.ndarray: shape (n, 3)
+        """
+        table = self._luts.get(n)
+        if table is None:
+            table = self.igor_rgb(np.linspace(0, 1, n) if n > 1 else np.zeros(n))
+            table.flags.writeable = False
+            self._luts[n] = table
+        return table
+
+    def __call__(self, ratio):
+        """Igor rgb tuple of a ratio, as the gradation functions."""
+        return tuple(self.igor_rgb(ratio))
+
+
+@functools.lru_cache(maxsize=64)
+def _colormap(rgbs):
+    return Colormap(rgbs)
+
 def geometic_gradation(ratio, rgbs=((1,1,0), (1,0,0))):
-    if ratio < 0 or ratio > 1:
-        raise ValueError()
-    rgbs = [np.asarray(rgb, dtype=np.float) for rgb in rgbs]
-    length = len(rgbs)
-    section = length - 1
-    section_distances = [0] * section
-    for i in range(section):
-        section_distances[i] = np.linalg.norm(rgbs[i+1] - rgbs[i])
-    total_distances = np.fromiter(
-        (sum(section_distances[:i]) for i in range(length)),
-        dtype=np.float,
-        count=length
-        )
-    total_distances /= total_distances[-1]
-    for i in range(section):
-        if ratio <= total_distances[i+1]:
-            left = ratio - total_distances[i]
-            right = total_distances[i+1] - ratio
-            result = (right*rgbs[i] + left*rgbs[i+1]) / (left + right)
-            break
-    return tuple((result * 65535).round().astype(np.uint16))
+    return _colormap(tuple(tuple(rgb) for rgb in rgbs))(ratio)
 
 def arithmetical_gradation(ratio, center_rgb,
                            down_limit=0, upper_limit=1):
@@ -43,8 +85,10 @@ def arithmetical_gradation(ratio, center_rgb,
     result = (upper_limit - max_rgb + min_rgb) * ratio + center_rgb
     return tuple((result * 65535).round().astype(np.uint16))
 
+hot_to_cold = Colormap([(1,0,0),(1,1,0),(0,1,0),(0,1,1),(0,0,1)])
+
 def hot_to_cold_gradation(ratio):
-    return geometic_gradation(ratio, rgbs=[(1,0,0),(1,1,0),(0,1,0),(0,1,1),(0,0,1)])
+    return hot_to_cold(ratio)
 
 #def hot_to_cold_gradation(ratio):
 #    red = np.array([1, 0, 0])
@@ -69,23 +113,14 @@ def hot_to_cold_gradation(ratio):
 gradation = {
     "geometic": geometic_gradation,
     "arithemetical": arithmetical_gradation,
-    "hot-to-cold": hot_to_cold_gradation,
-    "rainbow": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(1,0,0),(1,1,0),(0,1,0),(0,1,1),(0,0,1),(0.5,0,0.8)]),
-    "1-rgb": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0, 0, 0.8),(0, 0, 1),(0, 0.9, 1),(1, 0.9, 0)]),
-    "1-cmyk":lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0, 0, 1),(0.1, 1, 1),(1, 0.9, 0.1)]),
-    "2-rgb": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0, 0, 1),(1, 0.5, 1),(1, 0.5, 0.5)]),
-    "2-cmyk": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0, 0, 1),(1, 0.3, 1),(1, 0, 0.5)]),
-    "3-rgb": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0.35, 0, 0),(1, 0, 0),(1, 0.5, 0.5),(1,0.92,0)]),
-    "3-cmyk": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(0.35, 0, 0),(1, 0, 0),(1,0.92,0.92)]),
-    "4-rgb": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(1, 0.5, 0.5),(0,0,0.7)]),
-    "4-cmyk": lambda ratio: geometic_gradation(ratio, 
-        rgbs=[(1, 0.5, 0.5),(0.2,0.2,0.7)]),
-}
\ No newline at end of file
+    "hot-to-cold": hot_to_cold,
+    "rainbow": Colormap([(1,0,0),(1,1,0),(0,1,0),(0,1,1),(0,0,1),(0.5,0,0.8)]),
+    "1-rgb": Colormap([(0, 0, 0.8),(0, 0, 1),(0, 0.9, 1),(1, 0.9, 0)]),
+    "1-cmyk":Colormap([(0, 0, 1),(0.1, 1, 1),(1, 0.9, 0.1)]),
+    "2-rgb": Colormap([(0, 0, 1),(1, 0.5, 1),(1, 0.5, 0.5)]),
+    "2-cmyk": Colormap([(0, 0, 1),(1, 0.3, 1),(1, 0, 0.5)]),
+    "3-rgb": Colormap([(0.35, 0, 0),(1, 0, 0),(1, 0.5, 0.5),(1,0.92,0)]),
+    "3-cmyk": Colormap([(0.35, 0, 0),(1, 0, 0),(1,0.92,0.92)]),
+    "4-rgb": Colormap([(1, 0.5, 0.5),(0,0,0.7)]),
+    "4-cmyk": Colormap([(1, 0.5, 0.5),(0.2,0.2,0.7)]),
+}
@@ -1,5 +1,21 @@
+
 class IgorExceptionBase(Exception):
     pass
 
 class IgorTypeError(IgorExceptionBase, TypeError):
-    pass
\ No newline at end of file
+    pass
+
+class IgorTimeoutError(IgorExceptionBase, TimeoutError):
+    """Raised when an igor call does not finish before its deadline."""
+    pass
+
+class IgorExecuteError(IgorExceptionBase, RuntimeError):
+    """Raised when igor reports an error of a command."""
+    def __init__(self, code, message):
+        super().__init__("Igor execute error " + str(code) + ": " + message)
+        self.code = code
+        self.message = message
+
+class IgorBusyError(IgorExceptionBase, RuntimeError):
+    """Raised when igor keeps rejecting a call because it is busy."""
+    pass
@@ -1,13 +1,38 @@
 import configparser
+import functools
 import os
 
 CODEPAGE = 0
-config = configparser.ConfigParser()
 PATH, _ = os.path.split(__file__)
-config.read(PATH + "/config.ini")
-APPEND_SWITCH = int(config["Wave"]["append_switch_length1"])
-COMMAND_MAXLEN = int(config["Command"]["max_length"])
-del config, _
+del _
 HOME_DIR = os.path.expanduser("~")
+#igor data folder to keep the objects used by igorconsole.
+PACKAGE_FOLDER = "root:Packages:igorconsole"
+#helper procedures loaded into igor on demand.
+PROCEDURE_FILE = os.path.join(os.path.dirname(PATH), "procedures", "igorconsole.ipf")
 
-__all__ = ["CODEPAGE", "PATH", "HOME_DIR", "APPEND_SWITCH", "COMMAND_MAXLEN"]
+@functools.lru_cache(maxsize=None)
+def load_config():
+    """Parse config.ini once per process."""
+    config = configparser.ConfigParser()
+    config.read(PATH + "/config.ini")
+    return config
+
+# Values read from config.ini on the first access.
+_CONFIG_VALUES = {
+    "APPEND_SWITCH": ("Wave", "append_switch_length1", int),
+    "COMMAND_MAXLEN": ("Command", "max_length", int),
+    "COMMAND_MAXLEN_IGOR7": ("Command", "max_length_igor7", int),
+    "FOLDER_INDEX_LIFETIME": ("Folder", "index_lifetime", float),
+}
+
+def __getattr__(name):
+    if name in _CONFIG_VALUES:
+        section, key, type_ = _CONFIG_VALUES[name]
+        value = type_(load_config()[section][key])
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+__all__ = ["CODEPAGE", "PATH", "HOME_DIR", "APPEND_SWITCH", "COMMAND_MAXLEN",
+           "COMMAND_MAXLEN_IGOR7", "FOLDER_INDEX_LIFETIME", "PACKAGE_FOLDER", "PROCEDURE_FILE"]
@@ -0,0 +1,216 @@
+"""Daemon keeping a headless igor instance running between scripts.
+
+Run it in the background with:
+    python -m igorconsole.oleconsole.daemon --idle-timeout 600
+
+or let IgorApp.start(keep_alive=True) spawn it. Scripts connect to the warm
+instance by IgorApp.start() or IgorApp.connect(), which touch the heartbeat
+file. The daemon quits igor when the heartbeat is older than the idle
+timeout and igor is not running anything.
+"""
+import argparse
+from contextlib import suppress
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEARTBEAT = os.path.join(tempfile.gettempdir(), "igorconsole_daemon.heartbeat")
+#held by the client spawning a daemon, so that only one daemon is spawned.
+SPAWN_LOCK = HEARTBEAT + ".lock"
+#heartbeat files without pid younger than this are regarded as starting up.
+STARTUP_GRACE = 60.0
+#IgorApp touches the heartbeat at most once in this interval in sec.
+TOUCH_INTERVAL = 10.0
+
+
+def touch():
+    """Tell the running daemon that igor is in use."""
+    try:
+        os.utime(HEARTBEAT, None)
+    except OSError:
+        #no daemon is running.
+        pass
+
+
+def _pid_alive(pid):
+    """True if the process of the pid exists."""
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return False
+            return code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_running():
+    """True if a daemon is running.
+    The heartbeat file left by a crashed or killed daemon is deleted.
+    """
+    try:
+        with open(HEARTBEAT, "r") as f:
+            pid = f.read().strip()
+    except OSError:
+        return False
+    if not pid.isdigit():
+        #the daemon may be writing its pid just now.
+        if idle_time() < STARTUP_GRACE:
+            return True
+    elif _pid_alive(int(pid)):
+        return True
+    with suppress(FileNotFoundError):
+        os.remove(HEARTBEAT)
+    return False
+
+
+def idle_time():
+    """Time in sec since the last connection, or inf without the heartbeat file."""
+    try:
+        return time.time() - os.path.getmtime(HEARTBEAT)
+    except FileNotFoundError:
+        return float("inf")
+
+
+def _lock_spawn():
+    """Take the spawn lock. Returns False if another client holds it."""
+    for _ in range(2):
+        try:
+            os.close(os.open(SPAWN_LOCK, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        try:
+            age = time.time() - os.path.getmtime(SPAWN_LOCK)
+        except FileNotFoundError:
+            #released just now.
+            continue
+        if age < STARTUP_GRACE:
+            return False
+        #left by a client killed while spawning.
+        with suppress(FileNotFoundError):
+            os.remove(SPAWN_LOCK)
+    return False
+
+
+def spawn(idle_timeout=600, visible=False):
+    """Start a daemon process detached from the current process.
+    Args:
+        idle_timeout (float): quit igor after this idle time in sec.
+        visible (bool): show igor window.
+    Returns:
+        subprocess.Popen or None: None if a daemon is running or being spawned
+            by another client.
+    """
+    if is_running() or not _lock_spawn():
+        return None
+    try:
+        if is_running():
+            return None
+        #a heartbeat without pid tells the other clients that the daemon
+        #is starting up, until it writes its pid.
+        with open(HEARTBEAT, "w"):
+            pass
+        args = [sys.executable, "-m", "igorconsole.oleconsole.daemon",
+                "--idle-timeout", str(idle_timeout)]
+        if visible:
+            args.append("--visible")
+        flags = getattr(subprocess, "DETACHED_PROCESS", 0)\
+                | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+        try:
+            return subprocess.Popen(args, creationflags=flags, close_fds=True,
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL)
+        except OSError:
+            with suppress(FileNotFoundError):
+                os.remove(HEARTBEAT)
+            raise
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(SPAWN_LOCK)
+
+
+class IgorDaemon:
+    """Keep an igor instance warm until it is idle for idle_timeout.
+    Args:
+        idle_timeout (float): quit igor after this idle time in sec.
+        poll_interval (float): interval in sec to check the heartbeat.
+        visible (bool): show igor window.
+        discard_unsaved (bool): quit igor even if the experiment is modified.
+            The instance is a scratch space for the scripts by default.
+    """
+    def __init__(self, idle_timeout=600, poll_interval=5.0, visible=False,
+                 discard_unsaved=True):
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.visible = visible
+        self.discard_unsaved = discard_unsaved
+
+    def serve_forever(self):
+        """Run igor and wait until it becomes idle or is closed."""
+        from pythoncom import com_error
+        from .oleconsole import IgorApp
+        from igorconsole.exception import IgorBusyError
+
+        app = IgorApp.run(visible=self.visible)
+        with open(HEARTBEAT, "w") as f:
+            f.write(str(os.getpid()))
+        try:
+            while True:
+                time.sleep(self.poll_interval)
+                try:
+                    busy = app.is_procedure_running or not app.is_que_empty
+                except (com_error, IgorBusyError):
+                    #closed by the user, or busy.
+                    if not self._alive(app):
+                        return
+                    continue
+                if not busy and idle_time() > self.idle_timeout:
+                    app.quit(only_when_saved=not self.discard_unsaved)
+                    return
+        finally:
+            with suppress(FileNotFoundError):
+                os.remove(HEARTBEAT)
+
+    @staticmethod
+    def _alive(app):
+        from pythoncom import com_error
+        from igorconsole.exception import IgorBusyError
+        try:
+            app.reference.Name
+        except IgorBusyError:
+            return True
+        except com_error:
+            return False
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep igor running for igorconsole scripts.")
+    parser.add_argument("--idle-timeout", type=float, default=600,
+                        help="quit igor after this idle time in sec.")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--visible", action="store_true")
+    args = parser.parse_args(argv)
+    IgorDaemon(idle_timeout=args.idle_timeout, poll_interval=args.poll_interval,
+               visible=args.visible).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Commands to make waves in igor without sending the data.
+
+The waves of a given shape, filled with a constant, or computed from the
+point numbers (p, q, ...) or the scaled indices (x, y, ...) are made by
+Make and a wave assignment, so only the commands cross the COM boundary.
+"""
+import numpy as np
+
+from . import utils
+
+
+def literal(value):
+    """Igor literal of a real or complex number."""
+    if utils.iscomplex(value):
+        value = complex(value)
+        return "cmplx({0}, {1})".format(utils.igor_num(value.real), utils.igor_num(value.imag))
+    return utils.igor_num(value)
+
+
+def make_command(dest, shape, dtype, overwrite=True):
+    """Make of a wave filled with zeros.
+    Args:
+        dest (str): quoted full path to the wave.
+        shape (int or tuple of int): number of the points in each dimension.
+        dtype (int): igor data type.
+    """
+    shape = (shape,) if utils.isint(shape) else tuple(shape)
+    if len(shape) > 4:
+        raise ValueError("Igor waves have at most 4 dimensions.")
+    shape = ",".join(str(int(n)) for n in shape) if shape else "0"
+    return "Make{0}/Y={1}/N=({2}) {3}".format("/O" if overwrite else "", dtype, shape, dest)
+
+
+def wave_commands(dest, shape, dtype, *, fill=None, expression=None,
+                  scalings=None, units=None, overwrite=True):
+    """Commands to make a wave computed in igor.
+    Args:
+        dest (str): quoted full path to the wave.
+        shape (int or tuple of int): number of the points in each dimension.
+        dtype (int): igor data type.
+        fill (number, optional): value of all the points. Zero if None.
+        expression (str, optional): right side of the wave assignment,
+            e.g. "sin(x)". It is evaluated after the scalings are set.
+        scalings, units: same as OLEIgorWaveCollection.add_numeric.
+        overwrite (bool): overwrite the existing wave.
+    Returns:
+        list of str: commands.
+    """
+    if fill is not None and expression is not None:
+        raise ValueError("Give either fill or expression.")
+    commands = [make_command(dest, shape, dtype, overwrite)]
+    commands.extend(utils.scale_commands(dest, scalings, units))
+    if fill is not None and fill != 0:
+        expression = literal(fill)
+    if expression is not None:
+        commands.append("{0} = {1}".format(dest, expression))
+    return commands
+
+
+def arange_params(start, stop=None, step=1):
+    """(number of points, expression) of a wave like np.arange."""
+    if stop is None:
+        start, stop = 0, start
+    if step == 0:
+        raise ValueError("step must not be zero.")
+    num = max(int(np.ceil((stop - start) / step)), 0)
+    return num, "{0} + p*{1}".format(utils.igor_num(start), utils.igor_num(step))
+
+
+def linspace_params(start, stop, num=50, endpoint=True):
+    """(number of points, expression) of a wave like np.linspace."""
+    num = int(num)
+    if num < 0:
+        raise ValueError("num must not be negative.")
+    div = num - 1 if endpoint else num
+    if div <= 0:
+        return num, utils.igor_num(start)
+    expression = "{0} + p*{1}".format(utils.igor_num(start), utils.igor_num((stop - start) / div))
+    if endpoint:
+        #the last point is exactly stop, as numpy does.
+        expression = "p == {0} ? {1} : {2}".format(num - 1, utils.igor_num(stop), expression)
+    return num, expression
@@ -0,0 +1,216 @@
+"""SavePICT commands to export the graph images, and the cache of the images.
+
+The flags of SavePICT are built by savepict_flags once, and shared by all
+the graphs exported together. IgorApp.export_images saves the graphs into
+one symbolic path by batched commands and reads the files back.
+
+ImageCache keeps the exported images keyed by the content of the graph
+(the experiment identifier, the recreation macro and the modification
+counts of the waves shown) and the export parameters, in memory and
+optionally on disk. Both tiers are bounded, dropping the least recently
+used images first.
+"""
+import collections
+from contextlib import suppress
+import hashlib
+import io
+import os
+import tempfile
+
+from . import utils
+
+#SavePICT /E values
+FILE_TYPES = {
+    "windowsmetafile": 8, "wmf": 8,
+    "enhanced metafile": -2, "metafile": -2, "emf": -2,
+    "bitmap": -4, "bmp": -4,
+    "eps": -3,
+    "pdf": -8,
+    "png": -5,
+    "jpg": -6, "jpeg": -6,
+    "tiff": -7,
+}
+EXTENSIONS = {8: "wmf", -2: "emf", -4: "bmp", -3: "eps", -8: "pdf",
+              -5: "png", -6: "jpg", -7: "tiff"}
+_CMYK_ABLE = (-3, -8, -7)
+_TRANSPARENT_ABLE = (-5,)
+_RESOLUTION_ABLE = (-4, -5, -6)
+_FONT_EMBED_ABLE = (-3, -8)
+_RESOLUTION_SCALES = {"1x": 72, "screen": 72, "2x": 144, "4x": 288, "5x": 360, "8x": 576}
+_RESOLUTIONS = (72, 75, 96, 100, 120, 150, 200, 300, 400, 500, 600, 750, 800,
+                1000, 1200, 1500, 2000, 2400, 2500, 3000, 3600, 4000, 4500, 4800)
+
+
+def file_type(filetype):
+    """SavePICT /E value of the file type name. Unknown names are pdf."""
+    return FILE_TYPES.get(filetype, -8)
+
+
+def savepict_flags(filetype="pdf", color="cmyk", size=None, sizeunit="cm",
+                   embed_fonts=False, overwrite=False, resolution="4x",
+                   preview=False, transparent=False):
+    """SavePICT with the flags except /WIN and /P.
+    Args: see Graph.save_image.
+    Returns:
+        str: e.g. "savepict/o/e=-5/c=0/b=288"
+    """
+    command = []
+    apd = command.append
+    apd("savepict")
+    if overwrite:
+        apd("/o")
+    t = file_type(filetype)
+    apd("/e={0}".format(t))
+
+    if color == "rgb":
+        pass
+    elif color == "cmyk" and t in _CMYK_ABLE:
+        apd("/c=2")
+    else:
+        apd("/c=0")
+
+    if embed_fonts and t in _FONT_EMBED_ABLE:
+        apd("/ef=2" if embed_fonts == "all" else "/ef=1")
+
+    if t in _TRANSPARENT_ABLE and transparent:
+        apd("/tran=1")
+
+    if t == -3 and not preview:
+        apd("/s")
+
+    if t in _RESOLUTION_ABLE:
+        if resolution in _RESOLUTION_SCALES:
+            apd("/b={0}".format(_RESOLUTION_SCALES[resolution]))
+        elif utils.isint(resolution) and (resolution in _RESOLUTIONS):
+            apd("/b={0}".format(resolution))
+        else:
+            raise RuntimeError("Invalid resolution: {}".format(resolution))
+
+    if size is not None:
+        if sizeunit == "cm":
+            apd("/m")
+        elif sizeunit == "inch" or sizeunit == "inches":
+            apd("/i")
+        apd("/w=(0, 0, {0[0]}, {0[1]})".format(size))
+    return "".join(command)
+
+
+def savepict_command(flags, winname, filename, path="igorconsole_path"):
+    """SavePICT of a window into a file in the symbolic path."""
+    return "{0}/win={1}/P={2} as {3}".format(flags, winname, path, utils.igor_str(filename))
+
+
+def decode_image(data):
+    """Open image bytes with PIL without a temporary file."""
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def cache_key(signature, params):
+    """Key of an image from the graph signature and the export parameters.
+    Args:
+        signature (str): result of IgorConsole_GraphSignature.
+        params (dict): export parameters.
+    """
+    digest = hashlib.sha256(signature.encode("utf-8", "surrogatepass"))
+    digest.update(repr(sorted(params.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """Images kept in a LRU memory tier and an optional disk tier.
+    Args:
+        max_bytes (int): upper limit of the total size in memory.
+        directory (str, optional): folder of the disk tier. No disk tier if None.
+        max_disk_bytes (int): upper limit of the total size of the files in
+            directory. The least recently used files are deleted first.
+    """
+    def __init__(self, max_bytes=64 * 2**20, directory=None, max_disk_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._items = collections.OrderedDict()
+        self._nbytes = 0
+        #total size of the files on disk, known after the first scan.
+        self._disk_nbytes = None
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return "<igorconsole.ImageCache {0} images, {1:.3g} MB, {2} hits, {3} misses>"\
+               .format(len(self._items), self._nbytes / 1e6, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Image bytes of the key, or None if not cached."""
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        elif self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            #the modification time orders the files for pruning.
+            with suppress(OSError):
+                os.utime(self._path(key), None)
+            self._remember(key, data)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Keep the image bytes."""
+        self._remember(key, data)
+        if self.directory is not None:
+            #written to a temporary file first, not to leave a broken file.
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            if self._disk_nbytes is None or self._disk_nbytes + len(data) > self.max_disk_bytes:
+                self._prune_disk()
+            else:
+                self._disk_nbytes += len(data)
+
+    def _prune_disk(self):
+        """Delete the oldest files until the total size fits in max_disk_bytes.
+        The newest file is kept.
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files[:-1]:
+            if total <= self.max_disk_bytes:
+                break
+            with suppress(OSError):
+                os.remove(path)
+                total -= size
+        self._disk_nbytes = total
+
+    def _remember(self, key, data):
+        if key in self._items:
+            self._nbytes -= len(self._items.pop(key))
+        self._items[key] = data
+        self._nbytes += len(data)
+        while self._nbytes > self.max_bytes and len(self._items) > 1:
+            _, old = self._items.popitem(last=False)
+            self._nbytes -= len(old)
+
+    def clear(self):
+        """Discard the images in memory. The disk tier is kept."""
+        self._items.clear()
+        self._nbytes = 0
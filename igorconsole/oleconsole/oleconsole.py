@@ -4,6 +4,7 @@
 Todo:
     * Make documents
 """
+import concurrent.futures
 import itertools
 import json
 import logging
@@ -16,22 +17,37 @@ import time
 import warnings
 from abc import ABC, abstractmethod
 from collections import abc as c_abc
-from collections import deque
-from contextlib import suppress
+from collections import deque, namedtuple
+from contextlib import ExitStack, contextmanager, suppress
 
 import numpy as np
 import pythoncom
 from pythoncom import com_error
 import win32com.client
 
-from igorconsole.oleconsole import comutils, utils
+from igorconsole.exception import IgorBusyError, IgorExecuteError, IgorTimeoutError
+from igorconsole.oleconsole import comutils, daemon, generators, images, opqueue, recreation, retry, styles, upload, utils, worker
 import igorconsole.oleconsole.oleconsts as csts
 from igorconsole.abc.igorobjects import IgorObjectBase, IgorFolderBase, IgorVariableBase, IgorWaveBase, IgorObjectCollectionBase
 from igorconsole.abc.igorobjectlike import NdArrayMethodMixin
-from .consts import CODEPAGE, PATH, HOME_DIR, APPEND_SWITCH, COMMAND_MAXLEN
+from .consts import CODEPAGE, PATH, HOME_DIR, APPEND_SWITCH, COMMAND_MAXLEN, FOLDER_INDEX_LIFETIME
+from .consts import COMMAND_MAXLEN_IGOR7
+from .consts import PACKAGE_FOLDER, PROCEDURE_FILE
 logger = logging.getLogger(__name__)
 
+#global string in PACKAGE_FOLDER receiving the results of the helper procedures.
+RESULT_STRING = "S_result"
+#waves given to one Display or AppendToGraph command.
+MAX_TRACES_PER_COMMAND = 100
+#folder of the decimated proxies made by display(lod=True).
+LOD_FOLDER = PACKAGE_FOLDER + ":lod"
+#number of the bins of the proxies, each bin has the min and max points.
+LOD_BINS = 2000
+#Graph.map_color colors more traces than this through a color wave.
+MAP_COLOR_WAVE_THRESHOLD = 200
+
 def object_type(obj):
+    obj = retry.unwrap(obj)
     if not isinstance(obj, win32com.client.CDispatch):
         return type(obj)
     if not hasattr(obj, "_username_"):
@@ -57,65 +73,135 @@ def object_type(obj):
 class IgorApp:
     "Managing connection to igor and sending message."
 
-    def __init__(self):
+    def __init__(self, timeout=None, retry_policy=None):
         self.reference = None
         self._version = None
+        #retry of the calls rejected while igor is busy.
+        self.retry_policy = retry.RetryPolicy() if retry_policy is None else retry_policy
+        #counters of the calls to igor.
+        self.stats = retry.CallStats()
+        #default timeout (sec) of each call. None waits forever.
+        self.timeout = timeout
+        self._deadline = None
+        #time.monotonic() of the last touch of the daemon heartbeat
+        self._last_touch = None
+        self._worker = None
+        self._pending = None
+        self._opqueue = None
+        #lower case folder path -> _FolderIndex
+        self._folder_indexes = {}
+        #counter of the commands which may move or rename igor objects.
+        self._generation = 0
+        #names of the empty folders under root for TempFolder.
+        self._temp_folder_pool = []
+        #(lower case graph name, flags) -> _TraceIndex
+        self._trace_indexes = {}
+        #lower case table name -> _TableIndex
+        self._table_indexes = {}
+        self._procedures_ready = False
+        #lower case names of the graphs showing the decimated proxies
+        self._lod_graphs = set()
+        #images returned by Graph.get_image_binary. None to disable.
+        self.image_cache = images.ImageCache()
+        #outermost UpdateSuspension while in suspend_updates
+        self._suspension = None
 
     @classmethod
-    def run(cls, visible=False):
+    def run(cls, visible=False, timeout=None):
         """Run a new igor instance and connect.
         Params:
             visible (bool): set if show igor  window or not.
+            timeout (float, optional): default time limit in sec of each call.
         Returns:
             IgorApp: igor control instance.
         Exceptions:
             com_error: When the com is not added to the registory.
         """
-        result = IgorApp()
+        result = IgorApp(timeout=timeout)
         com = win32com.client.Dispatch("IgorPro.Application")
+        result._set_reference(com)
+        # igor 7.0-7.06 crashes when it gets commands during the startup.
+        result.wait_ready()
         if visible:
-            com.Visible = True
-        result.reference = com
-        if 7.0 <= result.version < 7.07:
-            # to prevent crashing
-            time.sleep(5)
+            result.show()
         return result
 
     @classmethod
-    def connect(cls, visible=False):
+    def connect(cls, visible=False, timeout=None):
         """Connect to an existing igor instance.
         Params:
             visible (bool): set if show igor window or not.
+            timeout (float, optional): default time limit in sec of each call.
         Returns:
             IgorApp: igor control instance.
         Exceptions:
             com_error: When igor instance was not found,
                 or when the com is not added to the registory.
         """
-        result = IgorApp()
+        result = IgorApp(timeout=timeout)
         com = win32com.client.GetActiveObject("IgorPro.Application")
-        if visible:
-            com.Visible = True
-        result.reference = com
+        result._set_reference(com)
         if 7.0 <= result.version < 7.07:
             # to prevent crashing
-            time.sleep(5)
+            result.wait_ready()
+        if visible:
+            result.show()
+        daemon.touch()
         return result
 
     @classmethod
-    def start(cls, visible=False):
+    def start(cls, visible=False, timeout=None, keep_alive=False, idle_timeout=600):
         """Connecting to the igor instance if exists, else make a new instance.
         Params:
             visible (bool): set if show igor  window or not.
+            timeout (float, optional): default time limit in sec of each call.
+            keep_alive (bool): When igor is not running, start it in a daemon
+                process which keeps igor running for the following scripts.
+            idle_timeout (float): The daemon quits igor when no script has
+                connected for this time in sec.
         Returns:
             IgorApp: igor control instance.
         Exceptions:
             com_error: When the com is not added to the registory.
         """
         try:
-            return cls.connect(visible=visible)
+            return cls.connect(visible=visible, timeout=timeout)
         except com_error:
-            return cls.run(visible=visible)
+            if not keep_alive:
+                return cls.run(visible=visible, timeout=timeout)
+        daemon.spawn(idle_timeout=idle_timeout)
+        limit = time.monotonic() + 60
+        for delay in utils.backoff_delays(0.05, 1.5, 1.0):
+            try:
+                return cls.connect(visible=visible, timeout=timeout)
+            except com_error:
+                if time.monotonic() > limit:
+                    raise
+                time.sleep(delay)
+
+    def wait_ready(self, timeout=60.0):
+        """Wait until igor responds and finishes the startup operations.
+        Args:
+            timeout (float): time limit in sec.
+        Raises:
+            IgorTimeoutError: when igor is not ready in time.
+        """
+        limit = time.monotonic() + timeout
+        for delay in utils.backoff_delays(0.01, 2.0, 0.5):
+            with suppress(com_error, IgorBusyError):
+                if self.status1(csts.Status.OperationQueueIsEmpty)\
+                   and not self.status1(csts.Status.RunningProcedure):
+                    return
+            if time.monotonic() + delay > limit:
+                raise IgorTimeoutError("Igor is not ready in {} sec.".format(timeout))
+            time.sleep(delay)
+
+    def _set_reference(self, com):
+        """Wrap the igor application object to retry the calls while igor is busy."""
+        #the calls through app.reference, and the objects obtained from it,
+        #wait for the call left running by a timeout.
+        self.reference = retry.RetryingDispatch(com, self.retry_policy, self.stats,
+                                                self._guard_direct_call)
 
     def show(self):
         """Make igor window visible."""
@@ -133,50 +219,267 @@ class IgorApp:
         """Reference to the com instance"""
         return self.reference.Application()
 
-    def execute(self, command, logged=False):
+    @contextmanager
+    def deadline(self, seconds):
+        """Limit the total time of the igor calls in the with block.
+        Args:
+            seconds (float or None): time limit. No limit if None.
+        Raises:
+            IgorTimeoutError: when a call in the block exceeds the deadline.
+        Examples:
+            >>> with igor.deadline(30):
+            ...     igor.load_experiment(path)
+            ...     igor.execute("MyAnalysis()")
+        """
+        previous = self._deadline
+        if seconds is not None:
+            new = time.monotonic() + seconds
+            self._deadline = new if previous is None else min(previous, new)
+        try:
+            yield self
+        finally:
+            self._deadline = previous
+
+    @contextmanager
+    def suspend_updates(self, hide=False):
+        """Stop redrawing the graphs and tables in the with block.
+        The windows are updated once at the end of the outermost block,
+        even if an exception is raised. The nested blocks do nothing.
+        Args:
+            hide (bool): hide the visible windows while in the block.
+        Returns:
+            UpdateSuspension: windows suspended, and the igor calls made in the block.
+        Examples:
+            >>> with igor.suspend_updates() as suspension:
+            ...     for wave, values in zip(waves, new_values):
+            ...         wave[:] = values
+            >>> suspension.calls
+            50
+        """
+        if self._suspension is not None:
+            yield self._suspension
+            return
+        suspension = UpdateSuspension(self, hide)
+        suspension.start()
+        self._suspension = suspension
+        try:
+            yield suspension
+        except BaseException:
+            self._suspension = None
+            #an error in resuming must not hide the error of the block.
+            try:
+                suspension.stop()
+            except Exception:
+                logger.warning("Failed to resume the updates of the windows.", exc_info=True)
+            raise
+        self._suspension = None
+        suspension.stop()
+
+    def _remaining_time(self, timeout=None):
+        limits = [t for t in (timeout, self.timeout) if t is not None]
+        if self._deadline is not None:
+            limits.append(self._deadline - time.monotonic())
+        if not limits:
+            return None
+        remaining = min(limits)
+        if remaining <= 0:
+            raise IgorTimeoutError("Deadline of the igor call has already expired.")
+        return remaining
+
+    def _wait_pending(self, remaining):
+        """Wait for the call left running by a previous timeout."""
+        pending = self._pending
+        if pending is None:
+            return
+        try:
+            pending.exception(timeout=remaining)
+        except concurrent.futures.TimeoutError:
+            raise IgorTimeoutError("Igor is still running the previous timed-out call.")
+        self._pending = None
+
+    def _touch_daemon(self):
+        """Keep the daemon from quitting igor while this script is using it."""
+        now = time.monotonic()
+        if self._last_touch is None or now - self._last_touch > daemon.TOUCH_INTERVAL:
+            daemon.touch()
+            self._last_touch = now
+
+    def _guard_direct_call(self):
+        """Wait for the timed-out call before a direct call through app.reference."""
+        if self._pending is not None:
+            self._wait_pending(self._remaining_time())
+
+    def _invoke(self, method, *args, timeout=None):
+        """Call a method of the igor application with the current deadline.
+        Args:
+            method (str): name of the COM method. e.g. "Execute2"
+            args: arguments of the method.
+            timeout (float, optional): time limit of this call in sec.
+        Raises:
+            IgorTimeoutError: when the call does not finish in time.
+                The call keeps running in igor and the next call waits for it.
+        """
+        self._touch_daemon()
+        remaining = self._remaining_time(timeout)
+        if remaining is None and self._pending is None:
+            return getattr(self.reference, method)(*args)
+        start = time.monotonic()
+        self._wait_pending(remaining)
+        if remaining is None:
+            return getattr(self.reference, method)(*args)
+        remaining -= time.monotonic() - start
+        if remaining <= 0:
+            raise IgorTimeoutError("Deadline of the igor call has already expired.")
+        if self._worker is None:
+            self._worker = worker.ComWorker(
+                self.reference,
+                lambda ref: retry.RetryingDispatch(ref, self.retry_policy, self.stats)
+            )
+        future = self._worker.submit(lambda ref: getattr(ref, method)(*args))
+        try:
+            return future.result(timeout=remaining)
+        except concurrent.futures.TimeoutError:
+            self._pending = future
+            raise IgorTimeoutError(
+                "Igor did not respond to {} in {:.3g} sec.".format(method, remaining)
+            )
+
+    def _forget_folders(self, path=None):
+        """Discard the cached object names of the folder and its subfolders.
+        Args:
+            path (str, optional): unquoted full path. All the folders if None.
+        """
+        if path is None:
+            self._folder_indexes.clear()
+            #the objects may have been moved or renamed.
+            self._generation += 1
+            return
+        path = path.lower()
+        for key in [key for key in self._folder_indexes if key.startswith(path)]:
+            del self._folder_indexes[key]
+
+    def _forget_windows(self, name=None):
+        """Discard the cached traces and columns of the window, or all the windows if None."""
+        if name is None:
+            self._trace_indexes.clear()
+            self._table_indexes.clear()
+            return
+        name = name.lower()
+        for key in [key for key in self._trace_indexes if key[0] == name]:
+            del self._trace_indexes[key]
+        self._table_indexes.pop(name, None)
+
+    def execute(self, command, logged=False, timeout=None):
         """Execute igor raw command.
         Args:
             command (str): command. The limit length is 400 chrs.
             logged (bool): if enabled, the command is logged in the igor history.
+            timeout (float, optional): time limit in sec. The default is IgorApp.timeout.
         Returns:
             histories (list of str): Output of the igor in the history area.
             results (list of str): Any strs created by sprintf.
+        Raises:
+            IgorTimeoutError: when igor does not finish the command in time.
+        """
+        #the command may add or remove any objects.
+        self._forget_folders()
+        self._forget_windows()
+        return self._execute(command, logged=logged, timeout=timeout)
+
+    def _execute(self, command, logged=False, timeout=None):
+        """execute without discarding the cached folder contents.
+        Use this only for the commands not adding nor removing igor objects.
         """
-        errcode, errmsg, history, result = self.reference.Execute2(not logged, False, command)
+        errcode, errmsg, history, result = self._invoke(
+            "Execute2", not logged, False, command, timeout=timeout
+        )
         if errcode:
-            raise RuntimeError("Igor execute error " + str(errcode) + ": " + errmsg)
+            raise IgorExecuteError(errcode, errmsg)
 
         history = history.split("\r")
         result = result.split("\r")
 
         return ([i.strip() for i in history][:-1], [i.strip() for i in result])
 
-    def execute_commands(self, commands, logged=False, error_policy="raise"):
+    def display_template(self, template, wave_sets, names=None, *, hide=False,
+                         overwrite=False, timeout=None):
+        """Make many graphs like the template by batched commands.
+        Args:
+            template (recreation.GraphTemplate): e.g. graph.template()
+            wave_sets (list of list): ywave or (ywave, xwave) for each trace of
+                the template, for each graph. The waves given as str must be
+                full paths, because the graphs are made in a temporary folder.
+            names (list of str, optional): names of the graphs. Generated if None.
+            hide (bool): make the graphs hidden.
+            overwrite (bool): kill the windows of the same names first.
+            timeout (float, optional): time limit in sec to make all the graphs.
+        Returns:
+            list of Graph: made graphs.
+        Raises:
+            ValueError: when a name is already used by a window and overwrite is False,
+                or when a wave is given by a relative path.
+        """
+        def to_path(wave):
+            if wave is None:
+                return None
+            if isinstance(wave, OLEIgorWave):
+                return wave.quoted_path
+            if not str(wave).lower().startswith("root:"):
+                raise ValueError("Give the full path of the wave: {}".format(wave))
+            return str(wave)
+
+        if names is None:
+            prefix = utils.current_time("icg_")
+            names = ["{0}_{1}".format(prefix, i) for i in range(len(wave_sets))]
+        #igor renames the graph silently if the name is used.
+        existing = set()
+        if names:
+            #all the window types share the names.
+            existing = {name.lower() for name in
+                        self._fprintf('WinList("*", ";", "")').split(";")[:-1]}
+        used = [name for name in names if name.lower() in existing]
+        if used and not overwrite:
+            raise ValueError("Window names already used: " + ", ".join(used))
+        commands = ["DoWindow/K " + name for name in used]
+        for name, waves in zip(names, wave_sets):
+            pairs = [pair if isinstance(pair, tuple) else (pair, None) for pair in waves]
+            pairs = [(to_path(ywave), to_path(xwave)) for ywave, xwave in pairs]
+            commands.extend(template.commands(name, pairs, hide=hide))
+            self._forget_windows(name)
+        #the graph names must not collide with the waves in the current folder.
+        with TempFolder(self):
+            self.execute_commands(commands, timeout=timeout)
+        return [Graph(name, self) for name in names]
+
+    def execute_commands(self, commands, logged=False, error_policy="raise", timeout=None):
         """Execute many igor commands.
         Args:
             command (iterable): list of commands.
             logged (bool): if enabled, the command is logged in the igor history.
             error_policy (str): "raise", "warn", or "ignore"
+            timeout (float, optional): time limit in sec for all the commands.
         """
         error_policy = error_policy.lower()
         if error_policy == "raise":
-            for merged_command in utils.merge_commands(commands):
-                self.execute(merged_command, logged=logged)
+            with self.deadline(timeout):
+                for merged_command in utils.merge_commands(commands):
+                    self.execute(merged_command, logged=logged)
             return
         if error_policy in ("warn", "ignore"):
             #複数の文を投げた場合、エラーが起きる文の直前の文までは実行されるが、
             #どの文でエラーが起きたかは分からない。
             #そのため、コマンドを一つずつ実行するしかない。
-            for command in commands:
-                try:
-                    self.execute(command, logged=logged)
-                except RuntimeError as e:
-                    if error_policy == "warn":
-                        warnings.warn(
-                            str(e)
-                        )
-                    elif error_policy == "ignore":
-                        pass
+            with self.deadline(timeout):
+                for command in commands:
+                    try:
+                        self.execute(command, logged=logged)
+                    except RuntimeError as e:
+                        if error_policy == "warn":
+                            warnings.warn(
+                                str(e)
+                            )
+                        elif error_policy == "ignore":
+                            pass
             return
         raise ValueError("Invalid error_policy.")
 
@@ -186,19 +489,77 @@ class IgorApp:
         In this case we have to use 'normal' print function. 
         """
         try:
-            _, result = self.execute(
+            _, result = self._execute(
                 'fprintf 0, {}'.format(command)
             )
             return result[0]
         except RuntimeError:
-            (_, *history), _ = self.execute(
+            (_, *history), _ = self._execute(
                 'print {}'.format(command),
                 logged=True
             )
             return "".join(history)
 
-    def async_execute(self, command):
-        self.execute('Execute/P/Z/Q "{}"'.format(command))
+    def _require_procedures(self):
+        """Load and compile the helper procedures of igorconsole once."""
+        if self._procedures_ready:
+            return
+        if self._fprintf('"%d", exists("IgorConsole_Version")') != "6":
+            self.open_file(PROCEDURE_FILE, "procedure", readonly=True, invisible=True)
+            self._invoke("CompileProcedures", csts.CompileProcedure.NoErrorDialog)
+            if self._fprintf('"%d", exists("IgorConsole_Version")') != "6":
+                raise RuntimeError("Failed to compile the procedures of igorconsole: "
+                                   + PROCEDURE_FILE)
+        self.execute_commands(utils.new_folder_commands(PACKAGE_FOLDER))
+        self._procedures_ready = True
+
+    def _call_procedure(self, expression):
+        """Evaluate a string expression using the helper procedures.
+        The result is passed through a global string, which has no length limit
+        unlike fprintf.
+        Args:
+            expression (str): igor string expression. e.g. 'IgorConsole_Version()'
+        Returns:
+            str: value of the expression.
+        """
+        self._require_procedures()
+        self._execute("String/G {0}:{1} = {2}".format(PACKAGE_FOLDER, RESULT_STRING, expression))
+        variable = self.reference.DataFolder(PACKAGE_FOLDER).Variable(RESULT_STRING)
+        return variable.GetStringValue(CODEPAGE)
+
+    @property
+    def operation_queue(self):
+        """Monitor of the operations queued by async_execute."""
+        if self._opqueue is None:
+            self._opqueue = opqueue.OperationQueueMonitor(self)
+        return self._opqueue
+
+    def async_execute(self, command, result=None):
+        """Put a command on the operation queue of igor and return immediately.
+        Igor runs the command when it becomes idle.
+        Args:
+            command (str): igor command.
+            result (str, optional): igor string expression evaluated after the
+                command. Its value is returned by result() of the operation.
+        Returns:
+            QueuedOperation: future resolved when the command is finished.
+                result() raises IgorExecuteError if the command failed.
+        Examples:
+            >>> op = igor.async_execute("MyLongAnalysis()", result='num2str(V_chisq)')
+            >>> # do something on python
+            >>> op.result(timeout=60)
+            '12.5'
+        """
+        return self.operation_queue.submit(command, result=result)
+
+    def wait_queued(self, operations=None, timeout=None):
+        """Wait until the queued operations are finished.
+        Args:
+            operations (list of QueuedOperation, optional): All the pending
+                operations if None.
+            timeout (float, optional): time limit in sec.
+        """
+        self.operation_queue.wait(operations, timeout=timeout)
 
     def get_value(self, *values, logged=False):
         """Get a value evaluated in igor.
@@ -290,6 +651,13 @@ class IgorApp:
             self._version = self.status1(csts.Status.IgorVersion)
         return self._version
 
+    @property
+    def command_maxlen(self):
+        """Upper limit of the length of one command line."""
+        if self.version >= 7.0:
+            return COMMAND_MAXLEN_IGOR7
+        return COMMAND_MAXLEN
+
     @property
     def is_procedure_running(self):
         """Returns True if a user procedure is running."""
@@ -351,7 +719,23 @@ class IgorApp:
             warnings.warn("This file is not saved."
                           + "Please make 'True' only_when_saved flag.")
             return None
-        self.reference.NewExperiment(0)
+        try:
+            self.reference.NewExperiment(0)
+        finally:
+            self._reset_experiment_state()
+
+    def _reset_experiment_state(self):
+        """Discard everything cached about the experiment.
+        A new or loaded experiment closes the helper procedures, and removes
+        the folders and windows known to this app.
+        """
+        self._procedures_ready = False
+        self._folder_indexes.clear()
+        self._generation += 1
+        self._trace_indexes.clear()
+        self._table_indexes.clear()
+        self._lod_graphs.clear()
+        self._temp_folder_pool = []
 
     def new_experiment_wo_save(self):
         """ Create a new experiment file.
@@ -360,7 +744,7 @@ class IgorApp:
         self.new_experiment(only_when_saved=False)
 
 
-    def load_experiment(self, filepath, loadtype=csts.LoadType.Open):
+    def load_experiment(self, filepath, loadtype=csts.LoadType.Open, timeout=None):
         """Load existing experiment file.
         Args:
             filepath (str): path to the experiment file.
@@ -369,29 +753,33 @@ class IgorApp:
                 igorconsole.oleconsts.LoadType.Open or 2: open file
                 igorconsole.oleconsts.LoadType.Marge or 5: marge files.
                 igorconsole.oleconsts.LoadType.Stationery or 4: open filea s a new file.
+            timeout (float, optional): time limit in sec.
         Note:
             You can use IgorApp.load_experiment_as_newfile or IgorApp.merge_experiment instead.
         """
-        self.reference.LoadExperiment(0, loadtype, "", filepath)
+        try:
+            self._invoke("LoadExperiment", 0, loadtype, "", filepath, timeout=timeout)
+        finally:
+            self._reset_experiment_state()
 
-    def load_experiment_as_newfile(self, filepath):
+    def load_experiment_as_newfile(self, filepath, timeout=None):
         """Load existing experiment file as a new file..
         Args:
             filepath (str): path to the experiment file.
         """
-        self.load_experiment(filepath, loadtype=csts.LoadType.Stationery)
+        self.load_experiment(filepath, loadtype=csts.LoadType.Stationery, timeout=timeout)
 
-    def merge_experiment(self, filepath):
+    def merge_experiment(self, filepath, timeout=None):
         """Load existing experiment file and marge it.
         Args:
             filepath (str): path to the experiment file.
         """
-        self.load_experiment(filepath, loadtype=csts.LoadType.Merge)
+        self.load_experiment(filepath, loadtype=csts.LoadType.Merge, timeout=timeout)
 
     def _save(self, filepath, savetype=csts.SaveType.Save,
               filetype=csts.ExpFileType.Default, symbolicpathname=""):
-        self.reference.SaveExperiment(0, savetype, filetype,
-                                         symbolicpathname, filepath)
+        self._invoke("SaveExperiment", 0, savetype, filetype,
+                     symbolicpathname, filepath)
 
     def save(self, filepath="", filetype=csts.ExpFileType.Default):
         """Save and overwrite the current experiment file."""
@@ -450,12 +838,13 @@ class IgorApp:
 
         self.reference.OpenFile(opentype, filekind, symbolicpathname, filepath)
 
-    def quit(self, only_when_saved=True):
+    def quit(self, only_when_saved=True, timeout=30.0):
         """Close igor pro application.
             Args:
                 only_when_saved (bool): The default value is True.
                     If this value is Ture, igor pro application will not be closed
                     when the expeirment file is updated after the last save.
+                timeout (float): time limit in sec to wait for igor to exit.
         """
         if only_when_saved and self.is_experiment_modified:
             warnings.warn("This file is not saved."
@@ -468,11 +857,23 @@ class IgorApp:
             #which causes the exception when you run igor again quicly.
             wmi = win32com.client.GetObject("winmgmts:")
             def number_of_igor_instance():
-                return len([item for item in wmi.InstancesOf("Win32_Process") if item.Properties_("Name").Value == "Igor.exe"])
+                return wmi.ExecQuery(
+                    "SELECT ProcessId FROM Win32_Process WHERE Name = 'Igor.exe'"
+                ).Count
             initial_instance_num = number_of_igor_instance()
             self.reference.Quit()
-            while number_of_igor_instance() >= initial_instance_num > 0:
-                time.sleep(0)
+            limit = time.monotonic() + timeout
+            for delay in utils.backoff_delays(0.01, 1.5, 0.25):
+                if not number_of_igor_instance() >= initial_instance_num > 0:
+                    break
+                if time.monotonic() > limit:
+                    warnings.warn("Igor did not exit in {} sec.".format(timeout))
+                    break
+                time.sleep(delay)
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+        self._pending = None
 
     def quit_wo_save(self):
         """Close igor pro application without saving even the experiment file is updated."""
@@ -485,6 +886,13 @@ class IgorApp:
 
     root = data
 
+    def release_temp_folders(self):
+        """Delete the folders pooled for TempFolder."""
+        pool, self._temp_folder_pool = self._temp_folder_pool, []
+        if pool:
+            self.execute_commands(["KillDataFolder/Z " + utils.quote_path(PACKAGE_FOLDER + ":" + name)
+                                   for name in pool])
+
     @property
     def cwd(self):
         """Current working directory set in Igor pro."""
@@ -525,15 +933,46 @@ class IgorApp:
         """List up panels."""
         return [Panel(item, self) for item in self.window_names(csts.WindowType.Panel)]
 
+    def apply_style(self, style, graphs=None, error_policy="ignore"):
+        """Apply a graph style to many graphs by a few ModifyGraph commands.
+        Args:
+            style (str or dict): name of the style file, or {keyword: value}.
+            graphs (list of Graph or str, optional): target graphs. All the graphs if None.
+            error_policy (str): "raise", "warn" or "ignore". Unless "raise",
+                the graphs rejecting the coalesced command are styled keyword by keyword.
+        """
+        if isinstance(style, str):
+            fragments = styles.load_style(style)
+        else:
+            fragments = styles.compile_style(style)
+        graphs = self.graphs if graphs is None else graphs
+        names = [graph.name if isinstance(graph, Window) else str(graph) for graph in graphs]
+        if not (names and fragments):
+            return
+        try:
+            self.execute_commands(styles.modify_commands(names, fragments, self.command_maxlen))
+            return
+        except RuntimeError:
+            if error_policy.lower() == "raise":
+                raise
+        #ModifyGraph is idempotent, so the graphs styled before the error are styled again.
+        for name in names:
+            try:
+                self.execute_commands(styles.modify_commands([name], fragments,
+                                                             self.command_maxlen))
+            except RuntimeError:
+                self.execute_commands(["ModifyGraph/W={0} {1}".format(name, fragment)
+                                       for fragment in fragments], error_policy=error_policy)
+
     def win_exists(self, name):
         return bool(self.get_value('WinType("{0}")'.format(name)))
 
-    #bug: ywavesが多すぎるときに失敗。
     def display(self, ywaves, xwave=None, *,
                 winname=None, title=None, yaxis=None, xaxis=None,
                 frame=None, hide=False, host=None, win_location=None,
                 unit=None, win_behavior=0, category_plot=False,
-                inset_frame=None, vertical=False, overwrite=False):
+                inset_frame=None, vertical=False, overwrite=False, timeout=None,
+                lod=False, lod_bins=LOD_BINS):
         """ Make a graph on igor. Call Display command in igor
         Params:
             ywaves (Wave, or list, tuple of Waves): wave(s) of y-axis data.
@@ -553,6 +992,11 @@ class IgorApp:
             inset_frame (tuple, optional): (/PG flag.)
             vertical (optional): defualt false. (/VERT flag.)
             overwrite (bool optional): overwrite the graph if winname is duplicated. defualt false.
+            timeout (float, optional): time limit in sec to make the graph.
+            lod (bool, optional): plot min/max envelopes of lod_bins bins made in igor,
+                instead of the waves themselves. They are made again for the new
+                range by Graph.setaxis and Graph.autoaxis. Only for waves without xwave.
+            lod_bins (int, optional): number of the bins of the envelopes.
 
         Note:
             - How to specify the x- and y-axis
@@ -566,6 +1010,7 @@ class IgorApp:
                 1: close the graph without any dialog
                 2: you cannot close the window
                 3: hides the window
+            - Traces more than one command can hold are added by AppendToGraph.
         """
         def yaxis_to_tuple(axis):
             if isinstance(axis, tuple):
@@ -589,17 +1034,24 @@ class IgorApp:
                 else:
                     return ("b", axis)
 
+        def axis_flag(axis):
+            side, name = axis
+            return "/" + side if name is None else "/{0}={1}".format(side, name)
 
-        command = ""
-        if winname is None:
+        generated = winname is None
+        if generated:
             winname = utils.current_time("icg_")
-        if overwrite:
-            command += "DoWindow/K {};".format(winname)
-        elif self.win_exists(winname):
-            raise RuntimeError("Graph already exists")
-        command += "Display"
+        #flags shared by Display and AppendToGraph.
+        trace_flags = ""
         if xaxis is not None:
-            command += "/{0}={1}".format(*xaxis_to_tuple(xaxis))
+            trace_flags += axis_flag(xaxis_to_tuple(xaxis))
+        if yaxis is not None:
+            trace_flags += axis_flag(yaxis_to_tuple(yaxis))
+        if vertical:
+            trace_flags += "/VERT"
+
+        command = "Display"
+        command += trace_flags
         if frame is not None:
             command += "/FG=({0}, {1}, {2}, {3})".format(*frame)
         command += "/HIDE={0}".format(int(hide))
@@ -611,41 +1063,94 @@ class IgorApp:
             if unit.lower() == "cm":
                 command += "/M"
         command += "/K={}".format(win_behavior)
-        if yaxis is not None:
-            command += "/{0}={1}".format(*yaxis_to_tuple(yaxis))
         command += "/N={}".format(winname)
         if self.version > 6.36 and category_plot:
             command += "/NCAT"
         if inset_frame is not None:
             command += "/PG=({0}, {1}, {2}, {3})".format(*inset_frame)
-        if vertical:
-            command += "/VERT"
         if win_location is not None:
             command += "/W=({0}, {1}, {2}, {3})".format(*win_location)
 
-        command += " "
         if isinstance(ywaves, OLEIgorWave):
             ywaves = [ywaves]
-        for i, ywave in enumerate(ywaves):
-            if i != 0:
-                command += ", "
-            command += ywave.quoted_path
-        if xwave is not None:
-            command += " vs {}".format(xwave.quoted_path)
-        if title is not None:
-            command += ' as "{}"'.format(title)
+        ypaths = [ywave.quoted_path for ywave in ywaves]
+        if lod:
+            if xwave is not None:
+                raise ValueError("lod is available only for the waves without xwave.")
+            ypaths = self._lod_proxies(ypaths, lod_bins)
+        xpath = "" if xwave is None else " vs {}".format(xwave.quoted_path)
+        title = "" if title is None else " as {}".format(utils.igor_str(title))
+        #igor 7 or later tells the name of the made graph by S_name.
+        check_name = self.version >= 7.0
+        prefix = ""
+        if overwrite:
+            prefix = "DoWindow/K {}; ".format(winname)
+        elif not (generated or check_name) and self.win_exists(winname):
+            raise RuntimeError("Graph already exists")
+        suffix = '; fprintf 0, "%s", S_name' if check_name else ""
+
+        maxlen = self.command_maxlen
+        append = "AppendToGraph/W={0}{1} ".format(winname, trace_flags)
+        first_room = maxlen - len(prefix + command + " " + xpath + title + suffix)
+        chunks = utils.chunk_items(ypaths, first_room, maxlen - len(append + xpath),
+                                   max_items=MAX_TRACES_PER_COMMAND)
+        first = next(chunks, [])
         # Since the graph name cannot be duplicated with the name of the wave
         # in the current directory, an empty folder is firstlly created and
         # the graph will be created in the folder.
-        commands = command.split(";")
-        with TempFolder(self):
-            while commands:
-                oneline = ""
-                while commands and len(oneline) < 300:
-                    oneline += commands.pop(0) +";"
-                self.execute(oneline)
+        self._forget_windows(winname)
+        with self.deadline(timeout), TempFolder(self):
+            _, result = self._execute(prefix + command + " " + ", ".join(first)
+                                      + xpath + title + suffix)
+            if check_name and result[0].lower() != winname.lower():
+                #igor renamed the graph to avoid the collision.
+                if not generated:
+                    self._execute("DoWindow/K " + result[0])
+                    raise RuntimeError("Graph already exists")
+                winname = result[0]
+                append = "AppendToGraph/W={0}{1} ".format(winname, trace_flags)
+            for chunk in chunks:
+                self._execute(append + ", ".join(chunk) + xpath)
+        if lod:
+            self._lod_graphs.add(winname.lower())
+        else:
+            self._lod_graphs.discard(winname.lower())
         return Graph(winname, self)
 
+    def _lod_proxies(self, paths, bins):
+        """Make the decimated proxies of the waves.
+        Returns:
+            list of str: paths to the proxies, or to the waves which cannot be decimated.
+        """
+        self._require_procedures()
+        #the proxies of each display are in a folder of their own, which is
+        #killed by the next sweep once no window shows them.
+        folder = LOD_FOLDER + ":" + utils.current_time("lod_")
+        proxies = ["{0}:w{1}".format(folder, i) for i in range(len(paths))]
+        commands = [self._sweep_lod_command()]
+        commands.extend(utils.new_folder_commands(folder))
+        #each call prints "1" if the proxy is made, or "0".
+        commands.extend('fprintf 0, "%s", IgorConsole_Decimate({0}, {1}, {2})'.format(
+            utils.igor_str(path), utils.igor_str(proxy), int(bins))
+                        for path, proxy in zip(paths, proxies))
+        made = ""
+        for command in utils.merge_commands(commands):
+            _, result = self._execute(command)
+            made += result[0]
+        self._forget_folders(LOD_FOLDER)
+        return [proxy if flag == "1" else path
+                for path, proxy, flag in zip(paths, proxies, made)]
+
+    @staticmethod
+    def _sweep_lod_command():
+        return 'fprintf 0, "%s", IgorConsole_LodSweep({})'.format(utils.igor_str(LOD_FOLDER))
+
+    def _sweep_lod(self):
+        """Kill the decimated proxies no longer shown in any window."""
+        self._require_procedures()
+        self._execute(self._sweep_lod_command())
+        self._forget_folders(LOD_FOLDER)
+
     def edit(self, waves, *, winname=None, title=None, hide=False, host=None,
              win_location=None, unit=None, win_behavior=0, overwrite=False):
         commands = []
@@ -678,14 +1183,83 @@ class IgorApp:
         for com in commands:
             self.execute(com)
         result = Table(winname, self)
-        for w in waves:
-            result.append(w, return_key=False)
+        result.append_many(waves)
         return result
 
-    def _newpath(self, path: str):
+    @staticmethod
+    def _newpath_command(path: str):
         path = path.replace("\\", ":").replace("/", ":") + ":"
         path = path.replace("::", ":")
-        self.execute('NewPath/O/C igorconsole_path "{}"'.format(path))
+        return 'NewPath/O/C igorconsole_path "{}"'.format(path)
+
+    def _newpath(self, path: str):
+        self.execute(self._newpath_command(path))
+
+    def export_images(self, graphs, filetype="png", directory=None, *,
+                      output="bytes", pool=None, timeout=None, **options):
+        """Export many graphs by batched SavePICT commands.
+        Args:
+            graphs (list of Graph or str): graphs to export.
+            filetype (str): "png", "pdf", "eps" etc. See Graph.save_image.
+            directory (str, optional): folder to save the files as <graph name>.<ext>.
+                A temporary folder removed after reading the files if None.
+            output (str): "bytes", "image" (PIL.Image), "array" (numpy.ndarray
+                decoded by PIL) or "path" (needs directory).
+            pool (list of IgorApp, optional): other igor instances showing the same
+                graphs, e.g. with the same experiment loaded. The graphs are split
+                among the instances and exported in parallel through their
+                operation queues.
+            timeout (float, optional): time limit in sec for all the exports.
+            options: flags of SavePICT as Graph.save_image. overwrite is True by default.
+        Returns:
+            list: the results in the order of graphs.
+        """
+        output = output.lower()
+        if output == "path" and directory is None:
+            raise ValueError('output="path" needs directory.')
+        names = [graph.name if isinstance(graph, Window) else str(graph) for graph in graphs]
+        options.setdefault("overwrite", True)
+        flags = images.savepict_flags(filetype, **options)
+        ext = images.EXTENSIONS[images.file_type(filetype)]
+        filenames = ["{0}.{1}".format(name, ext) for name in names]
+        with ExitStack() as stack:
+            if directory is None:
+                directory = stack.enter_context(tempfile.TemporaryDirectory())
+            apps = [self] + list(pool or [])
+            shares = [range(i, len(names), len(apps)) for i in range(len(apps))]
+            with self.deadline(timeout):
+                queued = []
+                for app, share in zip(apps[1:], shares[1:]):
+                    app._newpath(directory)
+                    queued.append((app, [app.async_execute(
+                        images.savepict_command(flags, names[i], filenames[i]))
+                                         for i in share]))
+                #NewPath is merged into the first command. The path may have been
+                #removed by a new experiment.
+                self.execute_commands([self._newpath_command(directory)]
+                                      + [images.savepict_command(flags, names[i], filenames[i])
+                                         for i in shares[0]])
+                for app, operations in queued:
+                    app.wait_queued(operations, timeout=self._remaining_time())
+                    for operation in operations:
+                        error = operation.exception()
+                        if error is not None:
+                            raise error
+            paths = [os.path.join(directory, filename) for filename in filenames]
+            if output == "path":
+                return paths
+            result = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    result.append(f.read())
+        if output == "bytes":
+            return result
+        result = [images.decode_image(data) for data in result]
+        if output == "image":
+            return result
+        if output == "array":
+            return [np.asarray(image) for image in result]
+        raise ValueError("Invalid output.")
 
     def append_to_waves(self, waves, vals):
         """Append multiple values to multiple waves respectively.
@@ -805,22 +1379,56 @@ class IgorApp:
 
 
 class OLEIgorObjectBase(IgorObjectBase):
+    #COM object, and the unquoted full path of the object made from a path.
+    #An object made from a path refers to whatever is at the path, and its
+    #COM object is resolved on the first use, and again after the commands
+    #which may move or rename objects (IgorApp._generation).
+    #An object made from a COM object follows it, and asks igor its path.
+    _reference = None
+    _known_path = None
+    _generation = None
+
+    @property
+    def reference(self):
+        """COM object of the Igor object."""
+        ref = self._reference
+        if self._known_path is not None\
+           and (ref is None or self._generation != self.app._generation):
+            ref = self._resolve(self._known_path)
+            object.__setattr__(self, "_reference", ref)
+            object.__setattr__(self, "_generation", self.app._generation)
+        return ref
+
+    @reference.setter
+    def reference(self, val):
+        object.__setattr__(self, "_reference", val)
+        object.__setattr__(self, "_known_path", None)
+
+    def _resolve(self, path):
+        raise NotImplementedError()
+
     def _path(self, relative=False, quoted=False):
         return self.reference.Path(relative, quoted)
 
     @property
     def path(self):
         """Unquoted full path to the Igor object."""
+        if self._known_path is not None:
+            return self._known_path
         return self._path(relative=False, quoted=False)
 
     @property
     def quoted_path(self):
         """Quoted full path to the Igor object."""
+        if self._known_path is not None:
+            return utils.quote_path(self._known_path)
         return self._path(relative=False, quoted=True)
 
     @property
     def name(self):
         """Name of the Igor object."""
+        if self._known_path is not None:
+            return self._known_path.rsplit(":", 1)[1]
         return self.reference.Name
 
     @property
@@ -834,19 +1442,180 @@ class OLEIgorObjectBase(IgorObjectBase):
         return path[0 : path.rfind(":", 0, -1)+1]
 
 
+class _FolderIndex:
+    """Names of the objects in a folder, listed by one DataFolderDir call."""
+    KINDS = (("FOLDERS", "folder"), ("WAVES", "wave"),
+             ("VARIABLES", "variable"), ("STRINGS", "variable"))
+
+    def __init__(self, listing):
+        self.time = time.monotonic()
+        #lower case name -> (kind, name). igor names are case insensitive.
+        self.names = {}
+        #lower case name -> igorconsole object
+        self.handles = {}
+        #kind -> names in the order of igor.
+        self.listing = {"folder": [], "wave": [], "variable": []}
+        for key, kind in self.KINDS:
+            for name in listing.get(key, []):
+                self.names.setdefault(name.lower(), (kind, name))
+                self.listing[kind].append(name)
+
+    @property
+    def is_fresh(self):
+        return time.monotonic() - self.time < FOLDER_INDEX_LIFETIME
+
+    def lookup(self, name):
+        return self.names.get(name.lower())
+
+
+def _to_npdtype(igor_data_type):
+    """numpy dtype of the data type read by the helper procedures.
+    None stays None, and the types numpy does not know are returned as they are.
+    """
+    if igor_data_type is None:
+        return None
+    return utils.NP_DTYPE.get(igor_data_type, igor_data_type)
+
+
+class FolderSnapshot:
+    """Folder tree read by OLEIgorFolder.snapshot in one call.
+    Attributes:
+        path (str): unquoted full path of the folder.
+        loaded (bool): False if the folder is below the depth limit.
+            Its contents are not read.
+        waves (dict): name -> {"dtype": data type, "shape": tuple, "modcount": int}
+        variables (dict): name -> {"dtype": data type or None for numeric variables}
+        subfolders (dict): name -> FolderSnapshot
+    """
+    def __init__(self, path, loaded=True):
+        self.path = path
+        self.loaded = loaded
+        self.waves = {}
+        self.variables = {}
+        self.subfolders = {}
+
+    @property
+    def name(self):
+        return self.path.split(":")[-2]
+
+    def __repr__(self):
+        return "<igorconsole.FolderSnapshot at: {}>".format(self.path)
+
+    @classmethod
+    def from_text(cls, text):
+        """Build the tree from the result of IgorConsole_Snapshot."""
+        root = None
+        folders = {}
+        for path, loaded, waves, variables in utils.parse_snapshot(text):
+            folder = cls(path, loaded)
+            for name, dtype, shape, modcount in waves:
+                folder.waves[name] = {"dtype": _to_npdtype(dtype), "shape": shape,
+                                      "modcount": modcount}
+            for name, dtype, _, _ in variables:
+                folder.variables[name] = {"dtype": _to_npdtype(dtype)}
+            parent = folders.get(path[0 : path.rfind(":", 0, -1)+1])
+            if parent is None:
+                root = folder
+            else:
+                parent.subfolders[folder.name] = folder
+            folders[path] = folder
+        return root
+
+    def walk(self):
+        """Yield the loaded folders in this tree, depth first."""
+        stack = [self]
+        while stack:
+            folder = stack.pop()
+            if not folder.loaded:
+                continue
+            yield folder
+            stack.extend(reversed(list(folder.subfolders.values())))
+
+
+_class_attribute_cache = {}
+
+def _class_attributes(cls):
+    """Set of the attribute names of the class, instead of calling dir every time."""
+    try:
+        return _class_attribute_cache[cls]
+    except KeyError:
+        result = _class_attribute_cache[cls] = frozenset(dir(cls))
+        return result
+
+
 # 代入演算子オーバーロードの影響でクラス内に代入できなので注意。
 #attributeを増やすにはsetattrメソッドを使うこと。
 class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
     def __init__(self, reference, app, *, input_check=True):
         set_ = lambda i, p: self.setattr(i, p)
         set_("app", app)
+        path = None
         if isinstance(reference, str):
-            reference = app.reference.DataFolder(reference)
-        elif (not input_check) or object_type(reference) == "DataFolder":
+            path = utils.normalize_folder_path(reference)
+            #the full path is resolved on the first use.
+            reference = None if path is not None else app.reference.DataFolder(reference)
+        elif (reference is None) or (not input_check) or object_type(reference) == "DataFolder":
             pass
         else:
             raise TypeError("reference is not a DataFolder")
-        set_("reference", reference)
+        set_("_reference", reference)
+        set_("_known_path", path)
+
+    def _resolve(self, path):
+        return self.app.reference.DataFolder(path)
+
+    @property
+    def quoted_path(self):
+        """Quoted full path to the Igor object."""
+        return utils.quote_path(self.path)
+
+    @property
+    def name(self):
+        """Name of the Igor object."""
+        return self.path.split(":")[-2]
+
+    def _index(self):
+        path = self.path
+        key = path.lower()
+        index = self.app._folder_indexes.get(key)
+        if index is None or not index.is_fresh:
+            #the helper procedures pass the listing of a large folder without truncation.
+            listing = self.app._call_procedure(
+                "DataFolderDir(-1, ${})".format(utils.igor_str(utils.quote_path(path))))
+            index = _FolderIndex(utils.parse_data_folder_dir(listing))
+            self.app._folder_indexes[key] = index
+        return index
+
+    def _lookup(self, name):
+        """(kind, name) of the object in this folder, or None if not found.
+        kind is "folder", "wave" or "variable".
+        """
+        if not isinstance(name, str):
+            return None
+        return self._index().lookup(name)
+
+    def _get(self, kind, name):
+        path = self.path
+        index = self.app._folder_indexes.get(path.lower())
+        handle = None if index is None else index.handles.get(name.lower())
+        if handle is None:
+            if kind == "folder":
+                handle = OLEIgorFolder(path + name + ":", self.app)
+            elif kind == "wave":
+                handle = OLEIgorWave(path + name, self.app)
+            else:
+                handle = OLEIgorVariable(path + name, self.app)
+            if index is not None:
+                index.handles[name.lower()] = handle
+        return handle
+
+    def _forget(self):
+        """Discard the cached object names after modifying this folder."""
+        self.app._forget_folders(self.path)
+
+    def refresh(self):
+        """Discard the cached object names to see the changes made in igor."""
+        self._forget()
 
     @property
     def is_inuse(self):
@@ -867,38 +1636,32 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
         object.__setattr__(self, item, val)
 
     def __getattr__(self, key):
-        if key in dir(self):
-            raise AttributeError()
-        if key in self:
-            return self.__getitem__(key)
-        raise AttributeError("{} is not in this folder.".format(key))
+        #igor names do not start with "_".
+        if key.startswith("_") or key in _class_attributes(type(self)):
+            raise AttributeError(key)
+        found = self._lookup(key)
+        if found is None:
+            raise AttributeError("{} is not in this folder.".format(key))
+        return self._get(*found)
 
     def __setattr__(self, item, val):
-        if item in self.subfolders:
+        found = self._lookup(item)
+        if found is not None and found[0] == "folder":
             raise KeyError(item + " is already exists as a folder.")
-        if item in dir(self):
-            raise warnings.warn(item
-                                + " will be screened by the class atribute. "
-                                + "Use dictionary expression (folder[key]) to acccess.",
-                                UserWarning)
+        if item in _class_attributes(type(self)):
+            warnings.warn(item
+                          + " will be screened by the class atribute. "
+                          + "Use dictionary expression (folder[key]) to acccess.",
+                          UserWarning)
         self.__setitem__(item, val)
 
     def __getitem__(self, key):
-        temp = self.subfolders
-        if key in temp:
-            return temp[key]
-
-        temp = self.variables
-        if key in temp:
-            return temp[key]
-
-        temp = self.waves
-        if key in temp:#Slow because of the bug of igor pro.
-            return temp[key]
-
         if not isinstance(key, str):
             raise TypeError("key should be a string.")
-        raise KeyError("Object {} not found.".format(key))
+        found = self._lookup(key)
+        if found is None:
+            raise KeyError("Object {} not found.".format(key))
+        return self._get(*found)
 
     def __setitem__(self, key, val):
         if OLEIgorWaveCollection.addable(val):
@@ -909,29 +1672,86 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
             self.subfolders[key] = val
         else:
             raise ValueError("Cannot convert to igor object.")
+        self._forget()
 
     def __contains__(self, name):
-        ref = self.reference
-        result = self._data_folders_ref.DataFolderExists(name)\
-                 or ref.WaveExists(name)\
-                 or ref.VariableExists(name)
-        return result
+        return self._lookup(name) is not None
 
     @property
     def subfolders(self):
         """Collection of the subfolders in this folder."""
-        return OLEIgorFolderCollection(self.reference.SubDataFolders, self.app)
+        return OLEIgorFolderCollection(None, self.app, self)
 
     @property
     def waves(self):
         """Collection of the waves in this folder."""
-        return OLEIgorWaveCollection(self.reference.Waves, self.app, self)
+        return OLEIgorWaveCollection(None, self.app, self)
 
     @property
     def variables(self):
         """Collection of the variables in this folder."""
-        return OLEIgorVariableCollection(self.reference.Variables, self.app)
+        return OLEIgorVariableCollection(None, self.app, self)
 
+    def snapshot(self, depth=None, include=("waves", "variables")):
+        """Read the tree of the folders below this folder in one call.
+        Args:
+            depth (int, optional): depth limit of the subfolders. No limit if None.
+                The subfolders just below the limit are listed without the contents.
+            include (iterable of str): contents to read, "waves" and/or "variables".
+        Returns:
+            FolderSnapshot: tree of the folders with the metadata of the waves.
+        """
+        include = {item.lower() for item in include}
+        unknown = include - {"waves", "variables"}
+        if unknown:
+            raise ValueError("Unknown contents: {}".format(", ".join(sorted(unknown))))
+        flags = (1 if "waves" in include else 0) | (2 if "variables" in include else 0)
+        depth = "inf" if depth is None or depth == float("inf") else int(depth)
+        text = self.app._call_procedure("IgorConsole_Snapshot({0}, {1}, {2}, {3})".format(
+            utils.igor_str(self.quoted_path), utils.igor_str(self.path), depth, flags
+        ))
+        return FolderSnapshot.from_text(text)
+
+    def copy_to(self, folder, name=None):
+        """Copy this folder with all its contents into a folder.
+        The copy is made by DuplicateDataFolder in igor if the folder is in
+        the same igor instance, without reading the data. The contents are
+        merged into the existing folder of the same name, as upload does.
+        Args:
+            folder (OLEIgorFolder or str): destination parent folder, or its full path.
+            name (str, optional): name of the copy. The same name if None.
+        Returns:
+            OLEIgorFolder: copied folder.
+        Raises:
+            ValueError: when the destination is inside this folder.
+        """
+        if isinstance(folder, str):
+            folder = OLEIgorFolder(folder, self.app)
+        name = self.name if name is None else name.replace("'", "")
+        path = folder.path + name
+        if folder.app is self.app:
+            source = self.path.lower()
+            if (path + ":").lower() == source:
+                #copied onto itself. nothing to do.
+                return OLEIgorFolder(path + ":", self.app)
+            if (path + ":").lower().startswith(source):
+                raise ValueError("Cannot copy {0} into itself: {1}".format(self.path, path))
+            if self.app.version >= 8.0:
+                #merge, overwriting the objects of the same names.
+                flag = "/O=2"
+            elif self.app._fprintf('"%d", DataFolderExists({})'.format(
+                    utils.igor_str(utils.quote_path(path)))) == "0":
+                flag = ""
+            else:
+                #igor 6 and 7 cannot merge into the existing folder.
+                flag = None
+            if flag is not None:
+                self.app._execute("DuplicateDataFolder{0} {1}, {2}".format(
+                    flag, self.quoted_path.rstrip(":"), utils.quote_path(path)))
+                folder._forget()
+                return OLEIgorFolder(path + ":", self.app)
+        folder.subfolders.upload(name, self)
+        return OLEIgorFolder(path + ":", folder.app)
 
     def make_folder(self, name, overwrite=False):
         """Make a new folder.
@@ -944,7 +1764,120 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
         """
         return self.subfolders.add(name, overwrite)
 
-    def make_wave(self, name, array_like=None, shape=None, overwrite=True, dtype=None):
+    def make_folders(self, paths):
+        """Make many folders and their parents, if not exist, by a few commands.
+        Args:
+            paths (iterable of str): paths relative to this folder.
+                e.g. ["a", "a:b", "c:d:e"]
+        Returns:
+            list of OLEIgorFolder: the folders in the order of paths.
+        """
+        commands = []
+        made = set()
+        result = []
+        for path in paths:
+            path = self.path + path.replace("'", "").strip(":")
+            for command in utils.new_folder_commands(path):
+                if command not in made:
+                    made.add(command)
+                    commands.append(command)
+            result.append(OLEIgorFolder(path + ":", self.app))
+        self.app.execute_commands(commands)
+        return result
+
+    @contextmanager
+    def transaction(self, copy=False):
+        """Rebuild this folder in a hidden staging folder, and swap it in at the end.
+        The staging folder is in PACKAGE_FOLDER, and is moved to the place of
+        this folder by one command when the with block ends without exceptions.
+        Graphs and other clients see either the old or the new contents.
+        If an exception is raised, the staging folder is discarded and this
+        folder is left untouched.
+        Args:
+            copy (bool): start from a copy of the current contents made in igor.
+                The staging folder is empty if False.
+        Yields:
+            OLEIgorFolder: staging folder. Use the bulk operations such as
+                subfolders.upload and make_folders to fill it.
+        Note:
+            Graphs showing the waves of the old folder are made to show the
+            waves at the same paths in the new folder by ReplaceWave in the
+            swap command. The old folder is killed unless it is still in use,
+            e.g. by a table, and is moved to PACKAGE_FOLDER:retired if it is.
+            The retired folders no longer in use are killed by the next transaction.
+            After the swap, the staging folder refers to this folder, but the
+            objects got from the staging folder refer to the paths in the
+            staging folder, which no longer exist.
+        Examples:
+            >>> with igor.root.f["analysis"].transaction() as staging:
+            ...     staging.subfolders.upload("fit", results)
+            ...     staging["params"] = params
+        """
+        path = self.path
+        if path.lower() == "root:":
+            raise ValueError("Cannot replace the root folder.")
+        tx = PACKAGE_FOLDER + ":" + utils.current_time("tx_")
+        staged = tx + ":new:" + self.name
+        old = tx + ":old:" + self.name
+        retired = PACKAGE_FOLDER + ":retired"
+        self.app._require_procedures()
+        commands = utils.new_folder_commands(tx + ":old")
+        if copy:
+            commands.extend(utils.new_folder_commands(tx + ":new"))
+            commands.append("DuplicateDataFolder {0}, {1}".format(
+                self.quoted_path.rstrip(":"), utils.quote_path(staged)))
+        else:
+            commands.extend(utils.new_folder_commands(staged))
+        self.app._execute("; ".join(commands))
+        self.app._forget_folders(PACKAGE_FOLDER)
+        staging = OLEIgorFolder(staged + ":", self.app)
+        try:
+            yield staging
+            exists = self.app._fprintf('"%d", DataFolderExists({})'.format(
+                utils.igor_str(self.quoted_path))) == "1"
+            swap = utils.swap_folder_commands(path, staged, tx + ":old", exists=exists)
+            if exists:
+                #the graphs show the new waves from the same command on.
+                swap.append('fprintf 0, "%s", IgorConsole_ReplaceWaves({0}, {1}, {2})'.format(
+                    utils.igor_str(utils.quote_path(old) + ":"),
+                    utils.igor_str(utils.quote_path(path)),
+                    utils.igor_str(utils.quote_path(retired) + ":")))
+            try:
+                self.app._execute("; ".join(swap))
+            except RuntimeError:
+                #the old folder may have been moved before the error.
+                if exists:
+                    with suppress(RuntimeError):
+                        self.app._execute("MoveDataFolder {0}, {1}".format(
+                            utils.quote_path(old),
+                            utils.quote_path(path.rstrip(":").rsplit(":", 1)[0])))
+                raise
+            #the traces may show other waves now.
+            self.app._forget_windows()
+            object.__setattr__(staging, "_reference", None)
+            object.__setattr__(staging, "_known_path", path)
+        finally:
+            #the old folder cannot be killed while its waves are in use.
+            _, result = self.app._execute('KillDataFolder/Z {0}; fprintf 0, "%d", DataFolderExists({1})'\
+                                          .format(utils.quote_path(old), utils.igor_str(utils.quote_path(old))))
+            commands = []
+            if result[0] == "1":
+                tx_name = tx.rsplit(":", 1)[1]
+                commands.extend(utils.new_folder_commands(retired))
+                commands.append("RenameDataFolder {0}, {1}".format(utils.quote_path(old), tx_name))
+                commands.append("MoveDataFolder {0}, {1}".format(
+                    utils.quote_path(tx + ":old:" + tx_name), utils.quote_path(retired)))
+                logger.info("old contents of %s are in use, and kept in %s:%s", path, retired, tx_name)
+            commands.append("KillDataFolder/Z " + utils.quote_path(tx))
+            self.app._execute("; ".join(commands))
+            self.app._forget_folders(path.rstrip(":").rsplit(":", 1)[0] + ":")
+            self.app._forget_folders(PACKAGE_FOLDER)
+            #the cached COM objects refer to the old objects.
+            self.app._generation += 1
+            object.__setattr__(self, "_reference", None)
+            object.__setattr__(self, "_known_path", path)
+
+    def make_wave(self, name, array_like=None, shape=None, overwrite=True, dtype=None, fill=None):
         """Make a new wave.
         Args:
             name (str): name of the wave.
@@ -953,9 +1886,14 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
             overwrite (bool): Overwrite existing wave if True.
                 The default value is True.
             dtype (np.dtype): data type of the wave.
+            fill (number): Optional. Value of all the points when array_like is not specified.
+                The wave is made in igor without sending the data.
         Returns:
             wave: Made wave.
         """
+        if array_like is None and fill is not None:
+            shape = 1 if shape is None else shape
+            return self.waves.make(name, shape, fill=fill, overwrite=overwrite, dtype=dtype)
         return self.waves.add(name, array_like, shape=shape, overwrite=overwrite, dtype=dtype)
 
     def make_variable(self, name, value, overwrite=True):
@@ -980,6 +1918,7 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
             target (name): name of the subfolder.
         """
         self._data_folders_ref.Remove(target)
+        self._forget()
 
     def delete(self):
         """Delite this folder."""
@@ -1005,42 +1944,47 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
             OLEIgorVariableCollection: variables of the directory.
             OLEIgorWaveCollection: waves of the directory.
         """
-        def get_children(depth, subfolders):
-            children = [(depth+1, folder) for folder in subfolders]
+        def get_children(depth, snapshot):
+            children = [(depth+1, child) for child in snapshot.subfolders.values()]
             if method == "dfs":
                 return reversed(children)
             else:
                 return children
 
-        deq = deque([(0, self)])
         method = method.lower()
-        if method == "dfs":
-            pop = deq.pop
-        elif method == "bfs":
-            pop = deq.popleft
-        else:
+        if method not in ("dfs", "bfs"):
             raise ValueError("Invalid method. Method must be 'dfs' or 'bfs'.")
+        #the folder tree is read at once, and the collections are made from it.
+        root = self.snapshot(depth=limit_depth)
+        deq = deque([(0, root)])
+        pop = deq.pop if method == "dfs" else deq.popleft
         while deq:
-            depth, folder = pop()
-            subfolders = folder.subfolders
+            depth, snapshot = pop()
             if depth >= shallower_limit:
-                yield folder, subfolders, folder.variables, folder.waves
+                folder = self if snapshot is root else OLEIgorFolder(snapshot.path, self.app)
+                yield (folder,
+                       OLEIgorFolderCollection(None, self.app, folder, names=list(snapshot.subfolders)),
+                       OLEIgorVariableCollection(None, self.app, folder, names=list(snapshot.variables)),
+                       OLEIgorWaveCollection(None, self.app, folder, names=list(snapshot.waves)))
             if depth < limit_depth:
-                deq.extend(get_children(depth, subfolders))
+                deq.extend(get_children(depth, snapshot))
     
     def to_DataFrame(self):
         """Convert igor folder to pandas.DataFrame"""
         return utils.to_pd_DataFrame(self._igorconsole_to_igorfolder())
 
-    def _igorconsole_to_igorfolder(self):
+    def _igorconsole_to_igorfolder(self, snapshot=None):
+        if snapshot is None:
+            #names of the whole tree by one call.
+            snapshot = self.snapshot(include=("waves", "variables"))
         folders = {}
-        for f in self.subfolders:
-            folders[f.name] = f._igorconsole_to_igorfolder()
+        for name, sub in snapshot.subfolders.items():
+            folders[name] = OLEIgorFolder(sub.path, self.app)._igorconsole_to_igorfolder(sub)
         contents = {}
-        for v in self.variables:
-            contents[v.name] = v._igorconsole_to_igorvariable()
-        for w in self.waves:
-            contents[w.name] = w._igorconsole_to_igorwave()
+        for name in snapshot.variables:
+            contents[name] = OLEIgorVariable(snapshot.path + name, self.app)._igorconsole_to_igorvariable()
+        for name in snapshot.waves:
+            contents[name] = OLEIgorWave(snapshot.path + name, self.app)._igorconsole_to_igorwave()
         info = {
             "type": "IgorFolder",
             "subfolders": folders,
@@ -1054,38 +1998,150 @@ class OLEIgorFolder(OLEIgorObjectBase, IgorFolderBase):
 
     v = variables
 
+class UpdateSuspension:
+    """Graphs and tables not redrawn while in IgorApp.suspend_updates.
+    PauseUpdate works only in a macro, so each window is suspended by DoUpdate/DISA=1.
+    The windows made in the block are not suspended.
+    Attributes:
+        windows (list of str): suspended windows.
+        hidden (list of str): windows hidden in the block.
+        calls (int): igor calls made in the block. Each of them would redraw
+            the windows showing the modified waves without the suspension.
+    """
+    def __init__(self, app, hide=False):
+        self.app = app
+        self.hide = hide
+        self.windows = []
+        self.hidden = []
+        self.calls = 0
+        self._calls_at_start = 0
+
+    def __repr__(self):
+        return "<igorconsole.UpdateSuspension {0} windows, {1} calls>"\
+               .format(len(self.windows), self.calls)
+
+    def start(self):
+        self._calls_at_start = self.app.stats.calls
+        self.windows = self.app._fprintf('WinList("*", ";", "WIN:3")').split(";")[:-1]
+        commands = ["DoUpdate/W={}/DISA=1".format(name) for name in self.windows]
+        if self.hide:
+            self.hidden = self.app._fprintf('WinList("*", ";", "WIN:3,VISIBLE:1")').split(";")[:-1]
+            commands.extend("SetWindow {} hide=1".format(name) for name in self.hidden)
+        self._run(commands)
+
+    def stop(self):
+        self.calls = self.app.stats.calls - self._calls_at_start
+        commands = ["DoUpdate/W={}/DISA=0".format(name) for name in self.windows]
+        commands.extend("SetWindow {} hide=0".format(name) for name in self.hidden)
+        commands.append("DoUpdate")
+        #the windows are resumed even after the deadline of the block.
+        deadline, self.app._deadline = self.app._deadline, None
+        try:
+            self._run(commands)
+        finally:
+            self.app._deadline = deadline
+
+    def _run(self, commands):
+        """Run the commands merged, or one by one if any fails.
+        Raises:
+            IgorTimeoutError: when any command timed out. The others are run.
+        """
+        if not commands:
+            return
+        try:
+            for command in utils.merge_commands(commands):
+                self.app._execute(command)
+            return
+        except (RuntimeError, IgorTimeoutError):
+            #some windows were killed in the block, or igor was slow.
+            pass
+        timeout = None
+        for command in commands:
+            try:
+                self.app._execute(command)
+            except RuntimeError:
+                pass
+            except IgorTimeoutError as e:
+                if timeout is None:
+                    timeout = e
+        if timeout is not None:
+            raise timeout
+
+
 class TempFolder(OLEIgorFolder):
+    """Empty folder in PACKAGE_FOLDER, made current while in the with block.
+    The folders are pooled in the app and reused by the next TempFolder,
+    so entering and leaving takes one command each.
+    A folder left with subfolders is emptied by one more command, and is
+    not pooled if waves in use are still there.
+    IgorApp.release_temp_folders deletes the pooled folders.
+    """
     def __init__(self, app, name=None):
         super().__init__(None, app, input_check=False)
-        if name is None:
-            name = utils.current_time("__ictf_")
         self.setattr("_tmpfname", name)
 
     def __enter__(self):
-        self.setattr("current_dir", self.app.cwd)
+        name = self._tmpfname
+        if name is None:
+            pool = self.app._temp_folder_pool
+            name = pool.pop() if pool else utils.current_time("tmp_")
+        path = PACKAGE_FOLDER + ":" + name + ":"
         #このメソッドはFolders.add内で使用しているので、一次フォルダ作成にはAPIを直接呼ぶこと。
-        overwrite = True
-        newf = self.app.reference.DataFolders("root:").Add(self._tmpfname, overwrite)
-        super().setattr("reference", newf)
-        super().chdir()
+        commands = ['fprintf 0, "%s", GetDataFolder(1)']
+        commands.extend(utils.new_folder_commands(PACKAGE_FOLDER))
+        commands.append("NewDataFolder/O/S " + utils.quote_path(path).rstrip(":"))
+        _, result = self.app._execute("; ".join(commands))
+        self.app._forget_folders("root:")
+        self.setattr("_reference", None)
+        self.setattr("_known_path", path)
+        self.setattr("_pooled_name", name)
+        self.setattr("current_dir", OLEIgorFolder(result[0], self.app))
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.current_dir.chdir()
-        super().delete()
+        #empty the folder for the next use, and go back.
+        count = 'CountObjects("{0}",1)+CountObjects("{0}",2)+CountObjects("{0}",3)+CountObjects("{0}",4)'
+        _, result = self.app._execute(
+            'KillWaves/A/Z; KillVariables/A/Z; KillStrings/A/Z; '
+            'fprintf 0, "%d;%s", {0}, StringByKey("FOLDERS", DataFolderDir(1)); cd {1}'\
+            .format(count.format(""), self.current_dir.quoted_path)
+        )
+        remaining, _, subfolders = result[0].partition(";")
+        self.app._forget_folders(self.path)
+        if remaining == "0":
+            self.app._temp_folder_pool.append(self._pooled_name)
+            return
+        path = utils.quote_path(self.path.rstrip(":"))
+        commands = ["KillDataFolder/Z {0}:{1}".format(path, utils.quote_name(name))
+                    for name in subfolders.split(",") if name]
+        commands.append('fprintf 0, "%d", ' + count.format(path))
+        for command in utils.merge_commands(commands):
+            _, result = self.app._execute(command)
+        if result[0] == "0":
+            self.app._temp_folder_pool.append(self._pooled_name)
+        else:
+            #waves in use are left. not reused as an empty folder.
+            self.app._execute("KillDataFolder/Z " + path)
 
 class OLEIgorVariable(OLEIgorObjectBase, IgorVariableBase):
     def __init__(self, reference, app, *, input_check=True):
         self.app = app
         if isinstance(reference, str):
             path = reference.replace("'", "")
-            parent = ":".join(path.split(":")[:-1]) + ":"
-            self.reference = app.reference.DataFolder(parent).Variable(path)
+            if path.startswith("root:"):
+                #the COM object is resolved on the first use.
+                object.__setattr__(self, "_known_path", path)
+            else:
+                self.reference = self._resolve(path)
         elif (not input_check) or object_type(reference) == "Variable":
             self.reference = reference
         else:
             raise TypeError("reference is not a variable")
 
+    def _resolve(self, path):
+        parent = ":".join(path.split(":")[:-1]) + ":"
+        return self.app.reference.DataFolder(parent).Variable(path)
+
     @property
     def dtype(self):
         """Data type of the variable"""
@@ -1150,13 +2206,20 @@ class OLEIgorWave(OLEIgorObjectBase, IgorWaveBase):
         self._length = None
         if isinstance(reference, str):
             path = reference.replace("'", "")
-            parent = ":".join(path.split(":")[:-1]) + ":"
-            self.reference = app.reference.DataFolder(parent).Wave(path)
+            if path.startswith("root:"):
+                #the COM object is resolved on the first use.
+                object.__setattr__(self, "_known_path", path)
+            else:
+                self.reference = self._resolve(path)
         elif (not input_check) or object_type(reference) == "Wave":
             self.reference = reference
         else:
             raise TypeError("reference is not a Wave")
 
+    def _resolve(self, path):
+        parent = ":".join(path.split(":")[:-1]) + ":"
+        return self.app.reference.DataFolder(parent).Wave(path)
+
     def delete(self):
         """Currently not implemented."""
         raise NotImplementedError()
@@ -1527,6 +2590,33 @@ class OLEIgorWave(OLEIgorObjectBase, IgorWaveBase):
         info["array"].strides = obj
         self.parent.waves[self.name] = info
 
+    def copy_to(self, folder, name=None, overwrite=True):
+        """Copy this wave into a folder.
+        The copy is made by Duplicate in igor if the folder is in the same
+        igor instance, without reading the data.
+        Args:
+            folder (OLEIgorFolder or str): destination folder, or its full path.
+            name (str, optional): name of the copy. The same name if None.
+            overwrite (bool): overwrite the existing wave.
+        Returns:
+            OLEIgorWave: copied wave.
+        """
+        if isinstance(folder, str):
+            folder = OLEIgorFolder(folder, self.app)
+        name = self.name if name is None else name.replace("'", "")
+        if folder.app is not self.app:
+            info = self._igorconsole_to_igorwave()
+            return folder.waves.add(name, info["array"], overwrite=overwrite,
+                                    scalings=info["scalings"], units=info["units"])
+        path = folder.path + name
+        if path.lower() == self.path.lower():
+            #copied onto itself. nothing to do.
+            return OLEIgorWave(path, self.app)
+        self.app._execute("Duplicate{0} {1}, {2}".format(
+            "/O" if overwrite else "", self.quoted_path, utils.quote_path(path)))
+        folder._forget()
+        return OLEIgorWave(path, self.app)
+
     def _igorconsole_to_igorwave(self):
         info = {
             "type": "IgorWave",
@@ -1538,21 +2628,72 @@ class OLEIgorWave(OLEIgorObjectBase, IgorWaveBase):
 
 
 class OLEIgorObjectCollection(IgorObjectCollectionBase):
-    def __init__(self, reference, app):
-        self.reference = reference
+    def __init__(self, reference, app, parent=None, names=None):
+        self._reference = reference
         self.app = app
+        #相互参照を作らないように注意
+        self.parent = parent
+        #names already read, e.g. by a snapshot.
+        self._listing = names
+
+    @property
+    def reference(self):
+        """COM collection. Resolved from the parent folder on the first use."""
+        if self._reference is None and self.parent is not None:
+            self._reference = getattr(self.parent.reference, self._COM_NAME)
+        return self._reference
+
+    @reference.setter
+    def reference(self, val):
+        self._reference = val
+
+    def _forget(self):
+        """Discard the cached object names after adding objects."""
+        self._listing = None
+        if self.parent is not None:
+            self.parent._forget()
+        else:
+            self.app._forget_folders()
 
     def __getattr__(self, item):
         return self.__getitem__(item)
 
+    #kind of the objects in _FolderIndex. "folder", "wave" or "variable".
+    _KIND = None
+    #property of the igor DataFolder object returning this collection.
+    _COM_NAME = None
+    #kind number of the objects for IgorConsole_ObjectInfo.
+    _INFO_KINDS = ()
+
+    def _names(self):
+        """Names of the objects listed by one call, or None if the folder is unknown."""
+        if self._listing is not None:
+            return self._listing
+        if self.parent is None:
+            return None
+        return self.parent._index().listing[self._KIND]
+
+    def _handles(self, names):
+        get = self.parent._get
+        return (get(self._KIND, name) for name in names)
+
     def __len__(self):
-        return self.reference.Count
+        names = self._names()
+        if names is None:
+            return self.reference.Count
+        return len(names)
 
     def __iter__(self):
-        return (self[i] for i in range(len(self)))
+        names = self._names()
+        if names is None:
+            return (self[i] for i in range(len(self)))
+        return self._handles(list(names))
 
     def __reversed__(self):
-        return (self[i] for i in range(len(self)-1, -1, -1))
+        names = self._names()
+        if names is None:
+            return (self[i] for i in range(len(self)-1, -1, -1))
+        return self._handles(names[::-1])
 
     def get(self, key):
         """get values if the specified variable exists, else return None
@@ -1576,17 +2717,47 @@ class OLEIgorObjectCollection(IgorObjectCollectionBase):
         pass
 
     def keys(self):
-        return {item.Name for item in self.reference}
+        names = self._names()
+        if names is None:
+            return {item.Name for item in self.reference}
+        return set(names)
 
     def items(self):
-        return [(key, self[key]) for key in self.keys()]
-
+        names = self._names()
+        if names is None:
+            return [(key, self[key]) for key in self.keys()]
+        return list(zip(names, self._handles(names)))
 
     def values(self):
-        return [self[key] for key in self.keys()]
+        names = self._names()
+        if names is None:
+            return [self[key] for key in self.keys()]
+        return list(self._handles(names))
+
+    def info(self):
+        """Metadata of all the objects in this collection, fetched at once.
+        Returns:
+            dict: name -> {"dtype": data type, "shape": tuple, "modcount": int}.
+                dtype is None for numeric variables and folders.
+                shape and modcount are None except for waves.
+        """
+        if self.parent is None:
+            raise ValueError("The folder of this collection is unknown.")
+        result = {}
+        for kind in self._INFO_KINDS:
+            text = self.app._call_procedure("IgorConsole_ObjectInfo({0}, {1})".format(
+                utils.igor_str(self.parent.quoted_path), kind
+            ))
+            for name, dtype, shape, modcount in utils.parse_object_info(text):
+                result[name] = {"dtype": _to_npdtype(dtype), "shape": shape, "modcount": modcount}
+        return result
 
 
 class OLEIgorFolderCollection(OLEIgorObjectCollection):
+    _KIND = "folder"
+    _INFO_KINDS = (4,)
+    _COM_NAME = "SubDataFolders"
+
     def __getitem__(self, key):
         """get folders by numeric index or by the folder name."""
         key = key if isinstance(key, str) else int(key)
@@ -1605,8 +2776,17 @@ class OLEIgorFolderCollection(OLEIgorObjectCollection):
         Returns:
             OLEIgorFolder: made folder.
         """
-        with TempFolder(self.app):
-            return OLEIgorFolder(self.reference.Add(name, overwrite), self.app, input_check=False)
+        if self.parent is None:
+            with TempFolder(self.app):
+                result = OLEIgorFolder(self.reference.Add(name, overwrite), self.app, input_check=False)
+            self._forget()
+            return result
+        #full path does not depend on the current folder.
+        path = self.parent.path + name.replace("'", "")
+        self.app._execute("NewDataFolder{0} {1}".format("/O" if overwrite else "",
+                                                        utils.quote_path(path)))
+        self._forget()
+        return OLEIgorFolder(path + ":", self.app)
     
     @staticmethod
     def addable(obj):
@@ -1618,31 +2798,80 @@ class OLEIgorFolderCollection(OLEIgorObjectCollection):
         if isinstance(obj, dict) and ("type" in obj) and (obj["type"] == "IgorFolder"):
             return True
         return False
-    
+
+    @classmethod
+    def _upload_tree(cls, val):
+        """Convert a folder structure into the tree for upload.FolderUpload."""
+        if str(val.__class__) == "<class 'pandas.core.frame.DataFrame'>":
+            val = utils.from_pd_DataFrame(val)
+        if hasattr(val, "_igorconsole_to_igorfolder"):
+            val = val._igorconsole_to_igorfolder()
+        if not (isinstance(val, dict) and ("type" in val) and (val["type"] == "IgorFolder")):
+            raise ValueError("Convert to igor folder structure failed.")
+        tree = {"subfolders": {}, "waves": {}, "variables": {}}
+        items = itertools.chain(val["subfolders"].items(), val["contents"].items())
+        for name, item in items:
+            if OLEIgorWaveCollection.addable(item):
+                if hasattr(item, "_igorconsole_to_igorwave"):
+                    item = item._igorconsole_to_igorwave()
+                if isinstance(item, dict):
+                    item = (item["array"], item.get("scalings"), item.get("units"))
+                else:
+                    item = (item, None, None)
+                tree["waves"][name] = item
+            elif OLEIgorVariableCollection.addable(item):
+                if hasattr(item, "_igorconsole_to_igorvariable"):
+                    item = item._igorconsole_to_igorvariable()
+                if isinstance(item, dict):
+                    item = item["value"]
+                tree["variables"][name] = item
+            elif cls.addable(item):
+                tree["subfolders"][name] = cls._upload_tree(item)
+            else:
+                raise ValueError("Cannot convert to igor object.")
+        return tree
+
+    def upload(self, name, structure):
+        """Make a folder with all its contents by a few batched calls.
+        Args:
+            name (str): name of the folder.
+            structure: igor folder structure. dict of "IgorFolder" type,
+                pandas.DataFrame, or igorconsole folder.
+        Returns:
+            upload.UploadReport: round trips, size and transfer rate of the upload.
+        """
+        if self.parent is None:
+            raise ValueError("The folder of this collection is unknown.")
+        plan = upload.FolderUpload(self.parent.path + name + ":", type(self)._upload_tree(structure))
+
+        def add_unbatched(path, kind, item_name, value):
+            folder = OLEIgorFolder(path, self.app)
+            if kind == "wave":
+                array, scalings, units = value
+                folder.waves.add_numeric(item_name, array, scalings=scalings, units=units)
+            else:
+                folder.variables.add(item_name, value, overwrite=True)
+
+        report = plan.run(self.app, add_unbatched)
+        self._forget()
+        logger.debug("upload %s: %r", name, report)
+        return report
+
     def __setitem__(self, key, val):
         if not utils.isstr(key):
             raise TypeError("folder name must be a string.")
         if not type(self).addable(val):
             raise TypeError("cannot convert to igor folder structure.")
-        if str(val.__class__) == "<class 'pandas.core.frame.DataFrame'>":
-            val = utils.from_pd_DataFrame(val)
-        if hasattr(val, "_igorconsole_to_igorfolder"):
-            val = val._igorconsole_to_igorfolder()
-        if isinstance(val, dict) and ("type" in val) and (val["type"] == "IgorFolder"):
-            self.add(key, overwrite=True)
-            f = self[key]
-            for name, item in val["subfolders"].items():
-                f[name] = item
-            for name, item in val["contents"].items():
-                f[name] = item
+        if isinstance(val, OLEIgorFolder) and self.parent is not None:
+            #copy_to duplicates the folder in igor if both are in the same instance.
+            val.copy_to(self.parent, key)
             return
-        raise ValueError("Convert to igor folder structure failed.")
+        self.upload(key, val)
 
 class OLEIgorWaveCollection(OLEIgorObjectCollection):
-    def __init__(self, reference, app, parent=None):
-        super().__init__(reference, app)
-        #相互参照を作らないように注意
-        self.parent = parent
+    _KIND = "wave"
+    _INFO_KINDS = (1,)
+    _COM_NAME = "Waves"
 
     def __getitem__(self, key):
         """
@@ -1670,9 +2899,12 @@ class OLEIgorWaveCollection(OLEIgorObjectCollection):
     def add_numeric(self, name, array_like=None, *,
                     shape=None, overwrite=True, dtype=None,
                     scalings=None, units=None):
+        if (array_like is None) and (shape is not None) and (self.parent is not None):
+            #no data to send. made by Make in igor.
+            return self.make(name, shape, overwrite=overwrite, dtype=dtype,
+                             scalings=scalings, units=units)
         if (array_like is None) and (shape is not None):
-            dtype = np.float if dtype is None else dtype
-            array_like = np.zeros(shape)
+            array_like = np.zeros(shape, dtype=np.float64 if dtype is None else dtype)
         elif array_like is None:
             array_like = []
         #convert to np.array once to determine dtype and shape.
@@ -1682,6 +2914,7 @@ class OLEIgorWaveCollection(OLEIgorObjectCollection):
         ashape = array.shape
         shape[:len(ashape)] = ashape
         wv = self.reference.Add(name, dtype, *shape, overwrite)
+        self._forget()
         if issubclass(array.dtype.type, np.complexfloating):
             array = utils.to_igor_complex_wave_order(array)
         nptype, _, variant_array = comutils.nptype_vttype_and_variant_array(array)
@@ -1704,6 +2937,51 @@ class OLEIgorWaveCollection(OLEIgorObjectCollection):
                 result.set_unit(unit, dimension)
         return result
 
+    def make(self, name, shape, *, fill=None, expression=None, dtype=None,
+             scalings=None, units=None, overwrite=True):
+        """Make a wave computed in igor. Only the commands are sent.
+        Args:
+            name (str): name of the wave.
+            shape (int or tuple of int): number of the points in each dimension.
+            fill (number, optional): value of all the points. Zero if None.
+            expression (str, optional): igor expression assigned to the wave,
+                using p, q, x, y, etc. e.g. "exp(-x^2)". The scalings are set before.
+            dtype (np.dtype, optional): data type. float64 if None.
+            scalings, units: same as add_numeric.
+            overwrite (bool): overwrite the existing wave.
+        Returns:
+            OLEIgorWave: made wave.
+        Examples:
+            >>> folder.waves.make("gauss", 1001, expression="exp(-x^2)",
+            ...                   scalings=[(0, 0), (-5, 0.01)])
+        """
+        if self.parent is None:
+            raise ValueError("The folder of this collection is unknown.")
+        if dtype is None:
+            dtype = np.complex128 if utils.iscomplex(fill) else np.float64
+        path = self.parent.path + name.replace("'", "")
+        commands = generators.wave_commands(
+            utils.quote_path(path), shape, utils.to_igor_data_type(dtype),
+            fill=fill, expression=expression, scalings=scalings, units=units,
+            overwrite=overwrite
+        )
+        for command in utils.merge_commands(commands):
+            self.app._execute(command)
+        self._forget()
+        return OLEIgorWave(path, self.app)
+
+    def arange(self, name, start, stop=None, step=1, *, dtype=None, overwrite=True):
+        """Make a wave of evenly spaced values like np.arange, computed in igor.
+        The default dtype is float64, because igor 6 has no 64 bit integer waves.
+        """
+        num, expression = generators.arange_params(start, stop, step)
+        return self.make(name, num, expression=expression, dtype=dtype, overwrite=overwrite)
+
+    def linspace(self, name, start, stop, num=50, *, endpoint=True, dtype=None, overwrite=True):
+        """Make a wave of evenly spaced values like np.linspace, computed in igor."""
+        num, expression = generators.linspace_params(start, stop, num, endpoint)
+        return self.make(name, num, expression=expression, dtype=dtype, overwrite=overwrite)
+
     def _to_Series_dict(self, index="position"):
         return {name: wave.to_Series(index=index) for name, wave,
                 in zip(self.keys(), self.values())}
@@ -1744,6 +3022,11 @@ class OLEIgorWaveCollection(OLEIgorObjectCollection):
         if not type(self).addable(val):
             raise TypeError("This object cannot be converted to igor wave.")
 
+        if isinstance(val, OLEIgorWave) and val.app is self.app and self.parent is not None:
+            #copied in igor without reading the data.
+            val.copy_to(self.parent, key)
+            return
+
         if hasattr(val, "_igorconsole_to_igorwave"):
             val = val._igorconsole_to_igorwave()
         if isinstance(val, dict) and ("type" in val) and (val["type"] == "IgorWave"):
@@ -1759,6 +3042,10 @@ class OLEIgorWaveCollection(OLEIgorObjectCollection):
 
 
 class OLEIgorVariableCollection(OLEIgorObjectCollection):
+    _KIND = "variable"
+    _INFO_KINDS = (2, 3)
+    _COM_NAME = "Variables"
+
     def __getitem__(self, key):
         """
         get variables by numeric index or by the folder name.
@@ -1788,12 +3075,14 @@ class OLEIgorVariableCollection(OLEIgorObjectCollection):
         else:
             raise ValueError()
         v = self.reference.Add(name, dtype, overwrite)
+        self._forget()
         v.SetNumericValue(value.real, value.imag)
         return OLEIgorVariable(v, self.app, input_check=False)
 
     def _add_string(self, name, value, overwrite=True):
         dtype = utils.to_igor_data_type(str)
         v = self.reference.Add(name, dtype, overwrite)
+        self._forget()
         v.SetStringValue(CODEPAGE, value)
         return OLEIgorVariable(v, self.app, input_check=False)
     
@@ -1838,10 +3127,31 @@ class Window:
     def kill(self):
         """Delete the window."""
         self.app.execute('DoWindow/K ' + self.name)
+        if self.name.lower() in self.app._lod_graphs:
+            self.app._lod_graphs.discard(self.name.lower())
+            self.app._sweep_lod()
         del self.name
         del self.app
 
 
+TraceInfo = namedtuple("TraceInfo", ["name", "ypath", "xpath", "yaxis", "xaxis", "offset"])
+TraceInfo.__doc__ = """Trace in a graph. ypath and xpath are the unquoted full paths,
+or None if the trace has no such wave. offset is (x, y)."""
+
+
+class _TraceIndex:
+    """Traces of a graph, listed by one IgorConsole_TraceInfo call."""
+    def __init__(self, records):
+        self.traces = [TraceInfo(*record) for record in records]
+        #lower case trace name -> TraceInfo
+        self.by_name = {trace.name.lower(): trace for trace in self.traces}
+        #lower case Y wave path -> TraceInfo of the first trace
+        self.by_ypath = {}
+        for trace in self.traces:
+            if trace.ypath is not None:
+                self.by_ypath.setdefault(trace.ypath.lower(), trace)
+
+
 class Graph(Window):
     def __init__(self, name, app):
         super().__init__(name, app)
@@ -1851,12 +3161,9 @@ class Graph(Window):
 
     def __contains__(self, key):
         if isinstance(key, str):
-            return key in self.keys()
+            return key.lower() in self._index().by_name
         elif isinstance(key, OLEIgorWave):
-            for wave in self.values():
-                if key.is_(wave):
-                    return True
-            return False
+            return key.path.lower() in self._index().by_ypath
         else:
             raise TypeError("Must be a string or wave.")
 
@@ -1886,8 +3193,10 @@ class Graph(Window):
 
     def items(self):
         """Developping."""
-        return [(key, self.trace_wave(key, True, True, True))
-                for key in self.keys()]
+        #traces without a wave (e.g. of a deleted wave) are skipped.
+        return [(trace.name, OLEIgorWave(trace.ypath, self.app))
+                for trace in self._index(self._flags(True, True, True)).traces
+                if trace.ypath is not None]
 
     def get(self, key, default=None):
         """Developping."""
@@ -1899,8 +3208,8 @@ class Graph(Window):
     def __eq__(self, other):
         raise NotImplementedError()
 
-    def traces(self, normal=True, contour=True, hidden=False):
-        """Developping."""
+    @staticmethod
+    def _flags(normal=True, contour=True, hidden=False):
         flags = 0
         if normal:
             flags += 0b1
@@ -1908,17 +3217,44 @@ class Graph(Window):
             flags += 0b10
         if not hidden:
             flags += 0b100
-        
-        listname = self.app._fprintf(
-            'TraceNameList("{0}", ";", {1})'.format(self.name, flags)
-        ).split(";")[:-1]
-        return listname
+        return flags
+
+    def _index(self, flags=0b11):
+        """Traces listed by one call, cached until the graph is modified by igorconsole.
+        The default flags list all the traces including hidden ones.
+        """
+        key = (self.name.lower(), flags)
+        index = self.app._trace_indexes.get(key)
+        if index is None:
+            text = self.app._call_procedure("IgorConsole_TraceInfo({0}, {1})"\
+                                            .format(utils.igor_str(self.name), flags))
+            index = _TraceIndex(utils.parse_trace_info(text))
+            self.app._trace_indexes[key] = index
+        return index
+
+    def refresh(self):
+        """Discard the cached trace list to see the changes made in igor."""
+        self.app._forget_windows(self.name)
+
+    def traces(self, normal=True, contour=True, hidden=False):
+        """Developping."""
+        flags = self._flags(normal, contour, hidden)
+        return [trace.name for trace in self._index(flags).traces]
+
+    def trace_info(self, trace):
+        """Waves, axes and offset of a trace.
+        Args:
+            trace (str): trace name.
+        Returns:
+            TraceInfo: (name, ypath, xpath, yaxis, xaxis, offset)
+        """
+        try:
+            return self._index().by_name[trace.lower()]
+        except KeyError:
+            raise KeyError("Trace {} is not in this graph.".format(trace)) from None
 
     def _to_fullpath(self, trace_name):
-        return self.app._fprintf(
-            'GetWavesDataFolder(TraceNameToWaveRef("{}", "{}"), 2)'\
-                    .format(self.name, trace_name)
-        )
+        return self.trace_info(trace_name).ypath
 
     def trace_wave(self, trace, normal=True, contour=True, hidden=False):
         """Return a Wave object corresponding to the trace name.
@@ -1927,12 +3263,16 @@ class Graph(Window):
         """
         if utils.isint(trace):
             trace = self.traces(normal, contour, hidden)[int(trace)]
-        return OLEIgorWave(self._to_fullpath(trace), self.app)
+        path = self._to_fullpath(trace)
+        if path is None:
+            raise ValueError("Trace {} has no wave.".format(trace))
+        return OLEIgorWave(path, self.app)
 
     def trace_waves(self, normal=True, contour=True, hidden=False):
-        """Return Wave objects shown in this graph."""
-        names = self.traces(normal, contour, hidden)
-        return (OLEIgorWave(self._to_fullpath(name), self.app) for name in names)
+        """Return Wave objects shown in this graph. Traces without a wave are skipped."""
+        traces = self._index(self._flags(normal, contour, hidden)).traces
+        return (OLEIgorWave(trace.ypath, self.app) for trace in traces
+                if trace.ypath is not None)
 
     #def remove_trace(self, waves):
     #    if isinstance(waves, Wave) or isinstance(waves, str):
@@ -1950,6 +3290,58 @@ class Graph(Window):
             command += " vs {0}".format(xwave)
         self.app.execute(command)
 
+    @staticmethod
+    def _wave_path(wave):
+        return wave.quoted_path if isinstance(wave, OLEIgorWave) else str(wave)
+
+    def append_many(self, pairs, axes="lb"):
+        """Append many traces by a few AppendToGraph commands.
+        Args:
+            pairs (iterable): ywave or (ywave, xwave) for each trace.
+                xwave may be None.
+            axes (str): the flags of the axes as position of append. e.g. "lb", "rt"
+        """
+        flags = "/" + "/".join(axes)
+        prefix = "AppendToGraph/W={0}{1} ".format(self.name, flags)
+        #consecutive traces sharing the X wave are appended together.
+        runs = []
+        for pair in pairs:
+            ywave, xwave = pair if isinstance(pair, tuple) else (pair, None)
+            xpath = "" if xwave is None else " vs " + self._wave_path(xwave)
+            if runs and runs[-1][0] == xpath:
+                runs[-1][1].append(self._wave_path(ywave))
+            else:
+                runs.append((xpath, [self._wave_path(ywave)]))
+        commands = []
+        for xpath, ypaths in runs:
+            room = self.app.command_maxlen - len(prefix + xpath)
+            for chunk in utils.chunk_items(ypaths, room, room,
+                                           max_items=MAX_TRACES_PER_COMMAND):
+                commands.append(prefix + ", ".join(chunk) + xpath)
+        if commands:
+            self.app.execute_commands(commands)
+
+    def remove_many(self, traces):
+        """Remove many traces by a few RemoveFromGraph commands.
+        Args:
+            traces (iterable): trace names, or waves whose first traces are removed.
+        """
+        index = self._index()
+        names = []
+        for trace in traces:
+            if isinstance(trace, OLEIgorWave):
+                info = index.by_ypath.get(trace.path.lower())
+                if info is None:
+                    raise KeyError("Wave {} is not in this graph.".format(trace.path))
+                trace = info.name
+            names.append(utils.quote_trace(trace))
+        prefix = "RemoveFromGraph/W={0} ".format(self.name)
+        room = self.app.command_maxlen - len(prefix)
+        commands = [prefix + ", ".join(chunk) for chunk
+                    in utils.chunk_items(names, room, room, max_items=MAX_TRACES_PER_COMMAND)]
+        if commands:
+            self.app.execute_commands(commands)
+
     def modify_by_commands(self, commands, error_policy="raise"):
         """Developping."""
         commands = [commands] if isinstance(commands, str) else commands
@@ -1993,29 +3385,71 @@ class Graph(Window):
             except RuntimeError:
                 pass
 
-    def style(self, style:str):
-        """Developping."""
-        if os.path.exists("{0}/igorconsole/styles/{1}.json".format(HOME_DIR, style)):
-            fpath = "{0}/igorconsole/styles/{1}.json".format(HOME_DIR, style)
-        elif os.path.exists("{0}/../styles/{1}.json".format(PATH,style)):
-            fpath = "{0}/../styles/{1}.json".format(PATH,style)
-        else:
-            raise ValueError("Cannot find the style file.")
-        with open(fpath, "rt") as f:
-            style = json.load(f)
-        self.modify(style, error_policy="ignore")
+    def style(self, style):
+        """Apply a graph style.
+        Args:
+            style (str or dict): name of the style file, or {keyword: value}.
+        """
+        self.app.apply_style(style, [self])
 
-    def map_color(self, style:str, traces=None, *args, **kwargs):
-        """Developping."""
-        traces = self.traces() if traces is None else traces
-        length = len(traces)
+    def map_color(self, style, traces=None, *args, method="auto", **kwargs):
+        """Color the traces by a gradation.
+        Args:
+            style (str or colorfuncs.Colormap): key of colorfuncs.gradation, or a colormap.
+            traces (list of str, optional): traces to color. All the shown traces if None.
+            method (str): "commands" sends coalesced ModifyGraph commands.
+                "wave" sends the colors as a wave and colors the traces by
+                the helper procedure, which is faster for many traces but
+                only available if traces is None. "auto" selects "wave" for
+                more than MAP_COLOR_WAVE_THRESHOLD traces.
+            args, kwargs: passed to the gradation function.
+        """
         from igorconsole import colorfuncs
-        grad_func = colorfuncs.gradation[style]
-        trace_colors = {}
-        for i, trace in enumerate(traces):
-            color = tuple(grad_func(i/(length-1), *args, **kwargs))
-            trace_colors["rgb({})".format(trace)] = color
-        self.modify(trace_colors)
+        all_traces = traces is None
+        traces = self.traces() if all_traces else list(traces)
+        length = len(traces)
+        if length == 0:
+            return
+        grad_func = colorfuncs.gradation[style] if isinstance(style, str) else style
+        if isinstance(grad_func, colorfuncs.Colormap) and not (args or kwargs):
+            colors = grad_func.lut(length)
+        else:
+            ratios = np.linspace(0, 1, length) if length > 1 else [0.0]
+            colors = np.array([grad_func(ratio, *args, **kwargs) for ratio in ratios],
+                              dtype=np.uint16)
+        if method == "auto":
+            method = "wave" if all_traces and length > MAP_COLOR_WAVE_THRESHOLD else "commands"
+        if method == "wave":
+            if not all_traces:
+                raise ValueError('method="wave" colors all the traces.')
+            self._map_color_wave(colors)
+        elif method == "commands":
+            fragments = ["rgb({0})=({1},{2},{3})".format(utils.quote_trace(trace), *color)
+                         for trace, color in zip(traces, colors.tolist())]
+            self.app.execute_commands(
+                styles.modify_commands([self.name], fragments, self.app.command_maxlen))
+        else:
+            raise ValueError("Invalid method.")
+
+    def _map_color_wave(self, colors):
+        folder_path = PACKAGE_FOLDER + ":colors"
+        lut = np.ascontiguousarray(colors, dtype=np.uint16).ravel()
+        #unsigned 16 bit integer
+        dtype = utils.to_igor_data_type(np.uint16)
+        #only the scratch folder is changed, so the cached indexes are kept.
+        commands = utils.new_folder_commands(folder_path)
+        commands.append("Make/O/Y={0}/N={1} {2}:lut".format(dtype, lut.size, folder_path))
+        for command in utils.merge_commands(commands):
+            self.app._execute(command)
+        _, _, variant_array = comutils.nptype_vttype_and_variant_array(lut)
+        self.app.reference.DataFolder(folder_path).Wave("lut")\
+            .SetNumericWaveData(dtype, variant_array)
+        try:
+            self.app._call_procedure("IgorConsole_ColorTraces({0}, {1}, {2}:lut)".format(
+                utils.igor_str(self.name), self._flags(), folder_path))
+        finally:
+            self.app._execute("KillDataFolder/Z " + folder_path)
+            self.app._forget_folders(PACKAGE_FOLDER)
 
     def setaxis(self, axis_name, num1=None, num2=None, silent_error=False):
         """Developping."""
@@ -2031,6 +3465,8 @@ class Graph(Window):
             command.append("/z ")
         command.append("{0} {1}, {2}".format(axis_name, num1, num2))
         self.app.execute("".join(command))
+        #autoscaled ends are the ends of the proxies, not of the sources.
+        self._update_lod(full=(num1 == "*" and num2 == "*"))
 
     def autoaxis(self, axis_name, mode="normal", from_zero=False,
                  limit="datalimit", reverse=False, silent_error=False):
@@ -2060,6 +3496,16 @@ class Graph(Window):
         if silent_error:
             command.append("/z")
         self.app.execute("".join(command))
+        self._update_lod(full=True)
+
+    def _update_lod(self, full):
+        """Decimate the proxies of display(lod=True) again for the axis ranges."""
+        if self.name.lower() in self.app._lod_graphs:
+            found = self.app._call_procedure("IgorConsole_LodUpdate({0}, {1})".format(
+                utils.igor_str(self.name), int(full)))
+            if found == "0":
+                #the graph was killed, or made again without the proxies.
+                self.app._lod_graphs.discard(self.name.lower())
 
     def setlabel(self, axis_name, string, silent_error=False):
         """Developping."""
@@ -2075,128 +3521,92 @@ class Graph(Window):
     def save_image(self, filename, filetype="pdf",
                    color="cmyk", size=None, sizeunit="cm",
                    embed_fonts=False, overwrite=False,
-                   resolution="4x", preview=False, transparent=False):
+                   resolution="4x", preview=False, transparent=False, timeout=None):
         """Developping."""
-        command = []
-        apd = command.append
-        apd("savepict")
-        if overwrite:
-            apd("/o")
-
-        t = filetype
-        if t == "windowsmetafile" or t == "wmf":
-            t = 8
-        elif t == "enhanced metafile" or t == "metafile" or t == "emf":
-            t = -2
-        elif t == "bitmap" or t == "bmp":
-            t = -4
-        elif t == "eps":
-            t = -3
-        elif t == "pdf":
-            t = -8
-        elif t == "png":
-            t = -5
-        elif t == "jpg" or t == "jpeg":
-            t = -6
-        elif t == "tiff":
-            t = -7
-        else:
-            t = -8
-        apd("/e={0}".format(t))
-
-        cmyk_able = (-3, -8, -7)
-        transparent_able = (-5,)
-        reso_able = (-4, -5, -6)
-        font_embed_able = [-3, -8]
-
-        if color == "rgb":
-            pass
-        elif color == "cmyk" and t in cmyk_able:
-            apd("/c=2")
-        else:
-            apd("/c=0")
-
-        if (not embed_fonts) or (t not in font_embed_able):
-            pass
-        if embed_fonts == "all":
-            apd("/ef=2")
-        else:
-            apd("/ef=1")
-
-        if t in transparent_able and transparent:
-            apd("/tran=1")
-
-        if t == -3 and not preview:
-            apd("/s")
-
-        r = resolution
-        ress = (72, 75, 96, 100, 120, 150, 200, 300, 400, 500, 600, 750, 800,
-                1000, 1200, 1500, 2000, 2400, 2500, 3000, 2500, 3600, 4000, 4500, 4800)
-        if t in reso_able:
-            if r == "1x" or r == "screen":
-                apd("/b=72")
-            elif r == "2x":
-                apd("/b=144")
-            elif r == "4x":
-                apd("/b=288")
-            elif r == "5x":
-                apd("/b=360")
-            elif r == "8x":
-                apd("/b=576")
-            elif utils.isint(r) and (r in ress):
-                apd("/b={0}".format(r))
-            else:
-                raise RuntimeError()
-
-        if size is not None:
-            if sizeunit == "cm":
-                apd("/m")
-            elif sizeunit == "inch" or sizeunit == "inches":
-                apd("/i")
-
-            apd("/w=(0, 0, {0[0]}, {0[1]})".format(size))
-
-        apd("/win={0}".format(self.name))
+        flags = images.savepict_flags(filetype, color=color, size=size, sizeunit=sizeunit,
+                                      embed_fonts=embed_fonts, overwrite=overwrite,
+                                      resolution=resolution, preview=preview,
+                                      transparent=transparent)
         folder = os.path.dirname(filename)
         file_ = os.path.basename(filename)
-        self.app._newpath(folder)
-        apd("/P=igorconsole_path")
-        apd(' as "{0}"'.format(file_))
-        return self.app.execute("".join(command))
+        with self.app.deadline(timeout):
+            return self.app.execute(self.app._newpath_command(folder) + "; "
+                                    + images.savepict_command(flags, self.name, file_))
 
     def get_image_binary(self, filetype="pdf",
                          color="cmyk", size=None, sizeunit="cm",
                          embed_fonts=False, overwrite=False,
-                         resolution="4x", preview=False, transparent=False):
-        """Developping."""
-        with tempfile.TemporaryDirectory() as tmpd:
-            path = tmpd + "\\tmpfile"
-            self.save_image(path, filetype=filetype,
-                            color=color, size=size, sizeunit=sizeunit,
-                            embed_fonts=embed_fonts, overwrite=overwrite,
-                            resolution=resolution, preview=preview,
-                            transparent=transparent)
-
-            with open(path, "rb") as tmpf:
-                result = tmpf.read()
-        return result
+                         resolution="4x", preview=False, transparent=False,
+                         timeout=None):
+        """Developping.
+        The image is taken from app.image_cache if the graph and the waves
+        shown are not modified since the last export with the same parameters.
+        """
+        params = dict(filetype=filetype, color=color, size=size, sizeunit=sizeunit,
+                      embed_fonts=embed_fonts, resolution=resolution, preview=preview,
+                      transparent=transparent)
+        cache = self.app.image_cache
+        with self.app.deadline(timeout):
+            if cache is not None:
+                key = images.cache_key(self._signature(), params)
+                data = cache.get(key)
+                if data is not None:
+                    return data
+            data = self.app.export_images([self], overwrite=overwrite, **params)[0]
+        if cache is not None:
+            cache.put(key, data)
+        return data
+
+    def _signature(self):
+        """Recreation macro and modification counts of the waves, in one call."""
+        return self.app._call_procedure("IgorConsole_GraphSignature({})"\
+                                        .format(utils.igor_str(self.name)))
 
     def get_image(self, filetype="png",
                   color="rgb", size=None, sizeunit="cm",
                   embed_fonts=False, overwrite=False,
-                  resolution="4x", preview=False, transparent=False):
+                  resolution="4x", preview=False, transparent=False,
+                  timeout=None):
         """Developping."""
-        from PIL import Image
-        with tempfile.TemporaryDirectory() as tmpd:
-            path = tmpd + "\\tmpfile"
-            self.save_image(path, filetype=filetype,
-                            color=color, size=size, sizeunit=sizeunit,
-                            embed_fonts=embed_fonts, overwrite=overwrite,
-                            resolution=resolution, preview=preview,
-                            transparent=transparent)
-
-            img = np.asarray(Image.open(path))
-            return Image.fromarray(img)
+        return images.decode_image(self.get_image_binary(
+            filetype=filetype, color=color, size=size, sizeunit=sizeunit,
+            embed_fonts=embed_fonts, overwrite=overwrite, resolution=resolution,
+            preview=preview, transparent=transparent, timeout=timeout))
+
+    def _recreation(self):
+        return self.app._call_procedure("WinRecreation({}, 0)".format(utils.igor_str(self.name)))
+
+    def template(self):
+        """Capture this graph as a template for IgorApp.display_template.
+        Returns:
+            recreation.GraphTemplate: the recreation macro read in one call.
+        """
+        return recreation.GraphTemplate(self._recreation())
+
+    def model(self):
+        """Current state of this graph read in one call.
+        Returns:
+            recreation.GraphModel: traces, ModifyGraph keywords, labels and axes.
+        """
+        return recreation.GraphModel.from_macro(self._recreation())
+
+    def apply(self, desired, current=None):
+        """Change this graph to the desired state by only the needed commands.
+        Args:
+            desired (recreation.GraphModel): e.g. GraphModel().modify(fSize=9).label("left", "y")
+            current (recreation.GraphModel, optional): read by model() if None.
+        Returns:
+            list of str: the commands sent. Empty if the graph is already in the state.
+        """
+        current = self.model() if current is None else current
+        commands = current.diff(desired, self.name, self.app.command_maxlen)
+        if commands:
+            self.app.execute_commands(commands)
+        return commands
+
+    def _repr_png_(self):
+        """PNG shown by jupyter, taken from the image cache when possible."""
+        return self.get_image_binary("png", color="rgb", resolution="2x")
 
     def show_image(self, filetype="png",
                    color="rgb", size=None, sizeunit="cm",
@@ -2218,24 +3628,65 @@ class Graph(Window):
 
     def reorder(self, order, normal=True, contour=True, hidden=False):
         """Reorder waves.
+        Only the traces out of a longest increasing subsequence of the current
+        order are moved, and the moves are sent in a few commands.
         Args:
              order: [0,3,2,1] or ["tr0", "tr3", "tr2", "tr1"]
+        Raises:
+            ValueError: when order names a trace not listed by traces(normal, contour, hidden).
         """
+        traces = self.traces(normal, contour, hidden)
         order_array = np.asarray(order)
         if issubclass(order_array.dtype.type, np.integer):
-            traces = self.traces(normal, contour, hidden)
             order = [traces[i] for i in order]
         elif issubclass(order_array.dtype.type, np.str_):
-            pass
+            order = [str(item) for item in order]
         else:
             raise ValueError()
+        listed = set(traces)
+        for name in order:
+            if name not in listed:
+                raise ValueError("{0} is not in the traces listed with normal={1}, "
+                                 "contour={2}, hidden={3}.".format(name, normal, contour, hidden))
+
+        commands = []
+        for anchor, names in utils.reorder_moves(traces, order):
+            prefix = "ReorderTraces/W={0} {1},{{".format(self.name, utils.quote_trace(anchor))
+            room = self.app.command_maxlen - len(prefix) - 1
+            #the chunks are placed before the same anchor one after another.
+            for chunk in utils.chunk_items([utils.quote_trace(name) for name in names],
+                                           room, room, sep=","):
+                commands.append(prefix + ",".join(chunk) + "}")
+        if commands:
+            self.app.execute_commands(commands)
+
+class _TableIndex:
+    """Columns of a table, listed by one IgorConsole_TableInfo call."""
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.names = [column[0] for column in columns]
+        self.paths = [column[1] for column in columns]
+        self.unique_keys = utils.to_unique_key(self.names)
+        self.key_set = set(self.unique_keys)
+        self.name_set = set(self.names)
+        self.path_set = {path.lower() for path in self.paths}
+        #column names without ".d", ".x" etc.
+        short_names = [name.rsplit(".")[0] for name in self.names]
+        self._full = self._first_index(self.unique_keys, self.names)
+        self._short = self._first_index(utils.to_unique_key(short_names), short_names)
+
+    @staticmethod
+    def _first_index(unique_keys, names):
+        #the unique keys have priority over the raw names.
+        result = {key: i for i, key in reversed(list(enumerate(names)))}
+        result.update({key: i for i, key in enumerate(unique_keys)})
+        return result
+
+    def lookup(self, key):
+        """Column index of the column name, or None if not found."""
+        return (self._full if "." in key else self._short).get(key)
 
-        revorder = reversed(order)
-        trace = next(revorder)
-        for item in reversed(order):
-            anchor, trace = trace, item
-            command = "ReorderTraces/W={0} {1},{{{2}}}".format(self.name, anchor, trace)
-            self.app.execute(command)
 
 class Table(Window):
     def _raw_info_str(self, num):
@@ -2250,20 +3701,35 @@ class Table(Window):
         return {item.split(":", 1)[0]: item.split(":", 1)[1]
                 for item in self._raw_info_list(num)}
 
+    def _index(self):
+        """Columns listed by one call, cached until the table is modified by igorconsole."""
+        key = self.name.lower()
+        index = self.app._table_indexes.get(key)
+        if index is None:
+            text = self.app._call_procedure("IgorConsole_TableInfo({})"\
+                                            .format(utils.igor_str(self.name)))
+            index = _TableIndex(*utils.parse_table_info(text))
+            self.app._table_indexes[key] = index
+        return index
+
+    def refresh(self):
+        """Discard the cached columns to see the changes made in igor."""
+        self.app._forget_windows(self.name)
+
     def _column_name(self, num):
-        return self._raw_info_dict(num)["COLUMNNAME"]
+        return self._index().names[num]
 
     @property
     def column_num(self):
-        return int(self._raw_info_dict(-2)["COLUMNS"]) - 1
+        return len(self._index().columns)
 
     @property
     def row_num(self):
-        return int(self._raw_info_dict(-2)["ROWS"])
+        return self._index().rows
 
     @property
     def _column_names(self):
-        return [self._column_name(i) for i in range(self.column_num)]
+        return list(self._index().names)
 
     def _int_to_column_index(self, key: int):
         length = self.column_num
@@ -2273,15 +3739,7 @@ class Table(Window):
             raise IndexError("key {} out of bounds.".format(key))
 
     def _str_to_column_index(self, key: str):
-        key = str(key)
-        cnames = self._column_names
-        if "." not in key:
-            cnames = [cn.rsplit(".")[0] for cn in cnames]
-        unique_cnames = utils.to_unique_key(cnames)
-        if key in unique_cnames:
-            return unique_cnames.index(key)
-        if key in cnames:
-            return cnames.index(key)
+        return self._index().lookup(str(key))
 
     def _slice_to_column_index(self, key):
         length = self.column_num
@@ -2313,39 +3771,31 @@ class Table(Window):
             raise TypeError("Key must be a str or integer.")
 
     def _unique_key(self):
-        return utils.to_unique_key(self._column_names)
+        return list(self._index().unique_keys)
 
     def _column_wave(self, key):
         key = self._to_column_index(key)
+        paths = self._index().paths
         if isinstance(key, int):
-            return OLEIgorWave(self._raw_info_dict(key)["WAVE"], self.app)
+            return OLEIgorWave(paths[key], self.app)
         else:
-            return [OLEIgorWave(self._raw_info_dict(item)["WAVE"], self.app)
-                    for item in key]
+            return [OLEIgorWave(paths[item], self.app) for item in key]
 
     def __contains__(self, obj):
         if utils.isstr(obj):
-            if obj in self.keys():
-                return True
-            if obj in self._column_names:
-                return True
-            return False
+            index = self._index()
+            return obj in index.key_set or obj in index.name_set
         elif isinstance(obj, OLEIgorWave):
-            for wv in self.waves:
-                if obj.is_(wv):
-                    return True
-            return False
+            return obj.path.lower() in self._index().path_set
 
     def __len__(self):
-        #return len(self.keys())
-        # -> optimaized
-        return len(self._column_names)
+        return self.column_num
 
     def keys(self):
         return self._unique_key()
 
     def values(self):
-        return self.waves
+        return self._column_waves
 
     def items(self):
         keys = self.keys()
@@ -2354,15 +3804,16 @@ class Table(Window):
 
     @property
     def _column_waves(self):
-        return [self._column_wave(i) for i in range(self.column_num)]
+        return [OLEIgorWave(path, self.app) for path in self._index().paths]
 
     @property
     def _waves_paths(self):
-        return set(self._raw_info_dict(i)["WAVE"] for i in range(self.column_num))
+        return set(self._index().paths)
 
     @property
     def waves(self):
-        return [OLEIgorWave(path, self.app) for path in self._wave_paths()]
+        """Waves shown in this table, in the order of the columns."""
+        return [OLEIgorWave(path, self.app) for path in dict.fromkeys(self._index().paths)]
 
     def wave_at(self, column):
         return self._column_wave(column)
@@ -2373,9 +3824,88 @@ class Table(Window):
         if return_key:
             return self.keys()[-1]
 
+    def append_many(self, waves):
+        """Append many waves by a few AppendToTable commands.
+        Args:
+            waves (iterable of OLEIgorWave): waves to show.
+        """
+        prefix = "AppendToTable/W={0} ".format(self.name)
+        room = self.app.command_maxlen - len(prefix)
+        paths = [wave.quoted_path for wave in waves]
+        commands = [prefix + ", ".join(chunk)
+                    for chunk in utils.chunk_items(paths, room, room)]
+        if commands:
+            self.app.execute_commands(commands)
+
+    def _bulk_arrays(self):
+        """Data of the one dimensional real columns. The waves of the same
+        type and length are fetched together as a matrix.
+        Returns:
+            dict: unquoted wave path -> numpy.ndarray
+        """
+        groups = {}
+        for _, path, dtype, shape, _, _ in self._index().columns:
+            if dtype is None or dtype == 0 or dtype & 0x01 or dtype not in utils.NP_DTYPE:
+                #text, complex or missing waves
+                continue
+            if len(shape) != 1 or shape[0] == 0:
+                continue
+            paths = groups.setdefault((dtype, shape[0]), [])
+            if path not in paths:
+                paths.append(path)
+        return self._fetch_columns(groups)
+
+    def _fetch_columns(self, groups):
+        """Fetch the waves grouped by (igor data type, length) through matrices.
+        Returns:
+            dict: unquoted wave path -> numpy.ndarray
+        """
+        result = {}
+        groups = [(dtype, paths) for (dtype, _), paths in groups.items()]
+        if not groups:
+            return result
+        folder_path = PACKAGE_FOLDER + ":table"
+        commands = utils.new_folder_commands(folder_path)
+        maxlen = self.app.command_maxlen
+        first = "Concatenate/O/NP=1 {"
+        rest = "Concatenate/NP=1 {"
+        for i, (_, paths) in enumerate(groups):
+            suffix = "}}, {0}:m{1}".format(folder_path, i)
+            quoted = [utils.quote_path(path) for path in paths]
+            chunks = utils.chunk_items(quoted, maxlen - len(first + suffix),
+                                       maxlen - len(rest + suffix))
+            for j, chunk in enumerate(chunks):
+                commands.append((first if j == 0 else rest) + ", ".join(chunk) + suffix)
+        #only the scratch folder is changed, so the other cached indexes are kept.
+        for command in utils.merge_commands(commands):
+            self.app._execute(command)
+        try:
+            folder = self.app.reference.DataFolder(folder_path)
+            for i, (dtype, paths) in enumerate(groups):
+                matrix = np.array(folder.Wave("m{}".format(i)).GetNumericWaveData(dtype),
+                                  dtype=utils.to_npdtype(dtype))
+                matrix = matrix.reshape(-1, len(paths))
+                for j, path in enumerate(paths):
+                    result[path] = matrix[:, j]
+        finally:
+            self.app._execute("KillDataFolder/Z " + folder_path)
+            self.app._forget_folders(PACKAGE_FOLDER)
+        return result
+
     def _to_Series_dict(self, index="position"):
-        return {name: wave.to_Series(index=index) for name, wave,
-                in zip(self._column_names, self._column_waves)}
+        import pandas as pd
+        arrays = self._bulk_arrays()
+        result = {}
+        for name, path, _, shape, offset, delta in self._index().columns:
+            if path not in arrays:
+                result[name] = OLEIgorWave(path, self.app).to_Series(index=index)
+                continue
+            if index.lower() == "position":
+                indice = offset + delta * np.arange(shape[0])
+            else:
+                indice = None
+            result[name] = pd.Series(arrays[path], index=indice)
+        return result
 
     def to_DataFrame(self, index="position", **kwargs):
         import pandas as pd
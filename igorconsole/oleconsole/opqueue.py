@@ -0,0 +1,197 @@
+"""Futures of the operations queued by IgorApp.async_execute.
+
+Each operation is queued together with a line that stores its error code,
+message and optional result in a global string,
+root:Packages:igorconsole:ops:S_<id>.
+Completion is detected by polling Status1(OperationQueueIsEmpty) with
+a growing interval, and the strings of all the pending operations are read
+and deleted in a few commands at once.
+"""
+import itertools
+import time
+
+from igorconsole.exception import IgorExecuteError, IgorTimeoutError
+import igorconsole.oleconsole.oleconsts as csts
+from . import utils
+from .consts import COMMAND_MAXLEN, PACKAGE_FOLDER
+
+OPS_FOLDER = PACKAGE_FOLDER + ":ops"
+_SEP = "\t"
+
+
+class QueuedOperation:
+    """Future of a command on the igor operation queue."""
+    def __init__(self, monitor, op_id, command):
+        self._monitor = monitor
+        self.id = op_id
+        self.command = command
+        self._done = False
+        self._exception = None
+        self._value = None
+        self._callbacks = []
+
+    def __repr__(self):
+        state = "finished" if self._done else "pending"
+        return "<igorconsole.QueuedOperation {0} ({1}): {2}>".format(self.id, state, self.command)
+
+    @property
+    def _string_path(self):
+        return "{0}:S_{1}".format(OPS_FOLDER, self.id)
+
+    def done(self):
+        """True if the operation is finished. This polls igor once if pending."""
+        if not self._done:
+            self._monitor.poll()
+        return self._done
+
+    def result(self, timeout=None):
+        """Wait for the operation.
+        Args:
+            timeout (float, optional): time limit in sec.
+        Returns:
+            str or None: value of the result expression given to async_execute,
+                or None if not given.
+        Raises:
+            IgorExecuteError: when the command failed in igor.
+            IgorTimeoutError: when the operation is not finished in time.
+        """
+        self._monitor.wait([self], timeout=timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+    def exception(self, timeout=None):
+        """Wait for the operation and return the error, or None if succeeded."""
+        self._monitor.wait([self], timeout=timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """Call fn(operation) when the operation is found to be finished."""
+        if self._done:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def _set_finished(self, exception=None, value=None):
+        self._done = True
+        self._exception = exception
+        self._value = value
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class OperationQueueMonitor:
+    """Keep the pending operations of an igor instance and poll them together.
+    Args:
+        app (IgorApp): igor instance.
+        initial_interval (float): first polling interval in sec.
+        max_interval (float): upper limit of the polling interval.
+    """
+    def __init__(self, app, initial_interval=0.002, max_interval=0.25):
+        self.app = app
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self._ids = itertools.count()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, command, result=None):
+        """Queue a command and return its future.
+        Args:
+            command (str): igor command.
+            result (str, optional): igor string expression evaluated after the
+                command, e.g. 'num2str(V_fitError)'. Returned by result().
+        """
+        op = QueuedOperation(self, next(self._ids), command)
+        record = "num2istr(V_flag) + {0} + GetErrMessage(V_flag)".format(utils.igor_str(_SEP))
+        if result is not None:
+            #one line per operation when read back.
+            record += ' + {0} + ReplaceString("\\r", {1}, "\\n")'.format(utils.igor_str(_SEP), result)
+        inner = "Execute/Q/Z {0}; String/G {1} = {2}"\
+                .format(utils.igor_str(command), op._string_path, record)
+        #the folder is made every time, because a new experiment removes it.
+        commands = utils.new_folder_commands(OPS_FOLDER)
+        commands.append("KillStrings/Z " + op._string_path)
+        commands.append("Execute/P/Q/Z " + utils.igor_str(inner))
+        self.app.execute_commands(commands)
+        self._pending[op.id] = op
+        return op
+
+    def poll(self):
+        """Check the queue once and resolve the finished operations.
+        Returns:
+            bool: True if no operation is pending.
+        """
+        if not self._pending:
+            return True
+        if not bool(self.app.status1(csts.Status.OperationQueueIsEmpty)):
+            return False
+        ops = list(self._pending.values())
+        for chunk in self._chunks(ops):
+            self._collect(chunk)
+        return not self._pending
+
+    def _chunks(self, ops):
+        chunk = []
+        length = 0
+        for op in ops:
+            #StrVarOrDefault("path",""), and KillStrings path, in the same line.
+            size = 2 * len(op._string_path) + 40
+            if chunk and length + size > COMMAND_MAXLEN:
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append(op)
+            length += size
+        if chunk:
+            yield chunk
+
+    def _collect(self, ops):
+        #one line per operation.
+        expr = ' + "\\r" + '.join('StrVarOrDefault("{}", "")'.format(op._string_path) for op in ops)
+        command = 'fprintf 0, "%s", {0}; KillStrings/Z {1}'\
+                  .format(expr, ", ".join(op._string_path for op in ops))
+        _, result = self.app.execute(command)
+        for op, status in zip(ops, result):
+            del self._pending[op.id]
+            op._set_finished(*self._parse_record(op, status))
+
+    @staticmethod
+    def _parse_record(op, status):
+        """(exception or None, result or None) of the record of an operation."""
+        if not status:
+            #The queue is empty but the operation left no record.
+            #e.g. the queue was flushed by an abort.
+            return IgorExecuteError(-1, "Queued operation was not run: " + op.command), None
+        code, _, rest = status.partition(_SEP)
+        message, sep, value = rest.partition(_SEP)
+        code = int(code)
+        if code:
+            return IgorExecuteError(code, message), None
+        return None, (value if sep else None)
+
+    def wait(self, operations=None, timeout=None):
+        """Poll igor with growing interval until the operations are finished.
+        Args:
+            operations (list of QueuedOperation, optional): All if None.
+            timeout (float, optional): time limit in sec.
+        Raises:
+            IgorTimeoutError: when they are not finished in time.
+        """
+        operations = list(self._pending.values()) if operations is None else list(operations)
+        limit = None if timeout is None else time.monotonic() + timeout
+        delays = utils.backoff_delays(self.initial_interval, 2.0, self.max_interval)
+        while True:
+            self.poll()
+            if all(op._done for op in operations):
+                return
+            delay = next(delays)
+            if limit is not None:
+                remaining = limit - time.monotonic()
+                if remaining <= 0:
+                    raise IgorTimeoutError("Queued operations are not finished.")
+                delay = min(delay, remaining)
+            time.sleep(delay)
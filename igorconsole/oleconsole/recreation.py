@@ -0,0 +1,592 @@
+"""Parser of the window recreation macros (WinRecreation) of the graphs.
+
+A recreation macro looks like:
+    Window Graph0() : Graph
+        PauseUpdate; Silent 1		// building window...
+        String fldrSav0= GetDataFolder(1)
+        SetDataFolder root:data:
+        Display /W=(35.25,41.75,429.75,250.25) wave0,wave1 vs xwave as "title"
+        AppendToGraph/R wave2
+        SetDataFolder fldrSav0
+        ModifyGraph rgb(wave1)=(0,0,65280)
+        Label left "y"
+    EndMacro
+
+GraphTemplate keeps such a macro with the waves replaced by slots, and
+makes the commands to build the same graph for other waves.
+"""
+import re
+from collections import namedtuple
+
+from . import styles, utils
+
+Command = namedtuple("Command", ["operation", "flags", "body"])
+Command.__doc__ = """One line of a macro. flags is a list of the flags
+without "/", e.g. ["W=(0,0,1,1)", "R"], and body is the rest."""
+
+#lines not needed to build the graph again.
+_SKIPPED = {"window", "endmacro", "pauseupdate", "silent", "string", "setdatafolder"}
+#operations applied to the top window in the macro, which take /W=winname.
+WINDOW_OPERATIONS = {
+    "modifygraph", "label", "setaxis", "legend", "textbox", "tag", "colorscale",
+    "errorbars", "modifyimage", "modifycontour", "showinfo", "hideinfo", "showtools",
+    "hidetools", "cursor", "setdrawlayer", "setdrawenv", "drawline", "drawrect",
+    "drawoval", "drawtext", "drawpict", "drawpoly", "drawrrect", "drawarc", "drawaction",
+}
+#flags of Display for the window, not for the traces.
+_WINDOW_FLAGS = {"w", "n", "k", "hide", "fg", "host", "pg", "i", "m", "ncat"}
+#operations adding the waves to the graph.
+_APPEND_OPERATIONS = {"display", "appendtograph"}
+_UNSUPPORTED = {"appendmatrixcontour", "appendxyzcontour", "appendimage"}
+_OPERATION = re.compile(r"\s*([A-Za-z][A-Za-z0-9_]*)")
+
+
+def _is_window_flag(flag):
+    return flag.split("=", 1)[0].lower() in _WINDOW_FLAGS
+
+
+def _scan(text, start, stop_chars):
+    """Index of the first char in stop_chars out of quotes and brackets."""
+    depth = 0
+    quote = None
+    i = start
+    while i < len(text):
+        char = text[i]
+        if quote is not None:
+            if char == "\\" and quote == '"':
+                i += 1
+            elif char == quote:
+                quote = None
+        elif depth == 0 and char in stop_chars:
+            return i
+        elif char in "\"'":
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        i += 1
+    return len(text)
+
+
+def _strip_comment(line):
+    i = 0
+    while True:
+        i = _scan(line, i, "/")
+        if i >= len(line) - 1:
+            return line
+        if line[i + 1] == "/":
+            return line[:i].rstrip()
+        i += 1
+
+
+def split_top_level(text, sep=","):
+    """Split text by sep out of quotes and brackets."""
+    result = []
+    start = 0
+    while True:
+        end = _scan(text, start, sep)
+        result.append(text[start:end].strip())
+        if end >= len(text):
+            return result
+        start = end + 1
+
+
+def parse_command(line):
+    """Split a line of a macro into Command, or None if it is not an operation."""
+    line = _strip_comment(line)
+    match = _OPERATION.match(line)
+    if match is None:
+        return None
+    operation = match.group(1)
+    i = match.end()
+    flags = []
+    while True:
+        while i < len(line) and line[i] == " ":
+            i += 1
+        if i >= len(line) or line[i] != "/":
+            break
+        end = _scan(line, i + 1, "/ \t")
+        flags.append(line[i+1:end])
+        i = end
+    return Command(operation, flags, line[i:].strip())
+
+
+def parse_macro(text):
+    """Commands in a recreation macro, one per statement."""
+    result = []
+    for line in text.replace("\n", "\r").split("\r"):
+        line = line.strip()
+        if not line or line.startswith("//"):
+            continue
+        for statement in split_top_level(line, ";"):
+            command = parse_command(statement)
+            if command is not None:
+                result.append(command)
+    return result
+
+
+def parse_wave_list(body):
+    """Parse the body of Display or AppendToGraph.
+    Returns:
+        list of str: Y waves as written.
+        str or None: X wave.
+        str or None: title as an igor string literal.
+    """
+    title = None
+    as_index = _find_keyword(body, "as")
+    if as_index is not None:
+        title = body[as_index + 3:].strip()
+        body = body[:as_index]
+    xwave = None
+    vs_index = _find_keyword(body, "vs")
+    if vs_index is not None:
+        xwave = body[vs_index + 3:].strip()
+        body = body[:vs_index]
+    ywaves = [item for item in split_top_level(body) if item]
+    return ywaves, xwave, title
+
+
+def _find_keyword(text, keyword):
+    """Index of " keyword " out of quotes and brackets, or None."""
+    i = 0
+    pattern = " " + keyword + " "
+    while True:
+        end = _scan(text, i, " ")
+        if end >= len(text):
+            return None
+        if text[end:end + len(pattern)].lower() == pattern:
+            return end + 1
+        i = end + 1
+
+
+def split_custom_name(item):
+    """Split an item of the wave list into the wave and the custom trace name.
+    e.g. wave0[*][1]/TN=sig -> ("wave0[*][1]", "sig"), wave0 -> ("wave0", None)
+    """
+    i = _scan(item, 0, "/")
+    if item[i+1:i+4].upper() != "TN=":
+        return item, None
+    return item[:i].strip(), item[i+4:].strip()
+
+
+def wave_name(item):
+    """Name of the wave in an item of the wave list. e.g. :sub:'w 0'[*][1] -> w 0"""
+    item, _ = split_custom_name(item)
+    path = item[:_scan(item, 0, "[")]
+    return path.rsplit(":", 1)[-1].replace("'", "").strip()
+
+
+def trace_names(items):
+    """Trace names given to the wave list items in order: name, name#1, ...
+    An item with /TN=name is named by it.
+    """
+    counts = {}
+    result = []
+    for item in items:
+        _, custom = split_custom_name(item)
+        name = wave_name(item) if custom is None else custom.replace("'", "")
+        count = counts.get(name.lower(), 0)
+        counts[name.lower()] = count + 1
+        result.append(name if count == 0 else "{0}#{1}".format(name, count))
+    return result
+
+
+def replace_trace_names(body, mapping):
+    """Replace the trace names in parentheses, e.g. rgb(wave0) -> rgb(new0).
+    Args:
+        mapping (dict): lower case trace name -> new trace name (quoted if needed).
+    """
+    def replace(match):
+        name = match.group(1).replace("'", "")
+        return "(" + mapping.get(name.lower(), match.group(1)) + ")"
+    return re.sub(r"\(('[^']*'(?:#\d+)?|[A-Za-z][A-Za-z0-9_]*(?:#\d+)?)\)", replace, body)
+
+
+def _map_trace(name, mapping):
+    return mapping.get(name.replace("'", "").lower(), name)
+
+
+def replace_trace_argument(command, mapping):
+    """Body of ErrorBars, Tag, Cursor or ColorScale with the trace renamed.
+    e.g. ErrorBars wave0 Y,... / Tag wave0, 5, ... / Cursor A wave0 3 / ColorScale trace=wave0
+    Args:
+        mapping (dict): lower case trace name -> new trace name (quoted if needed).
+    """
+    operation = command.operation.lower()
+    body = command.body
+    if operation in ("errorbars", "tag"):
+        start = 0
+        end = _scan(body, 0, " " if operation == "errorbars" else ",")
+    elif operation == "cursor":
+        start = _scan(body, 0, " ") + 1
+        end = _scan(body, start, " ")
+    elif operation == "colorscale":
+        def replace(match):
+            return match.group(1) + _map_trace(match.group(2), mapping)
+        return re.sub(r"(\btrace\s*=\s*)('[^']*'(?:#\d+)?|[A-Za-z][A-Za-z0-9_]*(?:#\d+)?)",
+                      replace, body, flags=re.IGNORECASE)
+    else:
+        return body
+    if start >= len(body):
+        return body
+    return body[:start] + _map_trace(body[start:end].strip(), mapping) + body[end:]
+
+
+#ModifyGraph keywords taking {wave, ...}.
+_WAVE_KEYWORDS = {"zcolor", "zmrksize", "zmrknum", "zpatnum", "textmarker", "arrowmarker"}
+_WAVE_REFERENCE = re.compile(r"(?:root:|:|'|[A-Za-z])")
+
+
+def resolve_waves(command, folder):
+    """Body of a command with the wave references written relative to the
+    data folder of the macro made full paths, i.e. the waves of the error bars
+    (wave=(w1,w2)) and of the ModifyGraph keywords like zColor={w,...}.
+    Args:
+        folder (str): full path to the folder ending with ":". e.g. "root:data:"
+    """
+    operation = command.operation.lower()
+    if operation == "errorbars":
+        def replace(match):
+            waves = [_full_path(folder, wave) if wave else wave
+                     for wave in split_top_level(match.group(2))]
+            return match.group(1) + ",".join(waves) + ")"
+        return re.sub(r"(\bwave\s*=\s*\()([^)]*)\)", replace, command.body,
+                      flags=re.IGNORECASE)
+    if operation == "modifygraph":
+        fragments = []
+        for fragment in split_top_level(command.body):
+            key, sep, value = fragment.partition("=")
+            keyword = key.split("(", 1)[0].strip().lower()
+            value = value.strip()
+            if sep and keyword in _WAVE_KEYWORDS and value.startswith("{"):
+                items = split_top_level(value[1:-1])
+                if _WAVE_REFERENCE.match(items[0]):
+                    items[0] = _full_path(folder, items[0])
+                fragment = "{0}={{{1}}}".format(key, ",".join(items))
+            fragments.append(fragment)
+        return ",".join(fragments)
+    return command.body
+
+
+def _next_folder(command, folder):
+    """Data folder of the macro after SetDataFolder. The waves are in root
+    without SetDataFolder, and SetDataFolder fldrSav0 goes back there.
+    """
+    path = command.body.strip()
+    folder = path if path.lower().startswith("root") else "root:"
+    return folder if folder.endswith(":") else folder + ":"
+
+
+def with_window(command, winname):
+    """Text of a command given /W=winname if the operation takes it."""
+    flags = list(command.flags)
+    if command.operation.lower() in WINDOW_OPERATIONS\
+       and not any(flag[:2].upper() == "W=" for flag in flags):
+        flags.insert(0, "W=" + winname)
+    text = command.operation + "".join("/" + flag for flag in flags)
+    return text + " " + command.body if command.body else text
+
+
+class GraphTemplate:
+    """Recreation macro of a graph with the waves replaced by slots.
+    Args:
+        text (str): result of WinRecreation(graphName, 0).
+    Attributes:
+        traces (list of tuple): (flags of AppendToGraph, has X wave) for each trace.
+        title (str or None): window title as an igor string literal.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.display_flags = []
+        self.traces = []
+        self.title = None
+        #trace names in the macro, in the order of traces.
+        self._trace_names = []
+        #custom trace names given by /TN=, or None.
+        self._custom_names = []
+        #commands after Display and AppendToGraph, with the waves in full paths.
+        self._body = []
+        folder = "root:"
+        for command in parse_macro(text):
+            operation = command.operation.lower()
+            if operation == "setdatafolder":
+                folder = _next_folder(command, folder)
+                continue
+            if operation in _SKIPPED:
+                continue
+            if operation in _UNSUPPORTED:
+                raise ValueError("{} is not supported by GraphTemplate.".format(command.operation))
+            if operation in _APPEND_OPERATIONS:
+                ywaves, xwave, title = parse_wave_list(command.body)
+                flags = command.flags
+                if operation == "display":
+                    self.display_flags = [flag for flag in flags
+                                          if _is_window_flag(flag) and flag[:2].upper() != "N="]
+                    flags = [flag for flag in flags if not _is_window_flag(flag)]
+                    self.title = title
+                for ywave in ywaves:
+                    self.traces.append((flags, xwave is not None))
+                    self._custom_names.append(split_custom_name(ywave)[1])
+                self._trace_names.extend(ywaves)
+            else:
+                self._body.append(command._replace(body=resolve_waves(command, folder)))
+        self._trace_names = trace_names(self._trace_names)
+
+    def __repr__(self):
+        return "<igorconsole.GraphTemplate of {} traces>".format(len(self.traces))
+
+    def __len__(self):
+        return len(self.traces)
+
+    def commands(self, winname, pairs, hide=False):
+        """Commands to build the graph for the waves.
+        Args:
+            winname (str): name of the new graph.
+            pairs (list of tuple): (quoted Y wave path, quoted X wave path or None)
+                for each trace of the template.
+            hide (bool): make the graph hidden.
+        Returns:
+            list of str: commands.
+        """
+        if len(pairs) != len(self.traces):
+            raise ValueError("The template has {0} traces, but {1} waves are given."
+                             .format(len(self.traces), len(pairs)))
+        window_flags = "".join("/" + flag for flag in self.display_flags
+                               if not (hide and flag.upper().startswith("HIDE")))
+        display = "Display/N={0}{1}{2}".format(winname, window_flags, "/HIDE=1" if hide else "")
+        title = " as " + self.title if self.title is not None else ""
+        result = []
+        paths = []
+        for i, ((flags, has_x), (ypath, xpath)) in enumerate(zip(self.traces, pairs)):
+            if has_x and xpath is None:
+                raise ValueError("Trace {} of the template needs an X wave.".format(i))
+            if self._custom_names[i] is not None:
+                ypath += "/TN=" + self._custom_names[i]
+            flags = "".join("/" + flag for flag in flags)
+            xpart = " vs " + xpath if has_x else ""
+            if i == 0:
+                result.append("{0}{1} {2}{3}{4}".format(display, flags, ypath, xpart, title))
+            else:
+                result.append("AppendToGraph/W={0}{1} {2}{3}".format(winname, flags, ypath, xpart))
+            paths.append(ypath)
+        if not result:
+            result.append(display + title)
+        new_names = trace_names(paths)
+        mapping = {old.lower(): utils.quote_trace(new)
+                   for old, new in zip(self._trace_names, new_names)}
+        for command in self._body:
+            command = command._replace(body=replace_trace_argument(command, mapping))
+            command = command._replace(body=replace_trace_names(command.body, mapping))
+            result.append(with_window(command, winname))
+        return result
+
+
+TraceSpec = namedtuple("TraceSpec", ["name", "ypath", "xpath", "flags"])
+TraceSpec.__doc__ = """Trace in GraphModel. ypath and xpath are quoted full paths
+(xpath is None without X wave), and flags are of AppendToGraph, e.g. ("R=y2",)."""
+
+
+def _full_path(folder, item):
+    """Full path of a wave list item written relative to the folder."""
+    if item.lower().startswith("root:"):
+        return item
+    return folder + item[1:] if item.startswith(":") else folder + item
+
+
+def _base_name(trace):
+    """Lower case trace name without the instance number, e.g. wave0#2 -> wave0"""
+    name = trace.name if trace.name is not None else wave_name(trace.ypath)
+    return re.sub(r"#\d+$", "", name).lower()
+
+
+def _same_value(a, b):
+    """Compare two literals of ModifyGraph values or SetAxis ranges,
+    item by item and numerically where possible. e.g. "0,10" and "0.0,10"
+    """
+    if a == b:
+        return True
+    def items(value):
+        result = []
+        for item in value.strip().strip("()").split(","):
+            item = item.strip()
+            try:
+                result.append(float(item))
+            except ValueError:
+                result.append(item)
+        return tuple(result)
+    return items(a) == items(b)
+
+
+def _same_trace(a, b):
+    """True if two TraceSpecs show the same waves on the same axes."""
+    def key(trace):
+        xpath = None if trace.xpath is None else trace.xpath.replace("'", "").lower()
+        return (trace.ypath.replace("'", "").lower(), xpath,
+                tuple(sorted(flag.replace(" ", "").lower() for flag in trace.flags)))
+    return key(a) == key(b)
+
+
+class GraphModel:
+    """State of a graph parsed from the recreation macro.
+    A model made by GraphModel() is empty, and can describe only the wanted
+    part of a graph by modify, label and setaxis. Graph.apply sends only
+    the commands to change what differs from the current state.
+    Attributes:
+        traces (list of TraceSpec): traces in the drawing order.
+        keywords (dict): (lower case keyword, lower case trace or axis name or None)
+            -> (keyword as written, value literal) of ModifyGraph.
+        labels (dict): axis name -> label as an igor string literal.
+        axes (dict): axis name -> arguments of SetAxis after the axis name, with flags.
+    """
+    def __init__(self):
+        self.traces = []
+        self.keywords = {}
+        self.labels = {}
+        self.axes = {}
+
+    def __repr__(self):
+        return "<igorconsole.GraphModel {0} traces, {1} keywords, {2} labels, {3} axes>"\
+               .format(len(self.traces), len(self.keywords), len(self.labels), len(self.axes))
+
+    @classmethod
+    def from_macro(cls, text):
+        """Parse the result of WinRecreation(graphName, 0)."""
+        model = cls()
+        #the waves are in root without SetDataFolder.
+        folder = "root:"
+        ywaves = []
+        for command in parse_macro(text):
+            operation = command.operation.lower()
+            if operation == "setdatafolder":
+                folder = _next_folder(command, folder)
+            elif operation in _APPEND_OPERATIONS:
+                items, xwave, _ = parse_wave_list(command.body)
+                flags = tuple(flag for flag in command.flags if not _is_window_flag(flag))
+                xpath = None if xwave is None else _full_path(folder, xwave)
+                ywaves.extend(items)
+                for item in items:
+                    model.traces.append(TraceSpec(None, _full_path(folder, item), xpath, flags))
+            elif operation == "modifygraph":
+                model._add_fragments(split_top_level(command.body))
+            elif operation == "label":
+                axis, _, text = command.body.partition(" ")
+                model.labels[axis] = text.strip()
+            elif operation == "setaxis":
+                axis, _, rest = command.body.partition(" ")
+                model.axes[axis] = (tuple(command.flags), rest.strip())
+        names = trace_names(ywaves)
+        model.traces = [trace._replace(name=name) for trace, name in zip(model.traces, names)]
+        return model
+
+    def _add_fragments(self, fragments):
+        for fragment in fragments:
+            key, sep, value = fragment.partition("=")
+            if not sep:
+                continue
+            keyword, _, target = key.strip().partition("(")
+            target = target.rstrip(")").replace("'", "") or None
+            self.keywords[(keyword.lower(), None if target is None else target.lower())] =\
+                (key.strip(), value.strip())
+
+    def modify(self, command_dict=None, **kwargs):
+        """Set ModifyGraph keywords as Graph.modify. e.g. {"rgb(wave0)": (0, 0, 0)}
+        Returns:
+            GraphModel: self, to chain the calls.
+        """
+        command_dict = {} if command_dict is None else dict(command_dict)
+        command_dict.update(kwargs)
+        self._add_fragments(styles.compile_style(command_dict))
+        return self
+
+    def label(self, axis, text):
+        """Set the label of the axis. Returns self."""
+        self.labels[axis] = utils.igor_str(text)
+        return self
+
+    def setaxis(self, axis, num1=None, num2=None):
+        """Set the range of the axis, or autoscale if both are None. Returns self."""
+        if num1 is None and num2 is None:
+            self.axes[axis] = (("A",), "")
+        else:
+            self.axes[axis] = ((), "{0},{1}".format("*" if num1 is None else num1,
+                                                    "*" if num2 is None else num2))
+        return self
+
+    def _trace_changes(self, desired):
+        """Traces to remove and to append to get the desired traces.
+        The instances of a wave (wave0, wave0#1, ...) are numbered in the
+        drawing order, and igor numbers them again after RemoveFromGraph.
+        Only the instances after the first differing one are removed and
+        appended, so the names of the others stay as they are.
+        Returns:
+            list of TraceSpec: current traces to remove, the last one first.
+            list of TraceSpec: desired traces to append in the order.
+        """
+        def groups(traces):
+            result = {}
+            for i, trace in enumerate(traces):
+                result.setdefault(_base_name(trace), []).append(i)
+            return result
+        now_groups = groups(self.traces)
+        wanted_groups = groups(desired.traces)
+        removed = []
+        appending = []
+        for base in set(now_groups) | set(wanted_groups):
+            now = now_groups.get(base, [])
+            wanted = wanted_groups.get(base, [])
+            same = 0
+            while same < min(len(now), len(wanted))\
+                  and _same_trace(self.traces[now[same]], desired.traces[wanted[same]]):
+                same += 1
+            removed.extend(now[same:])
+            appending.extend(wanted[same:])
+        return ([self.traces[i] for i in sorted(removed, reverse=True)],
+                [desired.traces[i] for i in sorted(appending)])
+
+    def diff(self, desired, winname, maxlen=400):
+        """Commands to change this state to the desired one.
+        Traces, keywords, labels and axes absent in desired are left as they are,
+        except the traces when desired has any trace. All the keywords of
+        the appended traces are sent, since they have the default style.
+        Returns:
+            list of str: commands. Empty if nothing differs.
+        """
+        commands = []
+        #lower case names of the traces appended by the commands.
+        appended = set()
+        if desired.traces:
+            removed, appending = self._trace_changes(desired)
+            if removed:
+                commands.append("RemoveFromGraph/W={0} {1}".format(
+                    winname, ",".join(utils.quote_trace(trace.name) for trace in removed)))
+            for trace in appending:
+                xpart = "" if trace.xpath is None else " vs " + trace.xpath
+                commands.append("AppendToGraph/W={0}{1} {2}{3}".format(
+                    winname, "".join("/" + flag for flag in trace.flags), trace.ypath, xpart))
+                if trace.name is not None:
+                    appended.add(trace.name.lower())
+        fragments = []
+        for (keyword, target), (key, value) in desired.keywords.items():
+            if target in appended:
+                #the new trace has the default style.
+                fragments.append("{0}={1}".format(key, value))
+                continue
+            now = self.keywords.get((keyword, target))
+            if now is None and target is not None:
+                #set for all the traces or axes.
+                now = self.keywords.get((keyword, None))
+            if now is None or not _same_value(now[1], value):
+                fragments.append("{0}={1}".format(key, value))
+        if fragments:
+            commands.extend(styles.modify_commands([winname], fragments, maxlen))
+        for axis, text in desired.labels.items():
+            if self.labels.get(axis) != text:
+                commands.append("Label/W={0} {1} {2}".format(winname, axis, text))
+        for axis, (flags, rest) in desired.axes.items():
+            #autoscaled axes are not in the macro.
+            now_flags, now_rest = self.axes.get(axis, (("A",), ""))
+            if tuple(now_flags) != tuple(flags) or not _same_value(now_rest, rest):
+                commands.append("SetAxis/W={0}{1} {2} {3}".format(
+                    winname, "".join("/" + flag for flag in flags), axis, rest).rstrip())
+        return commands
@@ -0,0 +1,205 @@
+"""Retry of the COM calls rejected while igor is busy.
+
+When a procedure is running or a dialog is open, igor rejects incoming
+COM calls with RPC_E_CALL_REJECTED or RPC_E_SERVERCALL_RETRYLATER.
+RetryingDispatch wraps the igor application object, and every object
+obtained through it, so that all calls are retried by one RetryPolicy.
+"""
+import threading
+import time
+
+from pythoncom import com_error
+import win32com.client
+
+from igorconsole.exception import IgorBusyError
+from . import utils
+
+RPC_E_CALL_REJECTED = 0x80010001
+RPC_E_SERVERCALL_RETRYLATER = 0x8001010A
+RPC_E_SERVERCALL_REJECTED = 0x8001010B
+
+BUSY_HRESULTS = frozenset([
+    RPC_E_CALL_REJECTED,
+    RPC_E_SERVERCALL_RETRYLATER,
+    RPC_E_SERVERCALL_REJECTED,
+])
+
+
+def hresult_of(error):
+    """HRESULT of a com_error as an unsigned 32 bit integer."""
+    hresult = getattr(error, "hresult", None)
+    if hresult is None and error.args:
+        hresult = error.args[0]
+    if not isinstance(hresult, int):
+        return None
+    return hresult & 0xFFFFFFFF
+
+
+class CallStats:
+    """Counters of the COM calls.
+    Attributes:
+        calls (int): number of the calls to igor, excluding retries.
+        retries (int): number of the retried calls.
+        busy_time (float): total time in sec spent waiting for igor.
+    """
+    def __init__(self):
+        #updated by the calling thread and the worker thread.
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.busy_time = 0.0
+
+    def add(self, calls=0, retries=0, busy_time=0.0):
+        with self._lock:
+            self.calls += calls
+            self.retries += retries
+            self.busy_time += busy_time
+
+    def copy(self):
+        result = CallStats()
+        with self._lock:
+            result.calls = self.calls
+            result.retries = self.retries
+            result.busy_time = self.busy_time
+        return result
+
+    def __repr__(self):
+        return "<igorconsole.CallStats calls={0}, retries={1}, busy_time={2:.3f}s>"\
+               .format(self.calls, self.retries, self.busy_time)
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for the calls rejected by busy igor.
+    Args:
+        max_wait (float): give up after waiting this time in sec.
+        initial (float): first waiting time in sec.
+        factor (float): growth rate of the waiting time.
+        max_interval (float): upper limit of each waiting time.
+        jitter (float): relative random spread of each waiting time.
+        hresults (set of int): HRESULTs regarded as busy.
+        sleep (callable): function to wait. Replaceable for tests.
+    """
+    def __init__(self, max_wait=30.0, initial=0.01, factor=2.0,
+                 max_interval=1.0, jitter=0.25, hresults=BUSY_HRESULTS,
+                 sleep=time.sleep):
+        self.max_wait = max_wait
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.hresults = frozenset(hresults)
+        self.sleep = sleep
+
+    def is_busy(self, error):
+        """True if the error means igor is busy and the call can be retried."""
+        return isinstance(error, com_error) and hresult_of(error) in self.hresults
+
+    def call(self, func, *args, stats=None, count=True):
+        """Call func(*args) and retry it while igor is busy.
+        Raises:
+            IgorBusyError: when igor is still busy after max_wait.
+        """
+        if stats is not None and count:
+            stats.add(calls=1)
+        delays = None
+        waited = 0.0
+        while True:
+            try:
+                return func(*args)
+            except com_error as e:
+                if not self.is_busy(e):
+                    raise
+                if delays is None:
+                    delays = utils.backoff_delays(self.initial, self.factor,
+                                                  self.max_interval, self.jitter)
+                delay = min(next(delays), self.max_wait - waited)
+                if delay <= 0:
+                    raise IgorBusyError(
+                        "Igor has been busy for {:.3g} sec.".format(waited)
+                    ) from e
+                self.sleep(delay)
+                waited += delay
+                if stats is not None:
+                    stats.add(retries=1, busy_time=delay)
+
+
+def unwrap(obj):
+    """Return the bare COM object of RetryingDispatch."""
+    if isinstance(obj, RetryingDispatch):
+        return object.__getattribute__(obj, "_dispatch")
+    return obj
+
+
+class RetryingDispatch:
+    """Proxy of a COM object retrying its calls by the policy.
+    Args:
+        dispatch: COM object, or a stand-in for tests.
+        policy (RetryPolicy): retry policy.
+        stats (CallStats, optional): counters to update.
+        guard (callable, optional): called before each call,
+            e.g. to wait for a call left running by a timeout.
+    """
+    def __init__(self, dispatch, policy, stats=None, guard=None):
+        object.__setattr__(self, "_dispatch", dispatch)
+        object.__setattr__(self, "_policy", policy)
+        object.__setattr__(self, "_stats", stats)
+        object.__setattr__(self, "_guard", guard)
+
+    def _wrap(self, value):
+        if isinstance(value, win32com.client.CDispatch):
+            return RetryingDispatch(value, self._policy, self._stats, self._guard)
+        return value
+
+    def _enter(self):
+        if self._guard is not None:
+            self._guard()
+
+    def _method(self, method):
+        def call(*args):
+            self._enter()
+            #pywin32 needs the bare IDispatch, not the proxy.
+            args = [unwrap(arg) for arg in args]
+            return self._wrap(self._policy.call(method, *args, stats=self._stats))
+        return call
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        self._enter()
+        dispatch = self._dispatch
+        value = self._policy.call(getattr, dispatch, name, stats=self._stats, count=False)
+        if callable(value) and not isinstance(value, win32com.client.CDispatch):
+            return self._method(value)
+        if self._stats is not None:
+            self._stats.add(calls=1)
+        return self._wrap(value)
+
+    def __setattr__(self, name, value):
+        self._enter()
+        self._policy.call(setattr, self._dispatch, name, unwrap(value), stats=self._stats)
+
+    def __call__(self, *args):
+        self._enter()
+        args = [unwrap(arg) for arg in args]
+        return self._wrap(self._policy.call(self._dispatch, *args, stats=self._stats))
+
+    def __iter__(self):
+        self._enter()
+        for item in self._policy.call(iter, self._dispatch, stats=self._stats):
+            yield self._wrap(item)
+
+    def __eq__(self, other):
+        return unwrap(self) == unwrap(other)
+
+    def __hash__(self):
+        return hash(unwrap(self))
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return "<RetryingDispatch of {!r}>".format(self._dispatch)
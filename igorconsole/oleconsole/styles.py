@@ -0,0 +1,85 @@
+"""Graph styles compiled into ModifyGraph keywords.
+
+A style is a json file {keyword: value} in ~/igorconsole/styles or in the
+styles folder of the package, e.g. {"fSize": 9, "font": "Arial"}.
+It is validated and compiled into "keyword=value" fragments of ModifyGraph
+once, and the result is kept in memory until the file is modified.
+"""
+import json
+import os
+import re
+
+from . import utils
+from .consts import HOME_DIR, PATH
+
+USER_STYLE_DIR = os.path.join(HOME_DIR, "igorconsole", "styles")
+PACKAGE_STYLE_DIR = os.path.join(os.path.dirname(PATH), "styles")
+#keyword, or keyword(trace or axis name)
+_KEYWORD = re.compile(r"[A-Za-z][A-Za-z0-9_]*(\([^()\";,]*\))?$")
+#path -> (mtime, fragments)
+_cache = {}
+
+
+def find_style(name):
+    """Path to the style file. The user's styles have priority."""
+    for directory in (USER_STYLE_DIR, PACKAGE_STYLE_DIR):
+        path = os.path.join(directory, name + ".json")
+        if os.path.exists(path):
+            return path
+    raise ValueError("Cannot find the style file.")
+
+
+def compile_value(value):
+    """Igor literal of a ModifyGraph value.
+    bool is 0 or 1, str is quoted, and list is (v1,v2,...) as rgb=(0,0,0).
+    """
+    if isinstance(value, bool):
+        return str(int(value))
+    if utils.isint(value):
+        return str(int(value))
+    if utils.isreal(value):
+        return repr(float(value))
+    if isinstance(value, str):
+        return utils.igor_str(value)
+    if isinstance(value, (list, tuple)) and value and all(utils.isreal(item) for item in value):
+        return "(" + ",".join(compile_value(item) for item in value) + ")"
+    raise ValueError("Invalid style value: {!r}".format(value))
+
+
+def compile_style(style):
+    """Compile {keyword: value} into the fragments of ModifyGraph.
+    Returns:
+        tuple of str: "keyword=value" for each item.
+    """
+    fragments = []
+    for key, value in style.items():
+        if not _KEYWORD.match(key):
+            raise ValueError("Invalid style keyword: {!r}".format(key))
+        fragments.append("{0}={1}".format(key, compile_value(value)))
+    return tuple(fragments)
+
+
+def load_style(name):
+    """Compiled fragments of the style file, cached until the file is modified."""
+    path = find_style(name)
+    mtime = os.path.getmtime(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rt") as f:
+        fragments = compile_style(json.load(f))
+    _cache[path] = (mtime, fragments)
+    return fragments
+
+
+def modify_commands(winnames, fragments, maxlen):
+    """ModifyGraph commands applying the fragments to each graph.
+    The fragments are joined into as few commands as the length limit allows.
+    """
+    commands = []
+    for winname in winnames:
+        prefix = "ModifyGraph/W={} ".format(winname)
+        room = maxlen - len(prefix)
+        for chunk in utils.chunk_items(fragments, room, room, sep=","):
+            commands.append(prefix + ",".join(chunk))
+    return commands
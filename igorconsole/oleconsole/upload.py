@@ -0,0 +1,203 @@
+"""Bulk upload of a nested folder structure.
+
+FolderUpload plans the upload of a whole {"type": "IgorFolder", ...} tree:
+    1. all the folders are made by NewDataFolder/O in batched commands.
+    2. the waves are grouped by the data type, and each group is sent in
+       one SetNumericWaveData call to a buffer wave in PACKAGE_FOLDER.
+    3. the buffers are split into the waves, reshaped, scaled and given
+       units, and the variables are set, by batched commands.
+The objects which cannot be batched (complex waves and long strings)
+are made one by one by the usual path.
+"""
+import time
+
+import numpy as np
+
+from . import comutils, utils
+from .consts import PACKAGE_FOLDER
+
+UPLOAD_FOLDER = PACKAGE_FOLDER + ":upload"
+#upper limit of the number of points sent in one call.
+MAX_POINTS = 2**22
+#strings longer than this are set through COM, because of the command length limit.
+MAX_STRING_LENGTH = 100
+
+
+class UploadReport:
+    """Statistics of a bulk upload.
+    Attributes:
+        folders (int): number of the made folders.
+        waves (int): number of the made waves.
+        variables (int): number of the made variables.
+        nbytes (int): size of the wave data sent.
+        round_trips (int): number of the calls to igor.
+        seconds (float): elapsed time.
+    """
+    def __init__(self, folders=0, waves=0, variables=0, nbytes=0,
+                 round_trips=0, seconds=0.0):
+        self.folders = folders
+        self.waves = waves
+        self.variables = variables
+        self.nbytes = nbytes
+        self.round_trips = round_trips
+        self.seconds = seconds
+
+    @property
+    def mb_per_s(self):
+        """Transfer rate of the wave data in MB/s."""
+        if self.seconds <= 0:
+            return float("inf")
+        return self.nbytes / self.seconds / 1e6
+
+    def __repr__(self):
+        return ("<igorconsole.UploadReport folders={0}, waves={1}, variables={2}, "
+                "{3:.3g} MB in {4} round trips, {5:.3f}s, {6:.3g} MB/s>")\
+               .format(self.folders, self.waves, self.variables, self.nbytes / 1e6,
+                       self.round_trips, self.seconds, self.mb_per_s)
+
+
+class FolderUpload:
+    """Plan of the commands and the transfers to make a folder tree.
+    Args:
+        path (str): unquoted full path to the folder to make. e.g. "root:data:"
+        tree (dict): {"subfolders": {name: tree}, "waves": {name: wave},
+            "variables": {name: value}}, where wave is a tuple
+            (array, scalings, units). scalings and units may be None.
+        max_points (int): upper limit of the number of points sent in one call.
+    """
+    def __init__(self, path, tree, max_points=MAX_POINTS):
+        self.max_points = max_points
+        self.folder_commands = []
+        #igor data type -> list of (quoted path, flat array, shape)
+        self._groups = {}
+        self.commands = []
+        #(unquoted folder path, "wave" or "variable", name, value)
+        self.unbatched = []
+        self.report = UploadReport()
+        self._plan(path, tree)
+
+    def _plan(self, path, tree):
+        if path.lower() != "root:":
+            self.folder_commands.append("NewDataFolder/O " + utils.quote_path(path).rstrip(":"))
+            self.report.folders += 1
+        for name, wave in tree["waves"].items():
+            self._plan_wave(path, name, *wave)
+        for name, value in tree["variables"].items():
+            self._plan_variable(path, name, value)
+        for name, subtree in tree["subfolders"].items():
+            self._plan(path + name + ":", subtree)
+
+    def _plan_wave(self, path, name, array, scalings=None, units=None):
+        array = np.asarray(array)
+        #text waves cannot be sent by SetNumericWaveData.
+        if issubclass(array.dtype.type, np.complexfloating) or array.dtype.kind in "USO":
+            self.unbatched.append((path, "wave", name, (array, scalings, units)))
+            return
+        dtype = utils.to_igor_data_type(array.dtype.type)
+        dest = utils.quote_path(path + name)
+        self.report.waves += 1
+        if array.size == 0:
+            shape = ",".join(str(n) for n in array.shape) if array.ndim else "0"
+            self.commands.append("Make/O/Y={0}/N=({1}) {2}".format(dtype, shape, dest))
+        else:
+            #igor stores the waves in column major order.
+            flat = np.ravel(array, order="F").astype(utils.to_npdtype(dtype), copy=False)
+            self._groups.setdefault(dtype, []).append((dest, flat, array.shape))
+        self.commands.extend(utils.scale_commands(dest, scalings, units))
+
+    def _plan_variable(self, path, name, value):
+        dest = utils.quote_path(path + name)
+        if utils.isstr(value):
+            if len(value) > MAX_STRING_LENGTH:
+                self.unbatched.append((path, "variable", name, value))
+                return
+            command = "String/G {0} = {1}".format(dest, utils.igor_str(value))
+        elif utils.isreal(value):
+            command = "Variable/G {0} = {1}".format(dest, utils.igor_num(value))
+        elif utils.iscomplex(value):
+            command = "Variable/C/G {0} = cmplx({1}, {2})".format(
+                dest, utils.igor_num(value.real), utils.igor_num(value.imag))
+        else:
+            raise ValueError("Cannot convert to igor variable.")
+        self.commands.append(command)
+        self.report.variables += 1
+
+    def _batches(self):
+        """Yield (igor data type, members) with at most max_points in each batch."""
+        for dtype, members in self._groups.items():
+            batch = []
+            points = 0
+            for member in members:
+                size = member[1].size
+                if batch and points + size > self.max_points:
+                    yield dtype, batch
+                    batch = []
+                    points = 0
+                batch.append(member)
+                points += size
+            if batch:
+                yield dtype, batch
+
+    @staticmethod
+    def _buffer_commands(batches):
+        """Make of the buffer wave of each batch."""
+        commands = []
+        for i, (dtype, members) in enumerate(batches):
+            total = sum(flat.size for _, flat, _ in members)
+            commands.append("Make/O/Y={0}/N={1} {2}:buf{3}".format(dtype, total, UPLOAD_FOLDER, i))
+        return commands
+
+    @staticmethod
+    def _split_commands(batches):
+        """Commands to cut the waves out of the buffers and reshape them."""
+        commands = []
+        for i, (dtype, members) in enumerate(batches):
+            buffer = "{0}:buf{1}".format(UPLOAD_FOLDER, i)
+            offset = 0
+            for dest, flat, shape in members:
+                commands.append("Duplicate/O/R=[{0},{1}] {2}, {3}".format(
+                    offset, offset + flat.size - 1, buffer, dest))
+                if len(shape) > 1:
+                    #/E=1 keeps the column major order of the points.
+                    commands.append("Redimension/E=1/N=({0}) {1}".format(
+                        ",".join(str(n) for n in shape), dest))
+                offset += flat.size
+        return commands
+
+    def run(self, app, add_unbatched):
+        """Send everything planned to igor.
+        Args:
+            app (IgorApp): igor instance.
+            add_unbatched (callable): called as add_unbatched(path, kind, name, value)
+                for each object in unbatched, after the others are made.
+        Returns:
+            UploadReport: statistics of the upload.
+        """
+        start = time.perf_counter()
+        before = app.stats.copy()
+        batches = list(self._batches())
+        commands = list(self.folder_commands)
+        if batches:
+            commands.extend(utils.new_folder_commands(UPLOAD_FOLDER))
+        commands.extend(self._buffer_commands(batches))
+        split = self._split_commands(batches)
+        app.execute_commands(commands)
+        if batches:
+            folder = app.reference.DataFolder(UPLOAD_FOLDER)
+            for i, (dtype, members) in enumerate(batches):
+                data = np.concatenate([flat for _, flat, _ in members])
+                _, _, variant_array = comutils.nptype_vttype_and_variant_array(data)
+                folder.Wave("buf{}".format(i)).SetNumericWaveData(dtype, variant_array)
+                self.report.nbytes += data.nbytes
+            split.append("KillDataFolder/Z " + UPLOAD_FOLDER)
+        app.execute_commands(split + self.commands)
+        for path, kind, name, value in self.unbatched:
+            add_unbatched(path, kind, name, value)
+            if kind == "wave":
+                self.report.waves += 1
+                self.report.nbytes += np.asarray(value[0]).nbytes
+            else:
+                self.report.variables += 1
+        self.report.round_trips = app.stats.calls - before.calls
+        self.report.seconds = time.perf_counter() - start
+        return self.report
@@ -2,6 +2,8 @@
 import functools
 import logging
 import operator
+import random
+import re
 
 from collections import UserString
 
@@ -154,17 +156,20 @@ def _str_insert(basestr, index, istr):
 def to_unique_key(strings):
     result = []
     apd = result.append
+    #set for the membership test, which is slow on the list.
+    used = set()
     for s in strings:
         s = s.replace("'", "")
-        if s not in result:
-            apd(s)
+        if s not in used:
+            candidate = s
         else:
             i = 0
             candidate = _str_insert(s, s.rfind("."), "_{}".format(i))
-            while candidate in result:
+            while candidate in used:
                 i += 1
                 candidate = _str_insert(s, s.rfind("."), "_{}".format(i))
-            apd(candidate)
+        apd(candidate)
+        used.add(candidate)
     return result
 
 BOOLS = (bool, np.bool_)
@@ -245,3 +250,300 @@ def merge_commands(commands):
                 buff = ""
         result = buff
     yield result
+
+def chunk_items(items, first_room, room, sep=", ", max_items=None):
+    """Split items into lists whose joined length fits in the room.
+    Each list has at least one item even if the item alone is too long.
+    Args:
+        items (list of str): e.g. wave paths for a Display command.
+        first_room (int): room for the first list.
+        room (int): room for the other lists.
+        sep (str): separator to join the items.
+        max_items (int, optional): upper limit of the number of items in a list.
+    Yields:
+        list of str: items in each command.
+    """
+    chunk = []
+    length = 0
+    limit = first_room
+    for item in items:
+        size = len(item) if not chunk else len(sep) + len(item)
+        full = max_items is not None and len(chunk) >= max_items
+        if chunk and (full or length + size > limit):
+            yield chunk
+            chunk = []
+            limit = room
+            size = len(item)
+            length = 0
+        chunk.append(item)
+        length += size
+    if chunk:
+        yield chunk
+
+def _increasing_subsequence(values):
+    """Indices of a longest strictly increasing subsequence of values."""
+    #tails[k]: index of the smallest last value of the subsequences of length k+1
+    tails = []
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if values[tails[mid]] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        previous[i] = tails[lo - 1] if lo else None
+        if lo == len(tails):
+            tails.append(i)
+        else:
+            tails[lo] = i
+    result = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        result.append(i)
+        i = previous[i]
+    return result[::-1]
+
+def reorder_moves(current, target):
+    """Moves to sort the traces in the order of target.
+    The traces in a longest increasing subsequence stay, and each run of the
+    other traces is moved just before the next staying trace at once, as
+    "ReorderTraces anchor, {run}" does. The last trace of target always stays,
+    because nothing can be moved behind it.
+    Args:
+        current (list of str): trace names in the current drawing order.
+        target (list of str): trace names in the wanted order. Traces not
+            in target keep their places.
+    Returns:
+        list of tuple: (anchor, [traces to move before the anchor])
+    """
+    if not target:
+        return []
+    position = {name: i for i, name in enumerate(current)}
+    positions = [position[name] for name in target]
+    last = positions[-1]
+    candidates = [i for i, p in enumerate(positions[:-1]) if p < last]
+    stay = {candidates[i] for i in _increasing_subsequence([positions[i] for i in candidates])}
+    stay.add(len(target) - 1)
+    moves = []
+    run = []
+    for i, name in enumerate(target):
+        if i in stay:
+            if run:
+                moves.append((name, run))
+                run = []
+        else:
+            run.append(name)
+    return moves
+
+def quote_trace(name):
+    """Quote a trace name with the instance number. e.g. a b#1 -> 'a b'#1"""
+    base, sep, instance = name.partition("#")
+    return quote_name(base) + sep + instance
+
+def new_folder_commands(path):
+    """Commands to make the data folder and its parents if not exist.
+    Args:
+        path (str): full path to the folder. e.g. "root:Packages:igorconsole"
+    """
+    names = [name for name in path.split(":") if name]
+    names = [quote_name(name) for name in names]
+    return ["NewDataFolder/O " + ":".join(names[:i+1])
+            for i in range(1, len(names))]
+
+def swap_folder_commands(target, staged, trash, exists=True):
+    """Commands to replace a folder by a staged folder of the same name.
+    Args:
+        target (str): unquoted full path to the folder replaced.
+        staged (str): unquoted full path to the new folder.
+        trash (str): unquoted full path to the folder receiving the old folder.
+        exists (bool): False if the target does not exist.
+    """
+    target = target.rstrip(":")
+    parent = target.rsplit(":", 1)[0]
+    commands = []
+    if exists:
+        commands.append("MoveDataFolder {0}, {1}".format(quote_path(target),
+                                                        quote_path(trash.rstrip(":"))))
+    commands.append("MoveDataFolder {0}, {1}".format(quote_path(staged.rstrip(":")),
+                                                    quote_path(parent)))
+    return commands
+
+_STANDARD_NAME = re.compile("[A-Za-z][A-Za-z0-9_]*$")
+
+def quote_name(name):
+    """Quote a liberal igor object name."""
+    name = name.replace("'", "")
+    if _STANDARD_NAME.match(name):
+        return name
+    return "'" + name + "'"
+
+def normalize_folder_path(path):
+    """Unquoted full path of a data folder ending with ':'.
+    Returns None if the path is relative.
+    """
+    path = path.replace("'", "")
+    if path.lower() != "root" and not path.lower().startswith("root:"):
+        return None
+    if not path.endswith(":"):
+        path += ":"
+    return path
+
+def quote_path(path):
+    """Quote each name in an unquoted full path. e.g. root:a b:c -> root:'a b':c"""
+    names = path.split(":")
+    return ":".join([names[0]] + [quote_name(name) if name else name for name in names[1:]])
+
+def parse_data_folder_dir(text):
+    """Parse the result of DataFolderDir(-1) with the line breaks replaced by "\\n".
+    Returns:
+        dict: names of the objects for each key, "FOLDERS", "WAVES", "VARIABLES" and "STRINGS".
+    """
+    result = {}
+    for line in text.replace("\r", "\n").split("\n"):
+        key, sep, names = line.strip().partition(":")
+        if not sep:
+            continue
+        names = names.rstrip(";")
+        result[key] = [name.replace("'", "") for name in names.split(",") if name]
+    return result
+
+def _parse_object_line(line):
+    name, dtype, dims, modcount = line.split("\t")
+    dtype = int(dtype) if dtype else None
+    if dims:
+        sizes = [int(size) for size in dims.split(",")]
+        #trailing unused dimensions are 0.
+        while len(sizes) > 1 and sizes[-1] == 0:
+            sizes.pop()
+        shape = tuple(sizes)
+    else:
+        shape = None
+    modcount = int(modcount) if modcount else None
+    return (name, dtype, shape, modcount)
+
+def parse_object_info(text):
+    """Parse the result of IgorConsole_ObjectInfo in igorconsole.ipf.
+    Returns:
+        list of tuple: (name, igor data type, shape, modification count) for each object.
+            Data type is None for numeric variables and folders.
+            Shape and modification count are None except for waves.
+    """
+    return [_parse_object_line(line) for line in text.split("\r") if line]
+
+def parse_snapshot(text):
+    """Parse the result of IgorConsole_Snapshot in igorconsole.ipf.
+    Returns:
+        list of tuple: (path, loaded, waves, variables) for each folder, depth first.
+            loaded is False for the folders below the depth limit.
+            waves and variables are lists of the tuples as parse_object_info.
+    """
+    result = []
+    for line in text.split("\r"):
+        if not line:
+            continue
+        kind, _, rest = line.partition("\t")
+        if kind in ("F", "f"):
+            result.append((rest, kind == "F", [], []))
+        elif kind == "W":
+            result[-1][2].append(_parse_object_line(rest))
+        elif kind == "V":
+            result[-1][3].append(_parse_object_line(rest))
+    return result
+
+def parse_table_info(text):
+    """Parse the result of IgorConsole_TableInfo in igorconsole.ipf.
+    Returns:
+        int: number of the rows.
+        list of tuple: (column name, unquoted wave path, igor data type, shape,
+            x offset, x delta) for each column. The last four are None
+            if the wave does not exist.
+    """
+    lines = [line for line in text.split("\r") if line]
+    rows = int(lines[0].split("\t")[0]) if lines else 0
+    columns = []
+    for line in lines[1:]:
+        name, path, dtype, dims, offset, delta = line.split("\t")
+        if dtype:
+            _, dtype, shape, _ = _parse_object_line("\t".join((name, dtype, dims, "")))
+            offset, delta = float(offset), float(delta)
+        else:
+            dtype = shape = offset = delta = None
+        columns.append((name, path.replace("'", ""), dtype, shape, offset, delta))
+    return rows, columns
+
+def parse_trace_info(text):
+    """Parse the result of IgorConsole_TraceInfo in igorconsole.ipf.
+    Returns:
+        list of tuple: (trace name, Y wave path, X wave path, Y axis, X axis, offset)
+            for each trace. The paths are unquoted, and None if not exists.
+            offset is a tuple (x, y).
+    """
+    result = []
+    for line in text.split("\r"):
+        if not line:
+            continue
+        name, ypath, xpath, yaxis, xaxis, offset = line.split("\t")
+        offset = tuple(float(i) for i in offset.strip("{}").split(",")) if offset else (0.0, 0.0)
+        result.append((name, ypath.replace("'", "") or None, xpath.replace("'", "") or None,
+                       yaxis, xaxis, offset))
+    return result
+
+def igor_str(string):
+    """Make a igor string literal."""
+    string = str(string).replace("\\", "\\\\").replace('"', '\\"')
+    #line breaks and tabs would break the command.
+    string = string.replace("\r", "\\r").replace("\n", "\\n").replace("\t", "\\t")
+    return '"' + string + '"'
+
+def igor_num(value):
+    """Igor literal of a real number."""
+    value = float(value)
+    if np.isnan(value):
+        return "NaN"
+    if np.isinf(value):
+        return "inf" if value > 0 else "-inf"
+    return repr(value)
+
+_DIMENSIONS = "xyzt"
+
+def scale_commands(dest, scalings, units):
+    """SetScale commands of the scalings and units except the default ones.
+    Args:
+        dest (str): quoted full path to the wave.
+        scalings, units: (data, x, y, z, t) as OLEIgorWaveCollection.add_numeric.
+    """
+    scalings = list(scalings) if scalings is not None else []
+    units = list(units) if units is not None else []
+    result = []
+    for i in range(max(len(scalings), len(units))):
+        dimension = i - 1
+        init, grad = scalings[i] if i < len(scalings) else (0.0, 0.0 if i == 0 else 1.0)
+        unit = units[i] if i < len(units) else ""
+        default = (0.0, 0.0) if dimension == -1 else (0.0, 1.0)
+        if (init, grad) == default and unit == "":
+            continue
+        if dimension == -1:
+            result.append("SetScale d {0}, {1}, {2}, {3}".format(
+                igor_num(init), igor_num(grad), igor_str(unit), dest))
+        else:
+            result.append("SetScale/P {0} {1}, {2}, {3}, {4}".format(
+                _DIMENSIONS[dimension], igor_num(init), igor_num(grad), igor_str(unit), dest))
+    return result
+
+def backoff_delays(initial=0.001, factor=2.0, maximum=0.5, jitter=0.0):
+    """Yield waiting times growing exponentially up to maximum.
+    Args:
+        initial (float): first waiting time in sec.
+        factor (float): growth rate of the waiting time.
+        maximum (float): upper limit of the waiting time.
+        jitter (float): relative random spread of each waiting time. 0 to 1.
+    """
+    delay = initial
+    while True:
+        if jitter:
+            yield delay * (1.0 + jitter * (2.0*random.random() - 1.0))
+        else:
+            yield delay
+        delay = min(delay * factor, maximum)
@@ -0,0 +1,74 @@
+"""Worker thread to run igor COM calls with a deadline.
+
+Igor's COM server has no way to cancel a running command. When a call
+exceeds its deadline, the caller stops waiting and the call is left running
+on the worker. The next call waits for it to finish, so the calls are never
+interleaved and the connection stays usable. The direct calls through
+IgorApp.reference wait for it as well.
+"""
+import concurrent.futures
+import queue
+import threading
+
+import pythoncom
+import win32com.client
+
+
+class ComWorker:
+    """Thread with its own COM apartment and a marshalled igor reference.
+    Args:
+        reference (CDispatch): igor application object of the calling thread.
+        wrapper (callable, optional): applied to the unmarshalled reference
+            in the worker thread.
+    """
+    def __init__(self, reference, wrapper=None):
+        dispatch = getattr(reference, "_oleobj_", reference)
+        stream = pythoncom.CoMarshalInterThreadInterfaceInStream(
+            pythoncom.IID_IDispatch, dispatch
+        )
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, args=(stream, wrapper),
+            name="igorconsole-worker", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, stream, wrapper):
+        pythoncom.CoInitialize()
+        try:
+            reference = win32com.client.Dispatch(
+                pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch)
+            )
+            if wrapper is not None:
+                reference = wrapper(reference)
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                future, func, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(func(reference, *args))
+                except BaseException as e:
+                    future.set_exception(e)
+            del reference
+        finally:
+            pythoncom.CoUninitialize()
+
+    def submit(self, func, *args):
+        """Run func(reference, *args) on the worker.
+        Returns:
+            concurrent.futures.Future: result of the call.
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def close(self):
+        """Stop the worker after the queued calls are finished."""
+        self._queue.put(None)
+
+    @property
+    def is_alive(self):
+        return self._thread.is_alive()
@@ -12,7 +12,10 @@ setup(
     license='MIT',
     keywords='IgorPro',
     packages=["igorconsole", "igorconsole.abc", "igorconsole.oleconsole"],
-    package_data={"igorconsole": ["oleconsole/config.ini", "styles/*.json"]},
+    package_data={"igorconsole": ["oleconsole/config.ini", "styles/*.json",
+                                  "procedures/*.ipf"]},
+    #module level __getattr__ (PEP 562) needs python 3.7.
+    python_requires=">=3.7",
     install_requires=[
         "numpy",
         "pywin32",
@@ -26,8 +29,7 @@ setup(
         "Development Status :: 1 - Planning",
         "Environment :: Win32 (MS Windows)",
         "Operating System :: Microsoft :: Windows",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3 :: Only",
         "Programming Language :: Python :: Implementation :: CPython",
         "Topic :: Utilities",
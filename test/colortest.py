@@ -0,0 +1,31 @@
+import numpy as np
+
+from igorconsole import colorfuncs
+
+
+def colormap_test():
+    cmap = colorfuncs.Colormap([(1, 0, 0), (1, 1, 0), (0, 1, 0)])
+    assert cmap(0) == (65535, 0, 0)
+    assert cmap(0.25) == (65535, 32768, 0)
+    assert cmap(1) == (0, 65535, 0)
+    ratios = np.linspace(0, 1, 11)
+    lut = cmap.lut(11)
+    assert lut.shape == (11, 3) and lut.dtype == np.uint16
+    assert [tuple(color) for color in lut.tolist()] == [cmap(ratio) for ratio in ratios]
+    assert cmap.lut(11) is lut
+    try:
+        cmap(1.5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError()
+
+def gradation_test():
+    assert colorfuncs.geometic_gradation(0.5, rgbs=((0, 0, 0), (1, 1, 1))) == (32768,) * 3
+    assert colorfuncs.hot_to_cold_gradation(1) == (0, 0, 65535)
+    assert colorfuncs.gradation["rainbow"].lut(1).tolist() == [[65535, 0, 0]]
+
+if __name__ == "__main__":
+    colormap_test()
+    gradation_test()
+    print("Passed!")
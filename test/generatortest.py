@@ -0,0 +1,32 @@
+import numpy as np
+
+from igorconsole.oleconsole import generators
+
+
+def wave_commands_test():
+    commands = generators.wave_commands("root:w", (4000, 4000), 4)
+    assert commands == ["Make/O/Y=4/N=(4000,4000) root:w"]
+    commands = generators.wave_commands("root:w", 3, 3, fill=1+2j, overwrite=False)
+    assert commands == ["Make/Y=3/N=(3) root:w", "root:w = cmplx(1.0, 2.0)"]
+    commands = generators.wave_commands("root:w", 101, 4, expression="sin(x)",
+                                        scalings=[(0, 0), (-1, 0.02)])
+    assert commands == ["Make/O/Y=4/N=(101) root:w",
+                        'SetScale/P x -1.0, 0.02, "", root:w',
+                        "root:w = sin(x)"]
+
+def arange_params_test():
+    for args in [(5,), (1, 2, 0.1), (10, 0, -3), (3, 1)]:
+        num, expression = generators.arange_params(*args)
+        assert num == len(np.arange(*args)), args
+    assert generators.arange_params(2, 8, 2)[1] == "2.0 + p*2.0"
+
+def linspace_params_test():
+    assert generators.linspace_params(0, 1, 5) == (5, "p == 4 ? 1.0 : 0.0 + p*0.25")
+    assert generators.linspace_params(0, 1, 4, endpoint=False) == (4, "0.0 + p*0.25")
+    assert generators.linspace_params(3, 1, 1) == (1, "3.0")
+
+if __name__ == "__main__":
+    wave_commands_test()
+    arange_params_test()
+    linspace_params_test()
+    print("Passed!")
@@ -0,0 +1,40 @@
+from igorconsole.oleconsole import images
+
+
+def savepict_flags_test():
+    assert images.savepict_flags("png", color="rgb", overwrite=True) == "savepict/o/e=-5/b=288"
+    assert images.savepict_flags("pdf", embed_fonts="all") == "savepict/e=-8/c=2/ef=2"
+    assert images.savepict_flags("eps", size=(8, 6)) == "savepict/e=-3/c=2/s/m/w=(0, 0, 8, 6)"
+    assert images.savepict_flags("jpg", color="rgb", resolution=300) == "savepict/e=-6/b=300"
+    command = images.savepict_command("savepict/e=-5", "Graph0", "Graph0.png")
+    assert command == 'savepict/e=-5/win=Graph0/P=igorconsole_path as "Graph0.png"'
+
+def image_cache_test():
+    import tempfile
+    key = images.cache_key("Window Graph0() : Graph\rroot:w0\t3\t", {"filetype": "png"})
+    assert key == images.cache_key("Window Graph0() : Graph\rroot:w0\t3\t", {"filetype": "png"})
+    assert key != images.cache_key("Window Graph0() : Graph\rroot:w0\t4\t", {"filetype": "png"})
+    cache = images.ImageCache(max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"
+    cache.put("c", b"12345")
+    #"b" is the least recently used.
+    assert cache.get("b") is None and len(cache) == 2
+    with tempfile.TemporaryDirectory() as tmpd:
+        cache = images.ImageCache(max_bytes=10, directory=tmpd)
+        cache.put("a", b"12345")
+        assert images.ImageCache(directory=tmpd).get("a") == b"12345"
+    with tempfile.TemporaryDirectory() as tmpd:
+        import os
+        cache = images.ImageCache(directory=tmpd, max_disk_bytes=10)
+        for i, key in enumerate("abc"):
+            cache.put(key, b"12345")
+            os.utime(os.path.join(tmpd, key), (i, i))
+        #the oldest file is deleted.
+        assert sorted(os.listdir(tmpd)) == ["b", "c"]
+
+if __name__ == "__main__":
+    savepict_flags_test()
+    image_cache_test()
+    print("Passed!")
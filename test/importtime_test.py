@@ -0,0 +1,48 @@
+"""Regression benchmark of the import time of igorconsole."""
+import subprocess
+import sys
+
+#upper limit of the cumulative import time of igorconsole in microseconds.
+LIMIT_US = 50000
+HEAVY_MODULES = ["numpy", "pythoncom", "win32com", "pandas", "PIL", "matplotlib",
+                 "igorconsole.oleconsole.oleconsole", "configparser"]
+
+def _run(code):
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+
+def no_heavy_import_test():
+    code = "import sys, igorconsole; print(' '.join(sys.modules))"
+    modules = set(_run(code).stdout.split())
+    for name in HEAVY_MODULES:
+        assert name not in modules, name + " is imported by 'import igorconsole'."
+
+def import_time_test():
+    best = None
+    for _ in range(5):
+        lines = _run("import igorconsole").stderr.splitlines()
+        for line in lines:
+            # import time: self [us] | cumulative | imported package
+            if line.rstrip().endswith("| igorconsole"):
+                cumulative = int(line.split("|")[1])
+                best = cumulative if best is None else min(best, cumulative)
+    assert best is not None
+    assert best < LIMIT_US, "import igorconsole took {} us.".format(best)
+
+def lazy_attribute_test():
+    import igorconsole
+    assert "start" in dir(igorconsole)
+    assert "Wave" in dir(igorconsole)
+    try:
+        igorconsole.not_existing_name
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError()
+
+if __name__ == "__main__":
+    no_heavy_import_test()
+    import_time_test()
+    lazy_attribute_test()
+    print("Passed!")
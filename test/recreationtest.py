@@ -0,0 +1,132 @@
+from igorconsole.oleconsole import recreation
+
+MACRO = "\r".join([
+    "Window Graph0() : Graph",
+    "\tPauseUpdate; Silent 1\t\t// building window...",
+    "\tString fldrSav0= GetDataFolder(1)",
+    "\tSetDataFolder root:data:",
+    '\tDisplay /W=(35.25,41.75,429.75,250.25) wave0,wave0 vs xwave as "my graph"',
+    "\tAppendToGraph/R=y2 'w 1'",
+    "\tSetDataFolder fldrSav0",
+    "\tModifyGraph rgb(wave0#1)=(0,0,65280),lsize('w 1')=2",
+    '\tLabel left "\\\\s(wave0) signal"',
+    "\tSetAxis/A=2 left",
+    "EndMacro",
+])
+
+def parse_macro_test():
+    commands = recreation.parse_macro(MACRO)
+    display = [command for command in commands if command.operation == "Display"][0]
+    assert display.flags == ["W=(35.25,41.75,429.75,250.25)"]
+    assert recreation.parse_wave_list(display.body) == (["wave0", "wave0"], "xwave", '"my graph"')
+    assert recreation.trace_names(["wave0", ":a:wave0", "'w 1'[*][0]"]) == ["wave0", "wave0#1", "w 1"]
+
+def graph_template_test():
+    template = recreation.GraphTemplate(MACRO)
+    assert len(template) == 3
+    commands = template.commands("g0", [("root:a", "root:x"), ("root:b", "root:x"),
+                                        ("root:'c d'", None)])
+    assert commands == [
+        'Display/N=g0/W=(35.25,41.75,429.75,250.25) root:a vs root:x as "my graph"',
+        "AppendToGraph/W=g0 root:b vs root:x",
+        "AppendToGraph/W=g0/R=y2 root:'c d'",
+        "ModifyGraph/W=g0 rgb(b)=(0,0,65280),lsize('c d')=2",
+        'Label/W=g0 left "\\\\s(a) signal"',
+        "SetAxis/W=g0/A=2 left",
+    ]
+    try:
+        template.commands("g1", [("root:a", None)])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError()
+
+def graph_template_arguments_test():
+    template = recreation.GraphTemplate("\r".join([
+        "Window Graph0() : Graph",
+        "\tString fldrSav0= GetDataFolder(1)",
+        "\tSetDataFolder root:data:",
+        "\tDisplay wave0,wave1/TN=fit",
+        "\tSetDataFolder fldrSav0",
+        "\tModifyGraph zColor(wave0)={:data:z,*,*,Rainbow},lsize(fit)=2",
+        "\tErrorBars wave0 Y,wave=(:data:err,:data:err)",
+        '\tTag/C/N=text0 wave0, 5, "peak"',
+        "\tCursor/P A wave0 3",
+        "EndMacro",
+    ]))
+    commands = template.commands("g0", [("root:a", None), ("root:b", None)])
+    assert commands == [
+        "Display/N=g0 root:a",
+        "AppendToGraph/W=g0 root:b/TN=fit",
+        "ModifyGraph/W=g0 zColor(a)={root:data:z,*,*,Rainbow},lsize(fit)=2",
+        "ErrorBars/W=g0 a Y,wave=(root:data:err,root:data:err)",
+        'Tag/W=g0/C/N=text0 a, 5, "peak"',
+        "Cursor/W=g0/P A a 3",
+    ]
+    assert recreation.split_custom_name("'w 0'[*][1]/TN=sig") == ("'w 0'[*][1]", "sig")
+    assert recreation.trace_names(["wave0/TN=sig", "wave0"]) == ["sig", "wave0"]
+
+def graph_model_test():
+    model = recreation.GraphModel.from_macro(MACRO)
+    assert [trace.name for trace in model.traces] == ["wave0", "wave0#1", "w 1"]
+    assert model.traces[2] == ("w 1", "root:data:'w 1'", None, ("R=y2",))
+    assert model.keywords[("lsize", "w 1")] == ("lsize('w 1')", "2")
+    assert model.axes["left"] == (("A=2",), "")
+    assert model.diff(model, "g0") == []
+    desired = recreation.GraphModel().modify({"lsize('w 1')": 2.0, "rgb(wave0#1)": (0, 0, 65280)})
+    assert model.diff(desired, "g0") == []
+    desired.modify(fSize=9).label("left", "signal").setaxis("bottom")
+    assert model.diff(desired, "g0") == ["ModifyGraph/W=g0 fSize=9", 'Label/W=g0 left "signal"']
+    desired = recreation.GraphModel()
+    desired.traces = [model.traces[0], model.traces[1], model.traces[2]._replace(flags=())]
+    assert model.diff(desired, "g0") == ["RemoveFromGraph/W=g0 'w 1'",
+                                         "AppendToGraph/W=g0 root:data:'w 1'"]
+    model.axes["bottom"] = ((), "0,10")
+    assert model.diff(recreation.GraphModel().setaxis("bottom", 0.0, 10), "g0") == []
+
+def graph_model_append_test():
+    #the waves in root have no SetDataFolder.
+    current = recreation.GraphModel.from_macro("\r".join([
+        "Window Graph0() : Graph",
+        "\tDisplay wave0",
+        "\tAppendToGraph/R wave1",
+        "\tModifyGraph rgb(wave1)=(0,0,65280)",
+        "EndMacro",
+    ]))
+    assert current.traces[1] == ("wave1", "root:wave1", None, ("R",))
+    desired = recreation.GraphModel.from_macro("\r".join([
+        "Window Graph0() : Graph",
+        "\tDisplay wave0,wave1",
+        "\tModifyGraph rgb(wave1)=(0,0,65280)",
+        "EndMacro",
+    ]))
+    assert current.diff(desired, "g0") == ["RemoveFromGraph/W=g0 wave1",
+                                           "AppendToGraph/W=g0 root:wave1",
+                                           "ModifyGraph/W=g0 rgb(wave1)=(0,0,65280)"]
+    #the instances before the changed one keep their names.
+    current = recreation.GraphModel.from_macro("\r".join([
+        "Window Graph0() : Graph",
+        "\tDisplay wave0",
+        "\tAppendToGraph/R wave0",
+        "\tAppendToGraph wave0",
+        "\tModifyGraph lsize(wave0)=2,lsize(wave0#1)=3,lsize(wave0#2)=4",
+        "EndMacro",
+    ]))
+    desired = recreation.GraphModel.from_macro("\r".join([
+        "Window Graph0() : Graph",
+        "\tDisplay wave0,wave0,wave0",
+        "\tModifyGraph lsize(wave0)=2,lsize(wave0#1)=3,lsize(wave0#2)=4",
+        "EndMacro",
+    ]))
+    assert current.diff(desired, "g0") == ["RemoveFromGraph/W=g0 wave0#2,wave0#1",
+                                           "AppendToGraph/W=g0 root:wave0",
+                                           "AppendToGraph/W=g0 root:wave0",
+                                           "ModifyGraph/W=g0 lsize(wave0#1)=3,lsize(wave0#2)=4"]
+
+if __name__ == "__main__":
+    parse_macro_test()
+    graph_template_test()
+    graph_template_arguments_test()
+    graph_model_test()
+    graph_model_append_test()
+    print("Passed!")
@@ -0,0 +1,95 @@
+from pythoncom import com_error
+
+from igorconsole.oleconsole import retry
+from igorconsole.exception import *
+
+
+class BusyIgor:
+    """Stand-in of igor rejecting the first calls."""
+    def __init__(self, busy_count, hresult=retry.RPC_E_CALL_REJECTED):
+        self.busy_count = busy_count
+        self.hresult = hresult
+        self.called = 0
+
+    def Echo(self, obj):
+        return obj
+
+    def Status1(self, i):
+        self.called += 1
+        if self.busy_count > 0:
+            self.busy_count -= 1
+            raise com_error(self.hresult - 2**32, "Call was rejected by callee.", None, None)
+        return 7.08
+
+def make(busy_count, **kwargs):
+    waits = []
+    policy = retry.RetryPolicy(sleep=waits.append, jitter=0, **kwargs)
+    stats = retry.CallStats()
+    fake = BusyIgor(busy_count)
+    return retry.RetryingDispatch(fake, policy, stats), fake, stats, waits
+
+def hresult_test():
+    e = com_error(retry.RPC_E_CALL_REJECTED - 2**32, "", None, None)
+    assert retry.hresult_of(e) == retry.RPC_E_CALL_REJECTED
+    assert retry.RetryPolicy().is_busy(e)
+    assert not retry.RetryPolicy().is_busy(com_error(-2147352567, "", None, None))
+    assert not retry.RetryPolicy().is_busy(ValueError())
+
+def retry_test():
+    ref, fake, stats, waits = make(3, initial=0.01, max_interval=0.03)
+    assert ref.Status1(1) == 7.08
+    assert fake.called == 4
+    assert waits == [0.01, 0.02, 0.03]
+    assert stats.calls == 1
+    assert stats.retries == 3
+    assert abs(stats.busy_time - 0.06) < 1e-9
+
+def no_retry_test():
+    ref, fake, stats, waits = make(0)
+    assert ref.Status1(1) == 7.08
+    assert fake.called == 1
+    assert stats.retries == 0
+    assert waits == []
+
+def give_up_test():
+    ref, fake, stats, waits = make(100, initial=0.1, max_interval=0.1, max_wait=0.35)
+    try:
+        ref.Status1(1)
+    except IgorBusyError:
+        pass
+    else:
+        raise AssertionError()
+    assert abs(sum(waits) - 0.35) < 1e-9
+
+def other_error_test():
+    ref, fake, stats, waits = make(1)
+    fake.hresult = 0x80020009
+    try:
+        ref.Status1(1)
+    except IgorBusyError:
+        raise AssertionError()
+    except com_error:
+        pass
+    assert waits == []
+def guard_test():
+    guarded = []
+    policy = retry.RetryPolicy(sleep=lambda t: None)
+    ref = retry.RetryingDispatch(BusyIgor(0), policy, retry.CallStats(),
+                                 guard=lambda: guarded.append(True))
+    ref.Status1(1)
+    assert guarded
+
+def unwrap_argument_test():
+    ref, fake, stats, waits = make(0)
+    other = retry.RetryingDispatch(BusyIgor(0), retry.RetryPolicy(), stats)
+    assert ref.Echo(other) is retry.unwrap(other)
+
+if __name__ == "__main__":
+    hresult_test()
+    retry_test()
+    no_retry_test()
+    give_up_test()
+    other_error_test()
+    guard_test()
+    unwrap_argument_test()
+    print("Passed!")
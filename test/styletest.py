@@ -0,0 +1,36 @@
+import os
+
+from igorconsole.oleconsole import styles
+
+
+def compile_style_test():
+    fragments = styles.compile_style({"fSize": 9, "font": "Arial", "mirror": True,
+                                      "axThick": 0.75, "rgb(w0)": [0, 65535, 0]})
+    assert fragments == ("fSize=9", 'font="Arial"', "mirror=1", "axThick=0.75",
+                         "rgb(w0)=(0,65535,0)")
+    for style in ({"fSize;KillWaves/A": 1}, {"fSize": {"a": 1}}, {"fSize": None}):
+        try:
+            styles.compile_style(style)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(style)
+
+def package_styles_test():
+    for filename in os.listdir(styles.PACKAGE_STYLE_DIR):
+        name, _ = os.path.splitext(filename)
+        assert styles.load_style(name) is styles.load_style(name)
+
+def modify_commands_test():
+    fragments = ("fSize=9", "mirror=1", "tick=2")
+    commands = styles.modify_commands(["g0", "g1"], fragments, 400)
+    assert commands == ["ModifyGraph/W=g0 fSize=9,mirror=1,tick=2",
+                        "ModifyGraph/W=g1 fSize=9,mirror=1,tick=2"]
+    commands = styles.modify_commands(["g0"], fragments, 35)
+    assert [command.split(" ")[1] for command in commands] == ["fSize=9,mirror=1", "tick=2"]
+
+if __name__ == "__main__":
+    compile_style_test()
+    package_styles_test()
+    modify_commands_test()
+    print("Passed!")
@@ -0,0 +1,26 @@
+import numpy as np
+
+from igorconsole.oleconsole import upload
+
+
+def split_commands_test():
+    tree = {"subfolders": {}, "variables": {},
+            "waves": {"m": (np.arange(6.0).reshape(2, 3), None, None),
+                      "v": (np.arange(4.0), None, None)}}
+    plan = upload.FolderUpload("root:data:", tree)
+    commands = plan._split_commands(list(plan._batches()))
+    assert commands == ["Duplicate/O/R=[0,5] root:Packages:igorconsole:upload:buf0, root:data:m",
+                        "Redimension/E=1/N=(2,3) root:data:m",
+                        "Duplicate/O/R=[6,9] root:Packages:igorconsole:upload:buf0, root:data:v"]
+
+def text_unbatched_test():
+    tree = {"subfolders": {}, "variables": {},
+            "waves": {"t": (np.array(["a", "b"]), None, None)}}
+    plan = upload.FolderUpload("root:data:", tree)
+    assert [item[2] for item in plan.unbatched] == ["t"]
+    assert not list(plan._batches())
+
+if __name__ == "__main__":
+    split_commands_test()
+    text_unbatched_test()
+    print("Passed!")
@@ -182,6 +182,129 @@ def isstr_test():
     assert utils.isstr("")
     assert not utils.isstr([])
 
+def igor_str_test():
+    assert utils.igor_str("abc") == '"abc"'
+    assert utils.igor_str('say "hi"') == '"say \\"hi\\""'
+    assert utils.igor_str("C:\\data") == '"C:\\\\data"'
+    assert utils.igor_str("a\rb\tc") == '"a\\rb\\tc"'
+
+def new_folder_commands_test():
+    assert utils.new_folder_commands("root:") == []
+    assert utils.new_folder_commands("root:a:b:") == [
+        "NewDataFolder/O root:a", "NewDataFolder/O root:a:b"]
+    assert utils.new_folder_commands("root:a b") == ["NewDataFolder/O root:'a b'"]
+
+def parse_trace_info_test():
+    text = ("w0\troot:w0\t\tleft\tbottom\t{0,0}\r"
+            "w0#1\troot:'a b':w0\troot:x\tright\tbottom\t{1.5,-2}\r")
+    result = utils.parse_trace_info(text)
+    assert result[0] == ("w0", "root:w0", None, "left", "bottom", (0.0, 0.0))
+    assert result[1] == ("w0#1", "root:a b:w0", "root:x", "right", "bottom", (1.5, -2.0))
+
+def parse_table_info_test():
+    text = ("12\t2\r"
+            "w0.d\troot:w0\t4\t12,0,0,0\t0.5\t0.25\r"
+            "t.d\troot:'a b':t\t\t\t\t\r")
+    rows, columns = utils.parse_table_info(text)
+    assert rows == 12
+    assert columns[0] == ("w0.d", "root:w0", 4, (12,), 0.5, 0.25)
+    assert columns[1] == ("t.d", "root:a b:t", None, None, None, None)
+    assert utils.parse_table_info("") == (0, [])
+
+def apply_reorder(traces, moves):
+    """Simulate ReorderTraces commands.
+    Args:
+        traces (list of str): trace names in the drawing order.
+        moves (list of tuple): (anchor, [traces to move before the anchor])
+    Returns:
+        list of str: trace names after the moves.
+    """
+    result = list(traces)
+    for anchor, names in moves:
+        result = [name for name in result if name not in names]
+        i = result.index(anchor)
+        result[i:i] = names
+    return result
+
+def reorder_moves_test():
+    import random
+    current = ["t{}".format(i) for i in range(8)]
+    assert utils.reorder_moves(current, current) == []
+    target = ["t7", "t0", "t1", "t2", "t3", "t4", "t5", "t6"]
+    moves = utils.reorder_moves(current, target)
+    assert moves == [("t0", ["t7"])]
+    assert apply_reorder(current, moves) == target
+    rng = random.Random(0)
+    for _ in range(50):
+        target = current[:]
+        rng.shuffle(target)
+        moves = utils.reorder_moves(current, target)
+        assert apply_reorder(current, moves) == target
+    #traces not in target keep their places.
+    moves = utils.reorder_moves(current, ["t5", "t2"])
+    assert apply_reorder(current, moves) == ["t0", "t1", "t5", "t2", "t3", "t4", "t6", "t7"]
+    assert utils.quote_trace("a b#1") == "'a b'#1"
+
+def chunk_items_test():
+    items = ["w{}".format(i) for i in range(10)]
+    chunks = list(utils.chunk_items(items, 6, 10))
+    assert chunks[0] == ["w0", "w1"]
+    assert all(len(", ".join(chunk)) <= 10 for chunk in chunks[1:])
+    assert sum(chunks, []) == items
+    assert list(utils.chunk_items(["long_name"], 3, 3)) == [["long_name"]]
+    assert list(utils.chunk_items([], 3, 3)) == []
+    assert [len(c) for c in utils.chunk_items(items, 100, 100, max_items=4)] == [4, 4, 2]
+
+def backoff_delays_test():
+    from itertools import islice
+    delays = list(islice(utils.backoff_delays(0.01, 2.0, 0.05), 5))
+    assert delays == [0.01, 0.02, 0.04, 0.05, 0.05]
+    for d in islice(utils.backoff_delays(1.0, 1.0, 1.0, jitter=0.5), 100):
+        assert 0.5 <= d <= 1.5
+
+def folder_path_test():
+    assert utils.normalize_folder_path("root") == "root:"
+    assert utils.normalize_folder_path("root:'a b':c") == "root:a b:c:"
+    assert utils.normalize_folder_path(":a:") is None
+    assert utils.quote_path("root:a b:c:") == "root:'a b':c:"
+    assert utils.quote_name("wave0") == "wave0"
+    assert utils.quote_name("0wave") == "'0wave'"
+
+def parse_data_folder_dir_test():
+    listing = "FOLDERS:sub1,'sub 2';\nWAVES:w0,w1;\nVARIABLES:;\nSTRINGS:s;\n"
+    result = utils.parse_data_folder_dir(listing)
+    assert result["FOLDERS"] == ["sub1", "sub 2"]
+    assert result["WAVES"] == ["w0", "w1"]
+    assert result["VARIABLES"] == []
+    assert result["STRINGS"] == ["s"]
+
+def parse_object_info_test():
+    text = "w0\t4\t10,0,0,0\t3\rimg\t2\t4,5,0,0\t1\rv\t\t\t\rs\t0\t\t\r"
+    result = utils.parse_object_info(text)
+    assert result[0] == ("w0", 4, (10,), 3)
+    assert result[1] == ("img", 2, (4, 5), 1)
+    assert result[2] == ("v", None, None, None)
+    assert result[3] == ("s", 0, None, None)
+    assert utils.parse_object_info("") == []
+
+def parse_snapshot_test():
+    text = ("F\troot:\rW\tw0\t4\t3,0,0,0\t0\rV\ts\t0\t\t\r"
+            "F\troot:sub:\rf\troot:sub:deep:\rF\troot:a b:\r")
+    result = utils.parse_snapshot(text)
+    assert [(path, loaded) for path, loaded, _, _ in result] == [
+        ("root:", True), ("root:sub:", True), ("root:sub:deep:", False), ("root:a b:", True)
+    ]
+    assert result[0][2] == [("w0", 4, (3,), 0)]
+    assert result[0][3] == [("s", 0, None, None)]
+    assert result[1][2] == result[1][3] == []
+
+def swap_folder_commands_test():
+    commands = utils.swap_folder_commands("root:a b:c:", "root:Packages:tx:new:c:", "root:Packages:tx:old:")
+    assert commands == ["MoveDataFolder root:'a b':c, root:Packages:tx:old",
+                        "MoveDataFolder root:Packages:tx:new:c, root:'a b'"]
+    commands = utils.swap_folder_commands("root:c", "root:tx:c", "root:old", exists=False)
+    assert commands == ["MoveDataFolder root:tx:c, root"]
+
 if __name__ == "__main__":
     prod_test()
     obvious_dtype_test()
@@ -194,4 +317,16 @@ if __name__ == "__main__":
     isfloat_test()
     iscomplex_test()
     isstr_test()
+    igor_str_test()
+    new_folder_commands_test()
+    parse_trace_info_test()
+    parse_table_info_test()
+    reorder_moves_test()
+    chunk_items_test()
+    backoff_delays_test()
+    folder_path_test()
+    parse_data_folder_dir_test()
+    parse_object_info_test()
+    parse_snapshot_test()
+    swap_folder_commands_test()
     print("Passed!")